@@ -2,9 +2,14 @@ import random
 import time
 import os
 import csv
+import heapq
 from pathlib import Path
 
-from recommender import recommend_by_collab, build_bipartite_graph, build_product_graph, bfs_related_products, measure_runtime
+import numpy as np
+
+from recommender import recommend_by_collab, build_bipartite_graph, build_product_graph, bfs_related_products, similar_products, measure_runtime
+from minhash import build_minhash_indexes
+from topk import top_k_scores, top_k_arrays
 
 
 RESULTS_DIR = Path(__file__).resolve().parents[0] / '..' / 'benchmarks'
@@ -77,7 +82,102 @@ def run_benchmarks(sizes=(10**3, 10**4, 10**5), runs=3):
     return out_file
 
 
+def run_minhash_recall_benchmark(N=10**5, k=10, configs=((64, 32), (128, 64), (128, 128)), sample_size=200):
+    # Recall@k of the LSH top-k against exact inverted-index Jaccard for a sample of products
+    num_users = max(10, N // 10)
+    num_products = max(10, N // 10)
+    interactions = generate_synthetic_interactions(num_users, num_products, N, seed=123)
+    user_to_products, product_to_users = build_bipartite_graph(interactions)
+    random.seed(7)
+    sample = random.sample(sorted(product_to_users), min(sample_size, len(product_to_users)))
+
+    t0 = time.perf_counter()
+    exact = {pid: {other for other, _ in similar_products(pid, product_to_users, user_to_products, top_k=k)} for pid in sample}
+    exact_query_s = (time.perf_counter() - t0) / len(sample)
+
+    rows = []
+    for num_perm, bands in configs:
+        t0 = time.perf_counter()
+        product_index, _user_index = build_minhash_indexes(user_to_products, product_to_users, num_perm=num_perm, bands=bands)
+        build_s = time.perf_counter() - t0
+
+        hits = 0
+        expected = 0
+        t0 = time.perf_counter()
+        for pid in sample:
+            approx = {other for other, _ in product_index.top_k(pid, k=k)}
+            hits += len(approx & exact[pid])
+            expected += len(exact[pid])
+        query_s = (time.perf_counter() - t0) / len(sample)
+
+        row = {
+            'N': N,
+            'num_perm': num_perm,
+            'bands': bands,
+            'k': k,
+            'recall_at_k': hits / expected if expected else 1.0,
+            'build_s': build_s,
+            'lsh_query_avg_s': query_s,
+            'exact_query_avg_s': exact_query_s,
+        }
+        rows.append(row)
+        print(f"MinHash num_perm={num_perm} bands={bands}: recall@{k}={row['recall_at_k']:.3f}, build={build_s:.3f}s, query_avg={query_s:.6f}s (exact {exact_query_s:.6f}s)")
+
+    out_file = RESULTS_DIR / f"minhash_recall_{int(time.time())}.csv"
+    with open(out_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        for r in rows:
+            writer.writerow(r)
+    return out_file
+
+
+def run_topk_benchmarks(sizes=(10**4, 10**5, 10**6), k=10, runs=3):
+    # Full sort and heap-everything (the previous strategies) against bounded-heap and argpartition selection
+    rows = []
+    for n in sizes:
+        rng = np.random.default_rng(n)
+        ids = np.arange(n, dtype=np.int64)
+        scores = rng.random(n).round(4)  # rounding forces score ties
+        pairs = list(zip(ids.tolist(), scores.tolist()))
+
+        def full_sort():
+            return sorted(pairs, key=lambda x: (-x[1], x[0]))[:k]
+
+        def heap_everything():
+            heap = []
+            for pid, sc in pairs:
+                heapq.heappush(heap, (-sc, pid))
+            return [heapq.heappop(heap) for _ in range(min(k, len(heap)))]
+
+        t_sort, _ = measure_runtime(full_sort, runs=runs)
+        t_heap_all, _ = measure_runtime(heap_everything, runs=runs)
+        t_bounded, _ = measure_runtime(top_k_scores, args=(pairs, k), runs=runs)
+        t_partition, _ = measure_runtime(top_k_arrays, args=(ids, scores, k), runs=runs)
+
+        row = {
+            'candidates': n,
+            'k': k,
+            'full_sort_avg_s': t_sort,
+            'heap_everything_avg_s': t_heap_all,
+            'bounded_heap_avg_s': t_bounded,
+            'argpartition_avg_s': t_partition,
+        }
+        rows.append(row)
+        print(f"top-k n={n}: sort={t_sort:.6f}s, heap_all={t_heap_all:.6f}s, bounded_heap={t_bounded:.6f}s, argpartition={t_partition:.6f}s")
+
+    out_file = RESULTS_DIR / f"topk_{int(time.time())}.csv"
+    with open(out_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        for r in rows:
+            writer.writerow(r)
+    return out_file
+
+
 if __name__ == '__main__':
     # default sizes are smaller on developer machines — but course requires N up to 1e5 where applicable
     sizes = (10**3, 10**4, 10**5)
     run_benchmarks(sizes=sizes, runs=3)
+    run_minhash_recall_benchmark(N=10**5)
+    run_topk_benchmarks()
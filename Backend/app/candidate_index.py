@@ -0,0 +1,78 @@
+"""Category and price candidate sets for filtered recommendations.
+
+Product pages ask for "related items in the same category" or within a
+price band.  Ranking everything and filtering afterwards wastes the
+traversal and can leave fewer than ``k`` results, so the recommenders
+accept a candidate set and apply it during the search instead.
+
+:class:`CandidateIndex` is built once per graph: category membership as
+frozen id sets (case-insensitive names) and product ids ordered by price,
+so a price range is two binary searches and a slice.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+import numpy as np
+
+from .product_graph import Product
+
+
+@dataclass(frozen=True)
+class CandidateFilter:
+    category: Optional[str] = None
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.category is not None or self.price_min is not None or self.price_max is not None
+
+    def as_dict(self) -> Dict[str, Optional[object]]:
+        return {'category': self.category, 'price_min': self.price_min, 'price_max': self.price_max}
+
+
+def _category_key(name: Optional[str]) -> str:
+    return (name or '').strip().lower()
+
+
+class CandidateIndex:
+    """Per-category id sets and a price-sorted id array for one graph's products."""
+
+    def __init__(self, products: Iterable[Product]) -> None:
+        members: Dict[str, Set[int]] = defaultdict(set)
+        ids = []
+        prices = []
+        for product in products:
+            members[_category_key(product.category)].add(product.id)
+            ids.append(product.id)
+            prices.append(float(product.price or 0.0))
+        self.categories: Dict[str, FrozenSet[int]] = {name: frozenset(found) for name, found in members.items()}
+        self.prices: Dict[int, float] = dict(zip(ids, prices))
+        order = np.argsort(np.asarray(prices, dtype=np.float64), kind='stable')
+        self._sorted_prices = np.asarray(prices, dtype=np.float64)[order]
+        self._ids_by_price = np.asarray(ids, dtype=np.int64)[order]
+
+    def in_price_range(self, price_min: Optional[float] = None, price_max: Optional[float] = None) -> FrozenSet[int]:
+        lo = 0 if price_min is None else int(np.searchsorted(self._sorted_prices, price_min, side='left'))
+        hi = self._sorted_prices.size if price_max is None else int(np.searchsorted(self._sorted_prices, price_max, side='right'))
+        return frozenset(self._ids_by_price[lo:hi].tolist())
+
+    def candidates(self, candidate_filter: CandidateFilter) -> Optional[FrozenSet[int]]:
+        """Product ids passing ``candidate_filter``; ``None`` when it filters nothing."""
+
+        if not candidate_filter.active:
+            return None
+        priced = candidate_filter.price_min is not None or candidate_filter.price_max is not None
+        if candidate_filter.category is None:
+            return self.in_price_range(candidate_filter.price_min, candidate_filter.price_max)
+        members = self.categories.get(_category_key(candidate_filter.category), frozenset())
+        if not priced:
+            return members
+        low = float('-inf') if candidate_filter.price_min is None else candidate_filter.price_min
+        high = float('inf') if candidate_filter.price_max is None else candidate_filter.price_max
+        # Category sets are usually the smaller side: check their prices directly
+        return frozenset(pid for pid in members if low <= self.prices[pid] <= high)
@@ -0,0 +1,321 @@
+"""Process-pool sharded collaborative filtering.
+
+``recommend_by_collab`` is pure Python and holds the GIL for the whole
+scoring loop, which starves the threadpool FastAPI runs sync endpoints
+in.  :class:`CollabScoringExecutor` moves scoring for large datasets into
+a ``ProcessPoolExecutor``:
+
+* the bipartite graph is laid out as CSR arrays (user -> products and
+  product -> users) and published once into ``multiprocessing``
+  shared-memory segments, so workers attach to it by name instead of
+  receiving a pickled copy per call;
+* :meth:`CollabScoringExecutor.recommend_versioned` keeps that
+  publication for as long as the caller's data version (e.g. the
+  interaction high-water mark) stays the same, so repeated calls skip
+  loading interactions and rebuilding the CSR in the parent;
+* the user space is split into contiguous shards; each shard gets every
+  target user of a call in one task, scores the neighbours that fall
+  inside it and returns a sparse partial score vector per target;
+* the parent sums each target's partial vectors and selects its top-k.
+
+Small datasets (below ``min_parallel_interactions``) or a pool size of 0
+stay on the single-process path in ``recommender``.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from . import recommender
+from .graph_csr import bipartite_csr
+from .settings import get_settings
+from .topk import top_k_arrays
+
+_ARRAY_NAMES = ('user_indptr', 'user_products', 'product_indptr', 'product_users')
+
+# (shared memory name, shape, dtype) per CSR array
+Layout = Dict[str, Tuple[str, Tuple[int, ...], str]]
+
+
+class SharedBipartite:
+    """CSR copy of the bipartite graph living in shared memory.
+
+    Product positions follow ascending product id, so ordering by position
+    keeps the repo-wide ``(score desc, id asc)`` tie-break.
+    """
+
+    def __init__(self, user_to_products: Dict[int, Set[int]], product_to_users: Dict[int, Set[int]]) -> None:
+        self.user_ids, self.product_ids, arrays = bipartite_csr(user_to_products, product_to_users)
+        self.user_index = {uid: pos for pos, uid in enumerate(self.user_ids)}
+
+        self._segments: List[SharedMemory] = []
+        self.layout: Layout = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name in _ARRAY_NAMES:
+            source = arrays[name]
+            shm = SharedMemory(create=True, size=max(source.nbytes, 1))
+            view = np.ndarray(source.shape, dtype=source.dtype, buffer=shm.buf)
+            view[:] = source
+            self._segments.append(shm)
+            self.layout[name] = (shm.name, source.shape, source.dtype.str)
+            self.arrays[name] = view
+
+    @property
+    def num_users(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def num_products(self) -> int:
+        return len(self.product_ids)
+
+    def close(self) -> None:
+        self.arrays = {}
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+
+    def __enter__(self) -> 'SharedBipartite':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def score_shard(arrays: Dict[str, np.ndarray], target: int, lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Partial collaborative scores from neighbours with user position in ``[lo, hi)``.
+
+    Returns ``(product_positions, scores)`` for the non-zero entries.
+    """
+
+    user_indptr = arrays['user_indptr']
+    user_products = arrays['user_products']
+    product_indptr = arrays['product_indptr']
+    product_users = arrays['product_users']
+
+    target_products = user_products[user_indptr[target]:user_indptr[target + 1]]
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+    if target_products.size == 0:
+        return empty
+
+    starts = product_indptr[target_products]
+    lengths = product_indptr[target_products + 1] - starts
+    reached = product_users[_expand(starts, lengths)]
+    reached = reached[(reached >= lo) & (reached < hi) & (reached != target)]
+    if reached.size == 0:
+        return empty
+
+    # Jaccard from overlap counts and degrees: |A n B| / (|A| + |B| - |A n B|)
+    neighbours, inter = np.unique(reached, return_counts=True)
+    n_starts = user_indptr[neighbours]
+    n_lengths = user_indptr[neighbours + 1] - n_starts
+    sims = inter / (target_products.size + n_lengths - inter)
+
+    products = user_products[_expand(n_starts, n_lengths)]
+    weights = np.repeat(sims, n_lengths)
+    keep = ~np.isin(products, target_products, assume_unique=False)
+    products, weights = products[keep], weights[keep]
+    if products.size == 0:
+        return empty
+    positions, inverse = np.unique(products, return_inverse=True)
+    return positions, np.bincount(inverse, weights=weights)
+
+
+def _expand(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenate the index ranges ``[start, start + length)`` without a Python loop."""
+
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + (np.arange(total, dtype=np.int64) - offsets)
+
+
+# Worker-side cache of attached segments, keyed by shared memory name
+_ATTACHED: Dict[str, Tuple[SharedMemory, np.ndarray]] = {}
+
+
+def _attach(layout: Layout) -> Dict[str, np.ndarray]:
+    current = {shm_name for shm_name, _shape, _dtype in layout.values()}
+    # Segments from a previous publication are unlinked by the parent;
+    # closing our mapping lets the kernel free them
+    for shm_name in [name for name in _ATTACHED if name not in current]:
+        shm, view = _ATTACHED.pop(shm_name)
+        del view
+        shm.close()
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, (shm_name, shape, dtype) in layout.items():
+        entry = _ATTACHED.get(shm_name)
+        if entry is None:
+            shm = SharedMemory(name=shm_name)
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            view.flags.writeable = False
+            entry = (shm, view)
+            _ATTACHED[shm_name] = entry
+        arrays[name] = entry[1]
+    return arrays
+
+
+def score_shard_many(arrays: Dict[str, np.ndarray], targets: Sequence[int], lo: int, hi: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """:func:`score_shard` for every position in ``targets``, in order."""
+
+    return [score_shard(arrays, int(target), lo, hi) for target in targets]
+
+
+def _score_shard_task(layout: Layout, targets: np.ndarray, lo: int, hi: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    return score_shard_many(_attach(layout), targets, lo, hi)
+
+
+class CollabScoringExecutor:
+    """Collaborative filtering that shards scoring across worker processes."""
+
+    def __init__(self, pool_size: Optional[int] = None, min_parallel_interactions: Optional[int] = None) -> None:
+        settings = get_settings()
+        self.pool_size = settings.collab_pool_size if pool_size is None else pool_size
+        self.min_parallel_interactions = (
+            settings.collab_parallel_min_interactions if min_parallel_interactions is None else min_parallel_interactions
+        )
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Current publication, its data version and calls still scoring per publication
+        self._shared: Optional[SharedBipartite] = None
+        self._shared_version: Optional[Hashable] = None
+        self._shared_users: Dict[int, int] = {}
+
+    def use_pool(self, interaction_count: int) -> bool:
+        return self.pool_size > 0 and interaction_count >= self.min_parallel_interactions
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs a threadpool is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.pool_size,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+            if self._shared is not None:
+                retired, self._shared, self._shared_version = self._shared, None, None
+                if not self._shared_users.get(id(retired)):
+                    retired.close()
+
+    def _acquire(self, version: Hashable) -> Optional[SharedBipartite]:
+        with self._lock:
+            shared = self._shared if self._shared_version == version else None
+            if shared is not None:
+                self._shared_users[id(shared)] = self._shared_users.get(id(shared), 0) + 1
+            return shared
+
+    def _publish(self, version: Hashable, shared: SharedBipartite) -> None:
+        """Make ``shared`` current (caller counts as one user); retire the previous one."""
+
+        with self._lock:
+            previous = self._shared
+            self._shared, self._shared_version = shared, version
+            self._shared_users[id(shared)] = self._shared_users.get(id(shared), 0) + 1
+            if previous is not None and not self._shared_users.get(id(previous)):
+                previous.close()
+
+    def _release(self, shared: SharedBipartite) -> None:
+        with self._lock:
+            remaining = self._shared_users.get(id(shared), 1) - 1
+            if remaining:
+                self._shared_users[id(shared)] = remaining
+                return
+            self._shared_users.pop(id(shared), None)
+            # Superseded while in use: the last caller unlinks its segments
+            if shared is not self._shared:
+                shared.close()
+
+    # ------------------------------------------------------------------
+    # Public API mirroring recommender
+    # ------------------------------------------------------------------
+    def recommend(self, user_id: int, interactions: List[Dict[str, int]], top_k: int = 10) -> List[Tuple[int, float]]:
+        return self.recommend_many([user_id], interactions, top_k=top_k).get(user_id, [])
+
+    def recommend_many(
+        self,
+        user_ids: Iterable[int],
+        interactions: List[Dict[str, int]],
+        top_k: int = 10,
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        if not self.use_pool(len(interactions)):
+            return recommender.recommend_many(user_ids, interactions, top_k=top_k)
+
+        user_to_products, product_to_users = recommender.build_bipartite_graph(interactions)
+        with SharedBipartite(user_to_products, product_to_users) as shared:
+            return self._score(shared, list(dict.fromkeys(user_ids)), top_k)
+
+    def recommend_versioned(
+        self,
+        user_ids: Iterable[int],
+        version: Hashable,
+        load_interactions: Callable[[], List[Dict[str, int]]],
+        top_k: int = 10,
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        """``recommend_many`` reusing the shared CSR published for ``version``.
+
+        ``load_interactions`` only runs when nothing is published for
+        ``version`` yet; small datasets stay on the in-process path.
+        """
+
+        user_ids = list(dict.fromkeys(user_ids))
+        shared = self._acquire(version)
+        if shared is None:
+            interactions = load_interactions()
+            if not self.use_pool(len(interactions)):
+                return recommender.recommend_many(user_ids, interactions, top_k=top_k)
+            shared = SharedBipartite(*recommender.build_bipartite_graph(interactions))
+            self._publish(version, shared)
+        try:
+            return self._score(shared, user_ids, top_k)
+        finally:
+            self._release(shared)
+
+    def _score(self, shared: SharedBipartite, user_ids: List[int], top_k: int) -> Dict[int, List[Tuple[int, float]]]:
+        """Top-k for every user in ``user_ids``; each shard gets all of them in one task."""
+
+        results: Dict[int, List[Tuple[int, float]]] = {uid: [] for uid in user_ids}
+        scored = [uid for uid in user_ids if uid in shared.user_index]
+        if not scored or top_k <= 0:
+            return results
+
+        pool = self._get_pool()
+        targets = np.asarray([shared.user_index[uid] for uid in scored], dtype=np.int64)
+        bounds = np.linspace(0, shared.num_users, self.pool_size + 1, dtype=np.int64)
+        futures = [
+            pool.submit(_score_shard_task, shared.layout, targets, int(lo), int(hi))
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+            if hi > lo
+        ]
+        partials = [future.result() for future in futures]
+
+        totals = np.zeros(shared.num_products, dtype=np.float64)
+        for idx, uid in enumerate(scored):
+            totals[:] = 0.0
+            for shard in partials:
+                positions, scores = shard[idx]
+                totals[positions] += scores
+            candidates = np.flatnonzero(totals > 0)
+            positions, scores = top_k_arrays(candidates, totals[candidates], top_k)
+            results[uid] = [(shared.product_ids[pos], float(score)) for pos, score in zip(positions, scores)]
+        return results
+
+
+@lru_cache()
+def get_executor() -> CollabScoringExecutor:
+    return CollabScoringExecutor()
@@ -1,9 +1,13 @@
 import json
 import sqlite3
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Sequence, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
 
-from .db_init import DB_PATH
+from .db_init import ARCHIVE_SCHEMA, DB_PATH, PRODUCT_EDGES_BACKFILL
+from .graph_builder import basket_cap
+
+# Rows fetched per round trip by the streaming readers
+STREAM_CHUNK_SIZE = 5000
 
 
 def _current_timestamp() -> str:
@@ -217,6 +221,10 @@ def user_category_overview() -> List[Dict[str, Any]]:
 
 # -------------------- Products -------------------- #
 
+def _log_product_change(cur: sqlite3.Cursor, product_id: int, change: str) -> None:
+    cur.execute('INSERT INTO product_changes (product_id, change) VALUES (?, ?)', (product_id, change))
+
+
 def add_product(payload: Dict[str, Any]) -> int:
     conn = get_conn()
     cur = conn.cursor()
@@ -226,6 +234,7 @@ def add_product(payload: Dict[str, Any]) -> int:
         'INSERT OR REPLACE INTO product_details (product_id, description, price, image_url, inventory) VALUES (?, ?, ?, ?, ?)',
         (pid, payload.get('description'), payload.get('price', 0), payload.get('image_url'), payload.get('inventory', 0))
     )
+    _log_product_change(cur, pid, 'create')
     conn.commit()
     conn.close()
     return pid
@@ -246,6 +255,7 @@ def update_product(product_id: int, payload: Dict[str, Any]) -> None:
         ''',
         (product_id, payload.get('description'), payload.get('price', 0), payload.get('image_url'), payload.get('inventory', 0))
     )
+    _log_product_change(cur, product_id, 'update')
     conn.commit()
     conn.close()
 
@@ -254,6 +264,7 @@ def delete_product(product_id: int) -> None:
     conn = get_conn()
     cur = conn.cursor()
     cur.execute('DELETE FROM products WHERE id = ?', (product_id,))
+    _log_product_change(cur, product_id, 'delete')
     conn.commit()
     conn.close()
 
@@ -340,8 +351,8 @@ def category_product_highlights(category: str, limit: int = 50) -> List[Dict[str
             GROUP BY product_id
         ) rv ON rv.product_id = p.id
         LEFT JOIN (
-            SELECT product_id, COUNT(*) AS total_interactions
-            FROM interactions
+            SELECT product_id, SUM(interaction_count) AS total_interactions
+            FROM user_product_affinity
             GROUP BY product_id
         ) iv ON iv.product_id = p.id
         WHERE p.category = ?
@@ -373,12 +384,12 @@ def product_interaction_summary(product_id: int) -> Dict[str, Any]:
     cur.execute(
         '''
         SELECT
-            COUNT(*) AS total,
-            SUM(CASE WHEN interaction_type = 'view' THEN 1 ELSE 0 END) AS views,
-            SUM(CASE WHEN interaction_type = 'like' THEN 1 ELSE 0 END) AS likes,
-            SUM(CASE WHEN interaction_type = 'add_to_cart' THEN 1 ELSE 0 END) AS adds,
-            MAX(timestamp) AS last_interaction_at
-        FROM interactions
+            SUM(interaction_count) AS total,
+            SUM(view_count) AS views,
+            SUM(like_count) AS likes,
+            SUM(add_to_cart_count) AS adds,
+            datetime(MAX(last_seen), 'unixepoch') AS last_interaction_at
+        FROM user_product_affinity
         WHERE product_id = ?
         ''',
         (product_id,)
@@ -544,12 +555,142 @@ def delete_cart_item(item_id: int) -> None:
 
 # -------------------- Interactions -------------------- #
 
+# Decode the integer-coded columns of ``interactions i`` for callers that want names
+_LOOKUP_JOINS = '''
+        JOIN interaction_actions a ON a.code = i.action_code
+        LEFT JOIN interaction_metadata m ON m.id = i.metadata_id
+'''
+_TIMESTAMP = "datetime(i.created_at, 'unixepoch')"
+
+
+def product_edges_pair_budget() -> int:
+    """Per-user pair budget ``product_edges`` are maintained under (0 = unlimited)."""
+
+    conn = get_conn()
+    row = conn.execute('SELECT pair_budget FROM product_edges_config WHERE id = 1').fetchone()
+    conn.close()
+    return int(row[0]) if row is not None else 0
+
+
+def _upsert_product_edges(cur: sqlite3.Cursor, user_id: int, product_id: int, weight: Optional[float]) -> None:
+    """Fold one new interaction into ``product_edges`` (call before updating the affinity row).
+
+    Edges sum ``(a + b) / 2`` of the user's max weights over the active
+    basket: all of it, or under the table's pair budget the ``basket_cap``
+    heaviest products (ties by id), as ``GraphAccumulator`` picks them.  Only
+    a new basket entry or a raised max changes anything, and under a budget
+    at most ``2 * basket_cap`` pairs move: the product's own, plus those of
+    the entry it pushes out of the active set.
+    """
+
+    row = cur.execute('SELECT pair_budget FROM product_edges_config WHERE id = 1').fetchone()
+    cap = basket_cap(int(row[0]) if row else 0)
+    new = float(weight or 1.0)
+    row = cur.execute(
+        'SELECT max_weight FROM user_product_affinity WHERE user_id = ? AND product_id = ?',
+        (user_id, product_id),
+    ).fetchone()
+    old = row[0] if row is not None else None
+    if old is not None and new <= old:
+        return
+    if cap is None:
+        cur.execute('SELECT product_id, max_weight FROM user_product_affinity WHERE user_id = ?', (user_id,))
+    else:
+        cur.execute(
+            '''
+            SELECT product_id, max_weight FROM user_product_affinity
+            WHERE user_id = ? ORDER BY max_weight DESC, product_id LIMIT ?
+            ''',
+            (user_id, cap),
+        )
+    active = {pid: value for pid, value in cur.fetchall()}
+
+    updates = []
+    evicted = []
+    if product_id in active:
+        # Stays active with a higher max: only its pairs' strengths move
+        del active[product_id]
+        updates = [(*_edge_key(product_id, other), (new - old) / 2.0, 0) for other in active]
+    else:
+        if cap is not None and len(active) >= cap:
+            last, last_weight = next(reversed(active.items()))
+            if (-new, product_id) > (-last_weight, last):
+                return
+            # Takes the place of the weakest active entry, whose pairs are withdrawn
+            del active[last]
+            for other, other_weight in active.items():
+                evicted.append(_edge_key(last, other))
+                updates.append((*evicted[-1], -(last_weight + other_weight) / 2.0, -1))
+        updates += [(*_edge_key(product_id, other), (new + other_weight) / 2.0, 1) for other, other_weight in active.items()]
+    cur.executemany(
+        '''
+        INSERT INTO product_edges (left_id, right_id, strength, pair_count) VALUES (?, ?, ?, ?)
+        ON CONFLICT(left_id, right_id) DO UPDATE SET
+            strength = strength + excluded.strength,
+            pair_count = pair_count + excluded.pair_count
+        ''',
+        updates,
+    )
+    cur.executemany('DELETE FROM product_edges WHERE left_id = ? AND right_id = ? AND pair_count <= 0', evicted)
+
+
+def _edge_key(a: int, b: int) -> Tuple[int, int]:
+    return (a, b) if a < b else (b, a)
+
+
+def _upsert_affinity(cur: sqlite3.Cursor, user_id: int, product_id: int, interaction_type: str, weight: Optional[float]) -> None:
+    effective = float(weight or 1.0)
+    cur.execute(
+        '''
+        INSERT INTO user_product_affinity (
+            user_id, product_id, interaction_count, view_count, like_count, add_to_cart_count,
+            max_weight, weight_sum, first_seen, last_seen
+        ) VALUES (?, ?, 1, ?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+        ON CONFLICT(user_id, product_id) DO UPDATE SET
+            interaction_count = interaction_count + 1,
+            view_count = view_count + excluded.view_count,
+            like_count = like_count + excluded.like_count,
+            add_to_cart_count = add_to_cart_count + excluded.add_to_cart_count,
+            max_weight = MAX(max_weight, excluded.max_weight),
+            weight_sum = weight_sum + excluded.weight_sum,
+            last_seen = excluded.last_seen
+        ''',
+        (
+            user_id,
+            product_id,
+            int(interaction_type == 'view'),
+            int(interaction_type == 'like'),
+            int(interaction_type == 'add_to_cart'),
+            effective,
+            effective,
+        ),
+    )
+
+
+def _action_code(cur: sqlite3.Cursor, interaction_type: str) -> int:
+    cur.execute('INSERT OR IGNORE INTO interaction_actions (name) VALUES (?)', (interaction_type,))
+    return cur.execute('SELECT code FROM interaction_actions WHERE name = ?', (interaction_type,)).fetchone()[0]
+
+
+def _metadata_id(cur: sqlite3.Cursor, metadata: Optional[str]) -> Optional[int]:
+    """Id of the shared ``interaction_metadata`` row for ``metadata`` (stored once per distinct payload)."""
+
+    if metadata is None:
+        return None
+    cur.execute('INSERT OR IGNORE INTO interaction_metadata (payload) VALUES (?)', (metadata,))
+    return cur.execute('SELECT id FROM interaction_metadata WHERE payload = ?', (metadata,)).fetchone()[0]
+
+
 def add_interaction(user_id: int, product_id: int, interaction_type: str = 'view', weight: float = 1.0, rating: int = 1, metadata: Optional[str] = None) -> int:
     conn = get_conn()
     cur = conn.cursor()
+    # Write lock before reading the basket so concurrent inserts cannot both miss each other
+    cur.execute('BEGIN IMMEDIATE')
+    _upsert_product_edges(cur, user_id, product_id, weight)
+    _upsert_affinity(cur, user_id, product_id, interaction_type, weight)
     cur.execute(
-        'INSERT INTO interactions (user_id, product_id, interaction_type, weight, rating, metadata) VALUES (?, ?, ?, ?, ?, ?)',
-        (user_id, product_id, interaction_type, weight, rating, metadata)
+        'INSERT INTO interactions (user_id, product_id, action_code, weight, rating, metadata_id) VALUES (?, ?, ?, ?, ?, ?)',
+        (user_id, product_id, _action_code(cur, interaction_type), weight, rating, _metadata_id(cur, metadata))
     )
     conn.commit()
     iid = cur.lastrowid
@@ -557,39 +698,260 @@ def add_interaction(user_id: int, product_id: int, interaction_type: str = 'view
     return iid
 
 
-def get_interactions() -> List[Dict[str, Any]]:
+def interaction_high_water_mark() -> Tuple[int, int]:
+    """``(max interaction id, interaction count)``; changes whenever rows are added or removed."""
+
+    conn = get_conn()
+    row = conn.execute('SELECT COALESCE(MAX(id), 0), COUNT(*) FROM interactions').fetchone()
+    conn.close()
+    return int(row[0]), int(row[1])
+
+
+def iter_product_edges(chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[int, int, float, int]]:
+    """Stream ``(left_id, right_id, strength, pair_count)`` from the persisted edge table."""
+
+    return _stream_rows('SELECT left_id, right_id, strength, pair_count FROM product_edges', chunk_size=chunk_size)
+
+
+def product_affinity_totals() -> Dict[int, Tuple[float, int]]:
+    """``{product_id: (summed weight, interaction count)}`` from the compacted table."""
+
+    conn = get_conn()
+    rows = conn.execute(
+        'SELECT product_id, SUM(weight_sum), SUM(interaction_count) FROM user_product_affinity GROUP BY product_id'
+    ).fetchall()
+    conn.close()
+    return {row[0]: (row[1], int(row[2])) for row in rows}
+
+
+def list_affinity_interactions() -> List[Dict[str, int]]:
+    """One ``{'user_id', 'product_id'}`` row per pair, read from the compacted table.
+
+    Enough for collaborative filtering, and unlike the raw interactions log
+    it still covers archived events.
+    """
+
+    return [{'user_id': uid, 'product_id': pid} for uid, pid in iter_interaction_pairs()]
+
+
+def iter_product_affinity(product_id: int, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[int, int, int, int, int]]:
+    """Stream ``(user_id, interaction_count, view_count, like_count, add_to_cart_count)`` for one product."""
+
+    return _stream_rows(
+        '''
+        SELECT user_id, interaction_count, view_count, like_count, add_to_cart_count
+        FROM user_product_affinity
+        WHERE product_id = ?
+        ORDER BY user_id
+        ''',
+        (product_id,),
+        chunk_size=chunk_size,
+    )
+
+
+def iter_user_product_affinity(chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[int, int, float, float, int]]:
+    """Stream ``(user_id, product_id, max_weight, weight_sum, interaction_count)``."""
+
+    return _stream_rows(
+        'SELECT user_id, product_id, max_weight, weight_sum, interaction_count FROM user_product_affinity',
+        chunk_size=chunk_size,
+    )
+
+
+def archive_interactions(before: str, archive_path: str) -> int:
+    """Move raw interactions with ``timestamp < before`` into the SQLite file at ``archive_path``.
+
+    ``user_product_affinity`` and ``product_edges`` already hold their
+    contribution, so affinity and persisted-edge graph builds, collaborative
+    recommendations and the per-product totals keep it.  Readers of the raw
+    log lose it: time-decayed, incremental and windowed graph builds replay
+    events, and analytics list individual purchases and recent events, so
+    callers must not archive rows those still need (see the admin endpoint).
+    Archived rows are decoded (action names, metadata JSON, DATETIME
+    strings) so the cold file stands on its own, and metadata payloads no
+    longer referenced by a hot row are deleted; returns the number of rows
+    moved.
+    """
+
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute('ATTACH DATABASE ? AS cold', (archive_path,))
+    try:
+        cur.execute(ARCHIVE_SCHEMA)
+        cur.execute('BEGIN IMMEDIATE')
+        cur.execute(
+            f'''
+            INSERT OR IGNORE INTO cold.interactions (id, user_id, product_id, interaction_type, weight, rating, metadata, timestamp)
+            SELECT i.id, i.user_id, i.product_id, a.name, i.weight, i.rating, m.payload, {_TIMESTAMP}
+            FROM main.interactions i
+            {_LOOKUP_JOINS}
+            WHERE i.created_at < CAST(strftime('%s', ?) AS INTEGER)
+            ''',
+            (before,),
+        )
+        cur.execute("DELETE FROM main.interactions WHERE created_at < CAST(strftime('%s', ?) AS INTEGER)", (before,))
+        moved = cur.rowcount
+        # Payloads are shared between rows: drop only the ones nothing references now
+        cur.execute(
+            '''
+            DELETE FROM main.interaction_metadata
+            WHERE id NOT IN (SELECT metadata_id FROM main.interactions WHERE metadata_id IS NOT NULL)
+            '''
+        )
+        conn.commit()
+    except BaseException:
+        # A database cannot be detached inside an open transaction
+        conn.rollback()
+        raise
+    finally:
+        cur.execute('DETACH DATABASE cold')
+        conn.close()
+    return moved
+
+
+def rebuild_product_edges(pair_budget: int = 0) -> int:
+    """Recompute ``product_edges`` from ``user_product_affinity``; returns the edge count.
+
+    ``pair_budget`` is recorded with the table, and later inserts apply it too.
+    """
+
+    pair_budget = max(int(pair_budget), 0)
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute('BEGIN IMMEDIATE')
+    cur.execute('DELETE FROM product_edges')
+    cur.execute('UPDATE product_edges_config SET pair_budget = ? WHERE id = 1', (pair_budget,))
+    cur.execute(PRODUCT_EDGES_BACKFILL, {'basket_cap': basket_cap(pair_budget)})
+    conn.commit()
+    count = cur.execute('SELECT COUNT(*) FROM product_edges').fetchone()[0]
+    conn.close()
+    return int(count)
+
+
+def latest_product_change_id() -> int:
+    conn = get_conn()
+    row = conn.execute('SELECT COALESCE(MAX(id), 0) FROM product_changes').fetchone()
+    conn.close()
+    return int(row[0])
+
+
+def graph_change_mark() -> Tuple[int, int, int]:
+    """Interaction high-water mark plus the latest product change id."""
+
+    max_id, count = interaction_high_water_mark()
+    return max_id, count, latest_product_change_id()
+
+
+def list_product_changes(after_id: int = 0) -> List[Dict[str, Any]]:
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('SELECT user_id, product_id, interaction_type, weight, rating, metadata, timestamp FROM interactions')
+    cur.execute('SELECT id, product_id, change, changed_at FROM product_changes WHERE id > ? ORDER BY id', (after_id,))
     rows = cur.fetchall()
     conn.close()
     return [dict(r) for r in rows]
 
 
-def list_interactions_for_graph() -> List[Dict[str, Any]]:
+def _stream_rows(query: str, params: Sequence[Any] = (), chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[Any, ...]]:
+    """Yield plain tuples ``chunk_size`` rows at a time; the connection closes with the generator."""
+
+    conn = get_conn()
+    conn.row_factory = None
+    try:
+        cur = conn.execute(query, params)
+        while True:
+            chunk = cur.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield from chunk
+    finally:
+        conn.close()
+
+
+def iter_interaction_pairs(chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[int, int]]:
+    """Stream each distinct ``(user_id, product_id)`` pair from the compacted table."""
+
+    return _stream_rows('SELECT user_id, product_id FROM user_product_affinity', chunk_size=chunk_size)
+
+
+def iter_interactions_for_graph(chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[int, int, Optional[float], str]]:
+    """Stream ``(user_id, product_id, weight, created_at epoch)`` for the weighted graph build."""
+
+    return _stream_rows('SELECT user_id, product_id, weight, created_at FROM interactions', chunk_size=chunk_size)
+
+
+def iter_product_interactions(product_id: int, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[int, str, Optional[float], str]]:
+    """Stream ``(user_id, interaction_type, weight, timestamp)`` for one product in insertion order."""
+
+    return _stream_rows(
+        f'''
+        SELECT i.user_id, a.name, i.weight, {_TIMESTAMP}
+        FROM interactions i
+        JOIN interaction_actions a ON a.code = i.action_code
+        WHERE i.product_id = ?
+        ORDER BY i.id
+        ''',
+        (product_id,),
+        chunk_size=chunk_size,
+    )
+
+
+def list_interactions_since(
+    after_id: int = 0,
+    min_timestamp: Optional[float] = None,
+    max_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Rows with ``id > after_id`` (``timestamp`` as epoch seconds), optionally bounded."""
+
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('''
-        SELECT id, user_id, product_id, interaction_type, weight, metadata, timestamp
+    clauses = ['id > ?']
+    params: List[Any] = [after_id]
+    if max_id is not None:
+        clauses.append('id <= ?')
+        params.append(max_id)
+    if min_timestamp is not None:
+        clauses.append('created_at >= ?')
+        params.append(min_timestamp)
+    cur.execute(f"""
+        SELECT id, user_id, product_id, weight, created_at AS timestamp
         FROM interactions
-        ORDER BY timestamp DESC
-    ''')
+        WHERE {' AND '.join(clauses)}
+        ORDER BY id
+    """, params)
     rows = cur.fetchall()
     conn.close()
     return [dict(r) for r in rows]
 
 
+def iter_interactions_since(
+    after_id: int = 0,
+    max_id: Optional[int] = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Streaming :func:`list_interactions_since` for replays that may cover the whole table."""
+
+    columns = ('id', 'user_id', 'product_id', 'weight', 'timestamp')
+    query = 'SELECT id, user_id, product_id, weight, created_at FROM interactions WHERE id > ?'
+    params: List[Any] = [after_id]
+    if max_id is not None:
+        query += ' AND id <= ?'
+        params.append(max_id)
+    for row in _stream_rows(query + ' ORDER BY id', params, chunk_size=chunk_size):
+        yield dict(zip(columns, row))
+
+
 def list_interactions_detailed(limit: int = 200) -> List[Dict[str, Any]]:
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('''
+    cur.execute(f'''
         SELECT i.id, i.user_id, u.name AS user_name,
                i.product_id, p.name AS product_name, p.category,
-               i.interaction_type, i.weight, i.metadata, i.timestamp
+               a.name AS interaction_type, i.weight, m.payload AS metadata, {_TIMESTAMP} AS timestamp
         FROM interactions i
+        {_LOOKUP_JOINS}
         LEFT JOIN users u ON u.id = i.user_id
         LEFT JOIN products p ON p.id = i.product_id
-        ORDER BY i.timestamp DESC
+        ORDER BY i.created_at DESC
         LIMIT ?
     ''', (limit,))
     rows = cur.fetchall()
@@ -613,10 +975,10 @@ def interaction_counts_by_product(limit: int = 10) -> List[Dict[str, Any]]:
         SELECT p.id AS product_id,
                p.name AS product_name,
                p.category,
-               COUNT(i.id) AS interactions,
-               IFNULL(SUM(i.weight), 0) AS weight_sum
+               IFNULL(SUM(a.interaction_count), 0) AS interactions,
+               IFNULL(SUM(a.weight_sum), 0) AS weight_sum
         FROM products p
-        LEFT JOIN interactions i ON i.product_id = p.id
+        LEFT JOIN user_product_affinity a ON a.product_id = p.id
         GROUP BY p.id, p.name, p.category
         ORDER BY interactions DESC, weight_sum DESC
         LIMIT ?
@@ -632,11 +994,12 @@ def graph_export_snapshot(limit_nodes: int = 1000) -> Dict[str, Any]:
     cur.execute('''
         SELECT i.id, i.user_id, u.name AS user_name,
                i.product_id, p.name AS product_name, p.category,
-               i.interaction_type, i.weight
+               a.name AS interaction_type, i.weight
         FROM interactions i
+        JOIN interaction_actions a ON a.code = i.action_code
         LEFT JOIN users u ON u.id = i.user_id
         LEFT JOIN products p ON p.id = i.product_id
-        ORDER BY i.timestamp DESC
+        ORDER BY i.created_at DESC
         LIMIT ?
     ''', (limit_nodes,))
     rows = cur.fetchall()
@@ -693,7 +1056,7 @@ def graph_export_snapshot(limit_nodes: int = 1000) -> Dict[str, Any]:
 def product_popularity(product_id: int) -> Dict[str, Any]:
     conn = get_conn()
     cur = conn.cursor()
-    cur.execute('SELECT COUNT(*) as count FROM interactions WHERE product_id = ?', (product_id,))
+    cur.execute('SELECT IFNULL(SUM(interaction_count), 0) as count FROM user_product_affinity WHERE product_id = ?', (product_id,))
     count = cur.fetchone()['count']
     cur.execute('SELECT IFNULL(AVG(rating), 0) as avg_rating FROM reviews WHERE product_id = ?', (product_id,))
     avg_rating = cur.fetchone()['avg_rating']
@@ -1,10 +1,29 @@
 import sqlite3
 import os
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'app.db')
+# APP_DB_PATH points the app (and its import-time migration) at another file
+DB_PATH = os.getenv('APP_DB_PATH') or os.path.join(os.path.dirname(__file__), '..', 'data', 'app.db')
 
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
+# created_at is epoch seconds (UTC); action and metadata point at lookup tables
+INTERACTIONS_TABLE = '''
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    action_code INTEGER NOT NULL DEFAULT 1,
+    weight REAL DEFAULT 1,
+    rating INTEGER DEFAULT 1,
+    metadata_id INTEGER,
+    created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+    FOREIGN KEY(user_id) REFERENCES users(id),
+    FOREIGN KEY(product_id) REFERENCES products(id),
+    FOREIGN KEY(action_code) REFERENCES interaction_actions(code),
+    FOREIGN KEY(metadata_id) REFERENCES interaction_metadata(id)
+);
+'''
+
 SCHEMA = '''
 PRAGMA foreign_keys = ON;
 
@@ -47,19 +66,24 @@ CREATE TABLE IF NOT EXISTS product_sizes (
     FOREIGN KEY(product_id) REFERENCES products(id) ON DELETE CASCADE
 );
 
-CREATE TABLE IF NOT EXISTS interactions (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    product_id INTEGER NOT NULL,
-    interaction_type TEXT DEFAULT 'view',
-    weight REAL DEFAULT 1,
-    rating INTEGER DEFAULT 1,
-    metadata TEXT,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY(user_id) REFERENCES users(id),
-    FOREIGN KEY(product_id) REFERENCES products(id)
+-- Interaction action names, stored in interactions as small integer codes
+CREATE TABLE IF NOT EXISTS interaction_actions (
+    code INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+INSERT OR IGNORE INTO interaction_actions (code, name) VALUES
+    (1, 'view'), (2, 'like'), (3, 'add_to_cart'), (4, 'click'), (5, 'review'), (6, 'purchase');
+
+-- Distinct interaction metadata payloads; rows reference them by id
+CREATE TABLE IF NOT EXISTS interaction_metadata (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL UNIQUE
 );
 
+-- interactions itself (INTERACTIONS_TABLE) is created by init_db once older
+-- layouts have been migrated
+
 CREATE TABLE IF NOT EXISTS reviews (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
@@ -95,11 +119,163 @@ CREATE TABLE IF NOT EXISTS admin_audit_logs (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Product create/update/delete log read by incremental graph refreshes
+CREATE TABLE IF NOT EXISTS product_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    change TEXT NOT NULL,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- One row per (user, product): the interaction log compacted on insert
+CREATE TABLE IF NOT EXISTS user_product_affinity (
+    user_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    interaction_count INTEGER NOT NULL DEFAULT 0,
+    view_count INTEGER NOT NULL DEFAULT 0,
+    like_count INTEGER NOT NULL DEFAULT 0,
+    add_to_cart_count INTEGER NOT NULL DEFAULT 0,
+    max_weight REAL NOT NULL DEFAULT 0,
+    weight_sum REAL NOT NULL DEFAULT 0,
+    first_seen INTEGER,
+    last_seen INTEGER,
+    PRIMARY KEY (user_id, product_id)
+) WITHOUT ROWID;
+
+-- Co-occurrence edges maintained on every interaction insert (left_id < right_id);
+-- WITHOUT ROWID keeps the rows in primary-key order, so the table is its own covering index
+CREATE TABLE IF NOT EXISTS product_edges (
+    left_id INTEGER NOT NULL,
+    right_id INTEGER NOT NULL,
+    strength REAL NOT NULL DEFAULT 0,
+    pair_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (left_id, right_id)
+) WITHOUT ROWID;
+
+-- Per-user pair budget product_edges were derived under (single row, 0 = unlimited);
+-- inserts keep applying it until rebuild_product_edges changes it
+CREATE TABLE IF NOT EXISTS product_edges_config (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    pair_budget INTEGER NOT NULL DEFAULT 0
+);
+
 CREATE INDEX IF NOT EXISTS idx_admin_audit_logs_created_at ON admin_audit_logs(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_admin_audit_logs_action ON admin_audit_logs(action);
 CREATE INDEX IF NOT EXISTS idx_product_sizes_product_id ON product_sizes(product_id);
+CREATE INDEX IF NOT EXISTS idx_user_product_affinity_product ON user_product_affinity(product_id);
+-- A user's heaviest products first, so budgeted edge upserts read only the active basket
+CREATE INDEX IF NOT EXISTS idx_user_product_affinity_user_weight ON user_product_affinity(user_id, max_weight DESC, product_id);
 '''
 
+# Interaction weight as the graph builders read it (missing or zero counts as 1)
+EFFECTIVE_WEIGHT = 'COALESCE(NULLIF(weight, 0), 1.0)'
+
+# Compact the raw log into user_product_affinity (databases that predate it)
+AFFINITY_BACKFILL = f'''
+INSERT INTO user_product_affinity (
+    user_id, product_id, interaction_count, view_count, like_count, add_to_cart_count,
+    max_weight, weight_sum, first_seen, last_seen
+)
+SELECT user_id, product_id, COUNT(*),
+       SUM(action_code = 1), SUM(action_code = 2), SUM(action_code = 3),
+       MAX({EFFECTIVE_WEIGHT}), SUM({EFFECTIVE_WEIGHT}), MIN(created_at), MAX(created_at)
+FROM interactions
+GROUP BY user_id, product_id
+'''
+
+# Recompute product_edges from the compacted baskets: every product pair
+# within a user's active basket, weighted by the user's max weight per
+# product.  The active basket is all of it, or with a pair budget the
+# :basket_cap heaviest products (ties by id), as GraphAccumulator picks them
+PRODUCT_EDGES_BACKFILL = '''
+INSERT INTO product_edges (left_id, right_id, strength, pair_count)
+WITH active AS (
+    SELECT user_id, product_id, max_weight FROM (
+        SELECT user_id, product_id, max_weight,
+               ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY max_weight DESC, product_id) AS position
+        FROM user_product_affinity
+    )
+    WHERE :basket_cap IS NULL OR position <= :basket_cap
+)
+SELECT a.product_id, b.product_id, SUM((a.max_weight + b.max_weight) / 2.0), COUNT(*)
+FROM active a
+JOIN active b ON a.user_id = b.user_id AND a.product_id < b.product_id
+GROUP BY a.product_id, b.product_id
+'''
+
+# Pre-compaction layout: TEXT action, inline JSON metadata, DATETIME string
+LEGACY_INTERACTION_COLUMNS = [
+    "ALTER TABLE interactions ADD COLUMN interaction_type TEXT DEFAULT 'view'",
+    "ALTER TABLE interactions ADD COLUMN weight REAL DEFAULT 1",
+    "ALTER TABLE interactions ADD COLUMN metadata TEXT",
+    "ALTER TABLE interactions ADD COLUMN rating INTEGER DEFAULT 1",
+]
+
+LEGACY_INTERACTIONS_COPY = '''
+INSERT INTO interactions (id, user_id, product_id, action_code, weight, rating, metadata_id, created_at)
+SELECT l.id, l.user_id, l.product_id, a.code, l.weight, l.rating, m.id,
+       COALESCE(CAST(strftime('%s', l.timestamp) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+FROM interactions_legacy l
+JOIN interaction_actions a ON a.name = COALESCE(l.interaction_type, 'view')
+LEFT JOIN interaction_metadata m ON m.payload = l.metadata
+ORDER BY l.id
+'''
+
+# Raw events moved out of the hot database by the archival job
+ARCHIVE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cold.interactions (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    interaction_type TEXT,
+    weight REAL,
+    rating INTEGER,
+    metadata TEXT,
+    timestamp DATETIME,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+
+def _migrate_interactions(cur: sqlite3.Cursor) -> None:
+    """Rewrite a pre-compaction ``interactions`` table into the integer-coded layout."""
+
+    columns = {row[1] for row in cur.execute('PRAGMA table_info(interactions)')}
+    if not columns or 'action_code' in columns:
+        return
+    conn = cur.connection
+    conn.commit()
+    # Older files hold interactions of since-deleted products; keep them as they are
+    cur.execute('PRAGMA foreign_keys = OFF')
+    cur.execute('BEGIN')
+    for stmt in LEGACY_INTERACTION_COLUMNS:
+        try:
+            cur.execute(stmt)
+        except sqlite3.OperationalError:
+            # Column already exists
+            continue
+    cur.execute('ALTER TABLE interactions RENAME TO interactions_legacy')
+    cur.execute(INTERACTIONS_TABLE)
+    cur.execute(
+        "INSERT OR IGNORE INTO interaction_actions (name) "
+        "SELECT DISTINCT COALESCE(interaction_type, 'view') FROM interactions_legacy"
+    )
+    cur.execute(
+        'INSERT OR IGNORE INTO interaction_metadata (payload) '
+        'SELECT DISTINCT metadata FROM interactions_legacy WHERE metadata IS NOT NULL'
+    )
+    cur.execute(LEGACY_INTERACTIONS_COPY)
+    cur.execute('DROP TABLE interactions_legacy')
+    # Affinity rows compacted before the migration carry DATETIME strings
+    cur.execute('''
+        UPDATE user_product_affinity
+        SET first_seen = CAST(strftime('%s', first_seen) AS INTEGER),
+            last_seen = CAST(strftime('%s', last_seen) AS INTEGER)
+        WHERE typeof(last_seen) = 'text'
+    ''')
+    conn.commit()
+    cur.execute('PRAGMA foreign_keys = ON')
+
 
 def init_db(path=None):
     db_file = path or DB_PATH
@@ -108,10 +284,6 @@ def init_db(path=None):
     cur.executescript(SCHEMA)
     # Lightweight migrations for older SQLite files
     alters = [
-        "ALTER TABLE interactions ADD COLUMN interaction_type TEXT DEFAULT 'view'",
-        "ALTER TABLE interactions ADD COLUMN weight REAL DEFAULT 1",
-        "ALTER TABLE interactions ADD COLUMN metadata TEXT",
-        "ALTER TABLE interactions ADD COLUMN rating INTEGER DEFAULT 1",
         "ALTER TABLE categories ADD COLUMN position INTEGER DEFAULT 0",
         "ALTER TABLE users ADD COLUMN external_id TEXT",
         "ALTER TABLE users ADD COLUMN email TEXT",
@@ -129,6 +301,18 @@ def init_db(path=None):
     except sqlite3.OperationalError:
         # Column may not exist yet if prior schema missing; skip until next run
         pass
+    _migrate_interactions(cur)
+    cur.execute(INTERACTIONS_TABLE)
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_interactions_product_id ON interactions(product_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_interactions_created_at ON interactions(created_at)')
+    # Databases created before the derived tables existed: fill them once
+    if cur.execute('SELECT 1 FROM user_product_affinity LIMIT 1').fetchone() is None:
+        cur.execute(AFFINITY_BACKFILL)
+    # Existing edges were derived without a budget
+    cur.execute('INSERT OR IGNORE INTO product_edges_config (id, pair_budget) VALUES (1, 0)')
+    if cur.execute('SELECT 1 FROM product_edges LIMIT 1').fetchone() is None:
+        cur.execute('UPDATE product_edges_config SET pair_budget = 0')
+        cur.execute(PRODUCT_EDGES_BACKFILL, {'basket_cap': None})
     cur.execute('''
         UPDATE categories SET position = id
         WHERE position IS NULL OR position = 0
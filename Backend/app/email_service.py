@@ -2,9 +2,9 @@ import logging
 import os
 import smtplib
 from email.message import EmailMessage
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from . import crud, recommender
+from . import crud, recommender, collab_executor
 
 logger = logging.getLogger(__name__)
 
@@ -81,9 +81,19 @@ def broadcast_marketing_email(
     return summary
 
 
-def _recommendations_for_user(user_id: int, *, limit: int) -> List[Dict[str, Any]]:
-    interactions = crud.get_interactions()
-    ranked = recommender.recommend_by_collab(user_id, interactions, top_k=max(limit * 3, 5))
+def _ranking_depth(limit: int) -> int:
+    return max(limit * 3, 5)
+
+
+def _recommendations_for_user(
+    user_id: int,
+    *,
+    limit: int,
+    ranked: Optional[List[Tuple[int, float]]] = None,
+) -> List[Dict[str, Any]]:
+    if ranked is None:
+        interactions = crud.list_affinity_interactions()
+        ranked = recommender.recommend_by_collab(user_id, interactions, top_k=_ranking_depth(limit))
     recommendations: List[Dict[str, Any]] = []
     for product_id, score in ranked:
         product = crud.get_product(product_id)
@@ -128,7 +138,12 @@ def _compose_recommendation_email(user: Dict[str, Any], recs: List[Dict[str, Any
     return {'subject': subject, 'content': '\n'.join(lines)}
 
 
-def send_recommendation_email(user_id: int, *, limit: int = 3) -> Dict[str, Optional[str]]:
+def send_recommendation_email(
+    user_id: int,
+    *,
+    limit: int = 3,
+    ranked: Optional[List[Tuple[int, float]]] = None,
+) -> Dict[str, Optional[str]]:
     user = crud.get_user_contact(user_id)
     if not user:
         return {'status': 'skipped', 'reason': 'missing-user'}
@@ -138,7 +153,7 @@ def send_recommendation_email(user_id: int, *, limit: int = 3) -> Dict[str, Opti
     if not email:
         return {'status': 'skipped', 'reason': 'missing-email'}
 
-    recommendations = _recommendations_for_user(user_id, limit=limit)
+    recommendations = _recommendations_for_user(user_id, limit=limit, ranked=ranked)
     if not recommendations:
         return {'status': 'skipped', 'reason': 'no-recommendations'}
 
@@ -164,9 +179,16 @@ def broadcast_recommendation_email(*, limit: int = 3, target_user_ids: Optional[
     else:
         recipients = crud.list_opted_in_users()
 
+    # Score every recipient against a single graph build
+    rankings = collab_executor.get_executor().recommend_many(
+        [user['id'] for user in recipients],
+        crud.list_affinity_interactions(),
+        top_k=_ranking_depth(limit),
+    ) if recipients else {}
+
     summary = {'sent': 0, 'mocked': 0, 'skipped': 0, 'failed': 0, 'total': len(recipients)}
     for user in recipients:
-        result = send_recommendation_email(user['id'], limit=limit)
+        result = send_recommendation_email(user['id'], limit=limit, ranked=rankings.get(user['id'], []))
         status = result.get('status') or 'failed'
         summary[status] = summary.get(status, 0) + 1
     return summary
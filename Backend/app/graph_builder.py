@@ -0,0 +1,742 @@
+"""Incremental accumulation of the weighted product graph.
+
+``main._build_weighted_graph`` derives three things from the interaction
+log: each user's max weight per product, product popularity (sum of
+weights) and co-occurrence ``edge_strength`` between product pairs.
+:class:`GraphAccumulator` keeps those structures and can update them
+one interaction at a time, so callers are not forced into a full rescan.
+
+Time decay
+----------
+With a half-life ``h`` an interaction of weight ``w`` at time ``t`` is
+worth ``w * 2 ** (-(now - t) / h)``.  Rather than touching every entry
+as ``now`` advances, values are stored in units of a fixed anchor time
+(``w * 2 ** ((t - anchor) / h)``) and a single global factor
+``2 ** (-(now - anchor) / h)`` converts them on read.  Max, sum and the
+pair average ``(a + b) / 2`` all commute with a common positive scale,
+so popularity and edge strengths stay exact while advancing the clock is
+O(1).  The anchor is rebased (one pass) before the stored exponent can
+overflow, and exponents are clamped so far-off timestamps saturate
+instead of raising.
+
+Sparsification
+--------------
+Popular products co-occur with almost everything, so the raw pair map is
+close to complete around hubs.  :func:`sparsify_edges` caps it to the
+strongest links per product before the graph is materialised.
+
+Incremental refresh
+-------------------
+:class:`IncrementalGraph` keeps a full-history accumulator alive between
+builds and applies only the interactions and product changes recorded
+after the ids it last saw.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from .graph_mapreduce import edge_maps_from_baskets
+from .topk import select_top_k
+
+# Edge strengths below this are float residue from incremental updates
+_EPSILON = 1e-12
+# Rebase the anchor once stored values carry this many half-lives of growth
+_REBASE_HALF_LIVES = 64
+# 2 ** 1023 is the largest finite power of two; beyond it ``**`` raises
+_MAX_EXPONENT = 1000.0
+
+# (user_id, product_id, weight, created_at epoch) as streamed from the interactions table
+InteractionRecord = Tuple[int, int, Optional[float], Any]
+
+
+def basket_cap(pair_budget: int) -> Optional[int]:
+    """Largest basket whose pairs fit the per-user budget (``None`` = unlimited)."""
+
+    return (1 + math.isqrt(1 + 8 * pair_budget)) // 2 if pair_budget > 0 else None
+
+
+def parse_timestamp(value: Any) -> float:
+    """Epoch seconds for an ``interactions.created_at`` value or an ISO timestamp (UTC)."""
+
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class DecayClock:
+    """Converts between event-time weights and anchor-scaled stored values."""
+
+    def __init__(self, half_life_seconds: Optional[float], anchor: float) -> None:
+        self.half_life = half_life_seconds if half_life_seconds and half_life_seconds > 0 else None
+        self.anchor = anchor
+
+    @property
+    def enabled(self) -> bool:
+        return self.half_life is not None
+
+    def _power(self, delta: float) -> float:
+        return 2.0 ** min(delta / self.half_life, _MAX_EXPONENT)
+
+    def scale(self, timestamp: float) -> float:
+        if self.half_life is None:
+            return 1.0
+        return self._power(timestamp - self.anchor)
+
+    def factor(self, now: float) -> float:
+        if self.half_life is None:
+            return 1.0
+        return self._power(self.anchor - now)
+
+
+class GraphAccumulator:
+    """User baskets, popularity and pair strengths with lazy time decay."""
+
+    def __init__(
+        self,
+        *,
+        half_life_seconds: Optional[float] = None,
+        now: Optional[float] = None,
+        pair_budget: int = 0,
+    ) -> None:
+        now = time.time() if now is None else now
+        self.clock = DecayClock(half_life_seconds, anchor=now)
+        self.basket_cap = basket_cap(pair_budget)
+        self.now = now
+        self.user_weights: Dict[int, Dict[int, float]] = defaultdict(dict)
+        self.popularity: Dict[int, float] = defaultdict(float)
+        self.edge_strength: Dict[Tuple[int, int], float] = defaultdict(float)
+        # Number of users whose basket holds both products of a pair
+        self.pair_counts: Dict[Tuple[int, int], int] = defaultdict(int)
+        self.interaction_count = 0
+        # Interactions per product, so a dropped product's share can be taken back out
+        self.product_counts: Dict[int, int] = defaultdict(int)
+        # Entries dropped by ``prune_below`` during a full build
+        self.pruned_entries = 0
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Mapping[str, Any]],
+        *,
+        half_life_seconds: Optional[float] = None,
+        now: Optional[float] = None,
+        pair_budget: int = 0,
+        workers: int = 0,
+        prune_below: float = 0.0,
+    ) -> 'GraphAccumulator':
+        """Full build: aggregate baskets first, then enumerate pairs once.
+
+        ``workers > 0`` enumerates pairs with the sharded NumPy map-reduce
+        in :mod:`graph_mapreduce` (``1`` in-process, more on a process pool).
+        ``prune_below`` drops decayed entries before pairs are enumerated.
+        """
+
+        records = ((row['user_id'], row['product_id'], row.get('weight'), row.get('timestamp')) for row in rows)
+        return cls.from_records(
+            records,
+            half_life_seconds=half_life_seconds,
+            now=now,
+            pair_budget=pair_budget,
+            workers=workers,
+            prune_below=prune_below,
+        )
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[InteractionRecord],
+        *,
+        half_life_seconds: Optional[float] = None,
+        now: Optional[float] = None,
+        pair_budget: int = 0,
+        workers: int = 0,
+        prune_below: float = 0.0,
+    ) -> 'GraphAccumulator':
+        """:meth:`from_rows` over ``(user_id, product_id, weight, timestamp)`` tuples.
+
+        Records are consumed one at a time, so a streaming reader such as
+        ``crud.iter_interactions_for_graph`` never has to be materialised.
+        """
+
+        accumulator = cls(half_life_seconds=half_life_seconds, now=now, pair_budget=pair_budget)
+        for uid, pid, weight, timestamp in records:
+            weight = accumulator._record(pid, weight, timestamp)
+            basket = accumulator.user_weights[uid]
+            if weight > basket.get(pid, 0.0):
+                basket[pid] = weight
+        accumulator.pruned_entries = accumulator._prune_unlinked(prune_below)
+        accumulator._rebuild_edges(workers)
+        return accumulator
+
+    @classmethod
+    def from_affinity(
+        cls,
+        rows: Iterable[Tuple[int, int, float, float, int]],
+        *,
+        now: Optional[float] = None,
+        pair_budget: int = 0,
+        workers: int = 0,
+        prune_below: float = 0.0,
+    ) -> 'GraphAccumulator':
+        """Full build from compacted ``(user_id, product_id, max_weight, weight_sum, count)`` rows.
+
+        Equals :meth:`from_records` over the raw events without decay: baskets
+        keep the max weight and popularity the summed weight.
+        """
+
+        accumulator = cls(now=now, pair_budget=pair_budget)
+        for uid, pid, max_weight, weight_sum, count in rows:
+            accumulator.popularity[pid] += weight_sum
+            accumulator.interaction_count += count
+            accumulator.product_counts[pid] += count
+            if max_weight > 0:
+                accumulator.user_weights[uid][pid] = max_weight
+        accumulator.pruned_entries = accumulator._prune_unlinked(prune_below)
+        accumulator._rebuild_edges(workers)
+        return accumulator
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def _record(self, pid: int, weight: Optional[float], timestamp: Any) -> float:
+        """Count an interaction towards popularity; return its (scaled) weight."""
+
+        weight = float(weight or 1.0)
+        if self.clock.enabled:
+            weight *= self.clock.scale(parse_timestamp(timestamp))
+        self.popularity[pid] += weight
+        self.interaction_count += 1
+        self.product_counts[pid] += 1
+        return weight
+
+    def _rebuild_edges(self, workers: int = 0) -> None:
+        if workers > 0:
+            active = {uid: self._active_items(basket) for uid, basket in self.user_weights.items()}
+            strength, counts = edge_maps_from_baskets(active, workers=workers)
+            self.edge_strength = defaultdict(float, strength)
+            self.pair_counts = defaultdict(int, counts)
+            return
+        self.edge_strength = defaultdict(float)
+        self.pair_counts = defaultdict(int)
+        for basket in self.user_weights.values():
+            self._contribute(basket, 1)
+
+    def _active_items(self, basket: Mapping[int, float]) -> List[Tuple[int, float]]:
+        """Basket entries that take part in pairs: all, or the heaviest ``basket_cap``.
+
+        Stored weights carry the decay scale, so with a half-life this
+        prefers recent interactions as well as strong ones.
+        """
+
+        if self.basket_cap is None or len(basket) <= self.basket_cap:
+            return sorted(basket.items())
+        return sorted(select_top_k(basket.items(), self.basket_cap, key=lambda item: (-item[1], item[0])))
+
+    def _contribute(self, basket: Mapping[int, float], sign: int) -> None:
+        """Add (``sign=1``) or withdraw (``sign=-1``) one basket's pair edges."""
+
+        items = self._active_items(basket)
+        for idx in range(len(items)):
+            left_id, left_weight = items[idx]
+            for jdx in range(idx + 1, len(items)):
+                right_id, right_weight = items[jdx]
+                key = (left_id, right_id)
+                strength = self.edge_strength.get(key, 0.0) + sign * (left_weight + right_weight) / 2.0
+                count = self.pair_counts.get(key, 0) + sign
+                if strength > _EPSILON and count > 0:
+                    self.edge_strength[key] = strength
+                    self.pair_counts[key] = count
+                else:
+                    self.edge_strength.pop(key, None)
+                    self.pair_counts.pop(key, None)
+
+    def skipped_pairs(self) -> int:
+        """Pairs left out because baskets exceed the per-user budget."""
+
+        if self.basket_cap is None:
+            return 0
+        cap_pairs = self.basket_cap * (self.basket_cap - 1) // 2
+        return sum(
+            len(basket) * (len(basket) - 1) // 2 - cap_pairs
+            for basket in self.user_weights.values()
+            if len(basket) > self.basket_cap
+        )
+
+    def add(self, row: Mapping[str, Any]) -> None:
+        """Apply one new interaction incrementally."""
+
+        uid, pid = row['user_id'], row['product_id']
+        weight = self._record(pid, row.get('weight'), row.get('timestamp'))
+        if weight > self.user_weights.get(uid, {}).get(pid, 0.0):
+            self.set_user_weight(uid, pid, weight)
+
+    def set_user_weight(self, uid: int, pid: int, value: float) -> None:
+        """Change (or with ``value <= 0`` drop) a basket entry, adjusting its pair edges."""
+
+        basket = self.user_weights.get(uid)
+        old = basket.get(pid) if basket is not None else None
+        if old is None and value <= 0:
+            return
+        if basket is None:
+            basket = self.user_weights[uid]
+        if self.basket_cap is not None and len(basket) + (old is None) > self.basket_cap:
+            # Heavy user: the active subset may change, so swap its whole
+            # contribution (bounded by the pair budget) instead of patching
+            self._contribute(basket, -1)
+            self._store(uid, basket, pid, value)
+            self._contribute(basket, 1)
+            return
+
+        for other, other_weight in basket.items():
+            if other == pid:
+                continue
+            key = (pid, other) if pid < other else (other, pid)
+            if old is None:
+                delta = (value + other_weight) / 2.0
+                self.pair_counts[key] += 1
+            elif value > 0:
+                delta = (value - old) / 2.0
+            else:
+                delta = -(old + other_weight) / 2.0
+                self.pair_counts[key] -= 1
+            strength = self.edge_strength.get(key, 0.0) + delta
+            if strength > _EPSILON and self.pair_counts.get(key, 0) > 0:
+                self.edge_strength[key] = strength
+            else:
+                self.edge_strength.pop(key, None)
+                self.pair_counts.pop(key, None)
+        self._store(uid, basket, pid, value)
+
+    def _store(self, uid: int, basket: Dict[int, float], pid: int, value: float) -> None:
+        if value > 0:
+            basket[pid] = value
+        else:
+            basket.pop(pid, None)
+            if not basket:
+                del self.user_weights[uid]
+
+    # ------------------------------------------------------------------
+    # Decay
+    # ------------------------------------------------------------------
+    @property
+    def factor(self) -> float:
+        return self.clock.factor(self.now)
+
+    def advance(self, now: Optional[float] = None) -> None:
+        """Move the decay clock forward; O(1) unless the anchor needs a rebase."""
+
+        self.now = time.time() if now is None else now
+        if self.clock.enabled and self.now - self.clock.anchor > _REBASE_HALF_LIVES * self.clock.half_life:
+            self._rebase()
+
+    def _rebase(self) -> None:
+        factor = self.factor
+        for basket in self.user_weights.values():
+            for pid in basket:
+                basket[pid] *= factor
+        for pid in self.popularity:
+            self.popularity[pid] *= factor
+        for key in self.edge_strength:
+            self.edge_strength[key] *= factor
+        self.clock.anchor = self.now
+
+    def _below(self, threshold: float) -> Callable[[float], bool]:
+        factor = self.factor
+        # Multiply rather than divide: the factor underflows to 0 far from the anchor
+        return lambda stored: stored * factor < threshold
+
+    def prune(self, threshold: float) -> int:
+        """Drop basket and popularity entries whose decayed weight is below ``threshold``."""
+
+        if threshold <= 0:
+            return 0
+        below = self._below(threshold)
+        removed = 0
+        for uid in list(self.user_weights):
+            for pid, weight in list(self.user_weights[uid].items()):
+                if below(weight):
+                    self.set_user_weight(uid, pid, 0.0)
+                    removed += 1
+        for pid in [pid for pid, value in self.popularity.items() if below(value)]:
+            del self.popularity[pid]
+        return removed
+
+    def _prune_unlinked(self, threshold: float) -> int:
+        """:meth:`prune` for full builds, before any pair edge exists."""
+
+        if threshold <= 0:
+            return 0
+        below = self._below(threshold)
+        removed = 0
+        for uid in list(self.user_weights):
+            basket = self.user_weights[uid]
+            for pid in [pid for pid, weight in basket.items() if below(weight)]:
+                self._store(uid, basket, pid, 0.0)
+                removed += 1
+        for pid in [pid for pid, value in self.popularity.items() if below(value)]:
+            del self.popularity[pid]
+        return removed
+
+    # ------------------------------------------------------------------
+    # Decayed views
+    # ------------------------------------------------------------------
+    def decayed_popularity(self) -> Dict[int, float]:
+        factor = self.factor
+        return {pid: value * factor for pid, value in self.popularity.items()}
+
+    def edge_items(self) -> Iterator[Tuple[Tuple[int, int], float]]:
+        factor = self.factor
+        for key, strength in self.edge_strength.items():
+            yield key, strength * factor
+
+
+@dataclass(frozen=True)
+class SparsifyReport:
+    edges_before: int
+    edges_after: int
+    below_min_cooccurrence: int
+    beyond_max_degree: int
+    bytes_before: int
+    bytes_after: int
+
+    @property
+    def bytes_removed(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            'edges_before': self.edges_before,
+            'edges_after': self.edges_after,
+            'below_min_cooccurrence': self.below_min_cooccurrence,
+            'beyond_max_degree': self.beyond_max_degree,
+            'bytes_removed': self.bytes_removed,
+        }
+
+
+def _edge_bytes(edges: Mapping[Tuple[int, int], float]) -> int:
+    """Approximate footprint of an edge map (dict + key tuples + float values)."""
+
+    if not edges:
+        return sys.getsizeof({})
+    sample_key, sample_value = next(iter(edges.items()))
+    per_entry = sys.getsizeof(sample_key) + sys.getsizeof(sample_value)
+    return sys.getsizeof(edges) + per_entry * len(edges)
+
+
+def sparsify_edges(
+    edges: Mapping[Tuple[int, int], float],
+    *,
+    max_degree: int = 0,
+    min_cooccurrence: int = 0,
+    pair_counts: Optional[Mapping[Tuple[int, int], int]] = None,
+) -> Tuple[Dict[Tuple[int, int], float], SparsifyReport]:
+    """Keep each product's ``max_degree`` strongest edges, then trim hubs.
+
+    Every product nominates its ``max_degree`` strongest edges (strength
+    desc, then pair asc) and the union of the nominations is kept, so a
+    leaf whose links all point at popular hubs still keeps its best one.
+    Hubs that end up above the cap then lose their weakest edges, except
+    an edge that is the other product's last remaining link: a product
+    with edges before pruning is never left isolated, and only such
+    last links can push a hub past ``max_degree``.  Pairs seen in fewer
+    than ``min_cooccurrence`` baskets (per ``pair_counts``) are dropped
+    first.  ``0`` disables either limit.
+    """
+
+    edges = dict(edges)
+    before = len(edges)
+    bytes_before = _edge_bytes(edges)
+
+    below_min = 0
+    if min_cooccurrence > 1 and pair_counts is not None:
+        kept = {key: value for key, value in edges.items() if pair_counts.get(key, 0) >= min_cooccurrence}
+        below_min = len(edges) - len(kept)
+        edges = kept
+
+    beyond_degree = 0
+    if max_degree > 0:
+        ranked = sorted(edges.items(), key=lambda item: (-item[1], item[0]))
+        nominated: Dict[int, int] = defaultdict(int)
+        kept = {}
+        for key, strength in ranked:
+            left_id, right_id = key
+            if nominated[left_id] < max_degree or nominated[right_id] < max_degree:
+                kept[key] = strength
+            nominated[left_id] += 1
+            nominated[right_id] += 1
+        degree: Dict[int, int] = defaultdict(int)
+        for left_id, right_id in kept:
+            degree[left_id] += 1
+            degree[right_id] += 1
+        for key, _strength in reversed(ranked):
+            if key not in kept:
+                continue
+            left_id, right_id = key
+            over_cap = degree[left_id] > max_degree or degree[right_id] > max_degree
+            if over_cap and degree[left_id] > 1 and degree[right_id] > 1:
+                del kept[key]
+                degree[left_id] -= 1
+                degree[right_id] -= 1
+        beyond_degree = len(edges) - len(kept)
+        edges = kept
+
+    report = SparsifyReport(
+        edges_before=before,
+        edges_after=len(edges),
+        below_min_cooccurrence=below_min,
+        beyond_max_degree=beyond_degree,
+        bytes_before=bytes_before,
+        bytes_after=_edge_bytes(edges),
+    )
+    return edges, report
+
+
+def sparsification_recall(full_graph: Any, sparse_graph: Any, seeds: Iterable[int], k: int = 10) -> float:
+    """Mean overlap of shortest-path top-k lists between two product graphs.
+
+    Both graphs must expose ``recommend_top_k`` (``ProductGraph``); this is
+    the quality check that a degree cap did not change recommendations.
+    """
+
+    overlaps = []
+    for seed in seeds:
+        reference = {product.id for product, _score in full_graph.recommend_top_k(seed, k=k)}
+        if not reference:
+            continue
+        candidate = {product.id for product, _score in sparse_graph.recommend_top_k(seed, k=k)}
+        overlaps.append(len(reference & candidate) / len(reference))
+    return sum(overlaps) / len(overlaps) if overlaps else 1.0
+
+
+# fetch(after_id, min_timestamp epoch) -> interaction rows ordered by id
+FetchRows = Callable[[int, Optional[float]], Iterable[Mapping[str, Any]]]
+
+
+class WindowedGraph:
+    """Accumulator restricted to interactions from the last ``window_seconds``.
+
+    New rows are applied as they arrive (tracked by interaction id) and
+    expired ones are subtracted again, so memory and refresh work follow
+    the recent activity instead of the whole history.  Per (user, product)
+    the live event weights are kept so the basket max can be recomputed
+    when its current maximum expires.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        *,
+        half_life_seconds: Optional[float] = None,
+        now: Optional[float] = None,
+        pair_budget: int = 0,
+    ) -> None:
+        if window_seconds <= 0:
+            raise ValueError('window_seconds must be positive')
+        self.window_seconds = window_seconds
+        self.accumulator = GraphAccumulator(half_life_seconds=half_life_seconds, now=now, pair_budget=pair_budget)
+        self.last_id = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        # (timestamp, interaction id, user id, product id, raw weight); raw
+        # weights are rescaled on eviction so anchor rebases stay consistent
+        self._expiry: List[Tuple[float, int, int, int, float]] = []
+        self._live: Dict[Tuple[int, int], List[Tuple[float, float]]] = defaultdict(list)
+
+    def cutoff(self, now: float) -> float:
+        return now - self.window_seconds
+
+    def _stored(self, weight: float, timestamp: float) -> float:
+        return weight * self.accumulator.clock.scale(timestamp)
+
+    def apply(self, rows: Iterable[Mapping[str, Any]], now: Optional[float] = None) -> int:
+        """Add rows newer than ``last_id`` that are still inside the window."""
+
+        cutoff = self.cutoff(time.time() if now is None else now)
+        accumulator = self.accumulator
+        added = 0
+        for row in rows:
+            iid = int(row.get('id') or 0)
+            self.last_id = max(self.last_id, iid)
+            timestamp = parse_timestamp(row.get('timestamp'))
+            if timestamp < cutoff:
+                continue
+            uid, pid = row['user_id'], row['product_id']
+            weight = float(row.get('weight') or 1.0)
+            stored = self._stored(weight, timestamp)
+            accumulator.popularity[pid] += stored
+            accumulator.interaction_count += 1
+            accumulator.product_counts[pid] += 1
+            heapq.heappush(self._expiry, (timestamp, iid, uid, pid, weight))
+            self._live[(uid, pid)].append((weight, timestamp))
+            if stored > accumulator.user_weights.get(uid, {}).get(pid, 0.0):
+                accumulator.set_user_weight(uid, pid, stored)
+            added += 1
+        return added
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Move the window (and decay clock) to ``now``; returns evicted events."""
+
+        now = time.time() if now is None else now
+        cutoff = self.cutoff(now)
+        accumulator = self.accumulator
+        evicted = 0
+        while self._expiry and self._expiry[0][0] < cutoff:
+            timestamp, _iid, uid, pid, weight = heapq.heappop(self._expiry)
+            remaining = accumulator.popularity.get(pid, 0.0) - self._stored(weight, timestamp)
+            if remaining > _EPSILON:
+                accumulator.popularity[pid] = remaining
+            else:
+                accumulator.popularity.pop(pid, None)
+            accumulator.interaction_count -= 1
+            accumulator.product_counts[pid] -= 1
+            if not accumulator.product_counts[pid]:
+                del accumulator.product_counts[pid]
+
+            live = self._live[(uid, pid)]
+            live.remove((weight, timestamp))
+            if not live:
+                del self._live[(uid, pid)]
+            new_max = max((self._stored(w, ts) for w, ts in live), default=0.0)
+            if new_max != accumulator.user_weights.get(uid, {}).get(pid, 0.0):
+                accumulator.set_user_weight(uid, pid, new_max)
+            evicted += 1
+        accumulator.advance(now)
+        self.evicted += evicted
+        return evicted
+
+    def sync(self, fetch: FetchRows, now: Optional[float] = None) -> Dict[str, int]:
+        """Pull new rows through ``fetch`` and slide the window; caller holds ``lock``."""
+
+        now = time.time() if now is None else now
+        min_timestamp = self.cutoff(now) if self.last_id == 0 else None
+        added = self.apply(fetch(self.last_id, min_timestamp), now=now)
+        evicted = self.advance(now)
+        return {'added': added, 'evicted': evicted}
+
+
+# fetch(after_id, max_id) -> interaction rows with after_id < id <= max_id, ordered by id
+FetchDelta = Callable[[int, int], Iterable[Mapping[str, Any]]]
+# fetch(after_change_id) -> product changelog rows ordered by id
+FetchChanges = Callable[[int], Iterable[Mapping[str, Any]]]
+
+
+class IncrementalGraph:
+    """Full-history accumulator kept current from change deltas.
+
+    Tracks the last applied ``interactions.id`` and ``product_changes.id``
+    so a refresh only reads rows written since the previous one.  Deleted
+    products are dropped from every basket and their later rows ignored.
+    Interactions are append-only from the graph's point of view: when the
+    table's row count no longer matches what was applied (rows deleted or
+    archived) the accumulator is rebuilt from scratch.
+    """
+
+    def __init__(
+        self,
+        *,
+        half_life_seconds: Optional[float] = None,
+        now: Optional[float] = None,
+        pair_budget: int = 0,
+    ) -> None:
+        self.half_life_seconds = half_life_seconds
+        self.pair_budget = pair_budget
+        self.lock = threading.Lock()
+        self.replays = 0
+        self.reset(now)
+
+    def reset(self, now: Optional[float] = None) -> None:
+        self.accumulator = GraphAccumulator(half_life_seconds=self.half_life_seconds, now=now, pair_budget=self.pair_budget)
+        self.last_id = 0
+        self.last_change_id = 0
+        # Rows consumed (including ignored ones), compared with the table's row count
+        self.row_count = 0
+        self.deleted: Set[int] = set()
+
+    def apply(self, rows: Iterable[Mapping[str, Any]]) -> int:
+        """Add rows newer than ``last_id``; returns how many reached the graph."""
+
+        added = 0
+        for row in rows:
+            iid = int(row.get('id') or 0)
+            if iid <= self.last_id:
+                continue
+            self.last_id = iid
+            self.row_count += 1
+            if row['product_id'] in self.deleted:
+                continue
+            self.accumulator.add(row)
+            added += 1
+        return added
+
+    def drop_product(self, pid: int) -> None:
+        """Remove ``pid`` from every basket, from popularity and from the interaction count."""
+
+        accumulator = self.accumulator
+        for uid in [uid for uid, basket in accumulator.user_weights.items() if pid in basket]:
+            accumulator.set_user_weight(uid, pid, 0.0)
+        accumulator.popularity.pop(pid, None)
+        accumulator.interaction_count -= accumulator.product_counts.pop(pid, 0)
+
+    def apply_changes(self, changes: Iterable[Mapping[str, Any]]) -> int:
+        """Apply product changelog rows; returns the number of products dropped.
+
+        Updates carry nothing the edge maps depend on (names, categories and
+        prices are read when the graph is materialised), so only deletes and
+        re-creations of a deleted id matter here.
+        """
+
+        dropped = 0
+        for change in changes:
+            self.last_change_id = max(self.last_change_id, int(change['id']))
+            pid = change['product_id']
+            if change['change'] == 'delete' and pid not in self.deleted:
+                self.deleted.add(pid)
+                self.drop_product(pid)
+                dropped += 1
+            elif change['change'] == 'create':
+                self.deleted.discard(pid)
+        return dropped
+
+    def sync(
+        self,
+        fetch_rows: FetchDelta,
+        fetch_changes: FetchChanges,
+        high_water_mark: Tuple[int, int],
+        now: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Apply changes up to ``high_water_mark`` (max id, row count); caller holds ``lock``.
+
+        The mark is read before fetching so rows that race in are left for
+        the next sync instead of breaking the row-count check.
+        """
+
+        max_id, count = high_water_mark
+        replayed = 0
+        if max_id < self.last_id:
+            self.reset(now)
+            replayed = 1
+        dropped = self.apply_changes(fetch_changes(self.last_change_id))
+        added = self.apply(fetch_rows(self.last_id, max_id))
+        if self.row_count != count:
+            # Rows below last_id disappeared: the deltas cannot express that
+            self.reset(now)
+            dropped = self.apply_changes(fetch_changes(0))
+            added = self.apply(fetch_rows(0, max_id))
+            replayed = 1
+        self.replays += replayed
+        self.accumulator.advance(now)
+        return {'added': added, 'dropped_products': dropped, 'replayed': replayed}
@@ -0,0 +1,150 @@
+"""Compressed sparse row (CSR) forms of the product and bipartite graphs.
+
+The dict-of-dicts adjacency in ``product_graph`` and the dict-of-sets
+bipartite maps in ``recommender`` are convenient for traversals but every
+vectorised algorithm wants flat arrays.  Node positions follow ascending
+id, so sorting by position preserves the ``id asc`` tie-break used
+everywhere else.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from .product_graph import Product, ProductGraph
+
+
+@dataclass(frozen=True)
+class CSRGraph:
+    """Adjacency arrays: neighbours of node ``i`` are ``indices[indptr[i]:indptr[i + 1]]``.
+
+    ``weights`` holds the edge costs exactly as stored on the product graph
+    (lower cost = stronger link).
+    """
+
+    node_ids: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    _positions: Dict[int, int] = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if not self._positions:
+            self._positions.update({int(pid): pos for pos, pid in enumerate(self.node_ids.tolist())})
+
+    @classmethod
+    def from_product_graph(cls, graph: ProductGraph) -> 'CSRGraph':
+        node_ids = sorted(product.id for product in graph.products())
+        positions = {pid: pos for pos, pid in enumerate(node_ids)}
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        indices = []
+        weights = []
+        for pos, pid in enumerate(node_ids):
+            neighbours = graph.neighbors(pid)
+            for nb in sorted(neighbours):
+                indices.append(positions[nb])
+                weights.append(neighbours[nb])
+            indptr[pos + 1] = len(indices)
+        return cls(
+            node_ids=np.asarray(node_ids, dtype=np.int64),
+            indptr=indptr,
+            indices=np.asarray(indices, dtype=np.int64),
+            weights=np.asarray(weights, dtype=np.float64),
+            _positions=positions,
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return int(self.node_ids.size)
+
+    @property
+    def num_edges(self) -> int:
+        """Directed entries; an undirected edge counts twice."""
+
+        return int(self.indices.size)
+
+    def position(self, product_id: int) -> int:
+        return self._positions[product_id]
+
+    def has_node(self, product_id: int) -> bool:
+        return product_id in self._positions
+
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def row_sources(self) -> np.ndarray:
+        """Source position of every entry in ``indices``."""
+
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int64), self.degrees())
+
+
+class CSRProductGraph(ProductGraph):
+    """Read-only :class:`ProductGraph` whose adjacency is read from CSR arrays.
+
+    Snapshot-backed workers wrap the mapped (or shared-memory) arrays in
+    this instead of copying every edge into dicts, so a worker holds the
+    product catalogue plus the rows a request touches.  Neighbours outside
+    ``products`` (deleted since the arrays were built) are left out.
+    """
+
+    def __init__(self, products: Iterable[Product], csr: CSRGraph) -> None:
+        self._products = {product.id: product for product in products}
+        self.csr = csr
+
+    def add_product(self, product: Product) -> None:
+        raise TypeError('CSRProductGraph is read-only')
+
+    def add_edge(self, a: int, b: int, weight: float, bidirectional: bool = True) -> None:
+        raise TypeError('CSRProductGraph is read-only')
+
+    def neighbors(self, product_id: int) -> Dict[int, float]:
+        csr = self.csr
+        if not csr.has_node(product_id):
+            return {}
+        pos = csr.position(product_id)
+        start, end = int(csr.indptr[pos]), int(csr.indptr[pos + 1])
+        ids = csr.node_ids[csr.indices[start:end]].tolist()
+        return {
+            neighbour: cost
+            for neighbour, cost in zip(ids, csr.weights[start:end].tolist())
+            if neighbour in self._products
+        }
+
+
+def _adjacency_csr(rows: List[int], adjacency: Dict[int, Set[int]], column_index: Dict[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    for pos, row in enumerate(rows):
+        indptr[pos + 1] = indptr[pos] + len(adjacency[row])
+    indices = np.empty(int(indptr[-1]), dtype=np.int64)
+    for pos, row in enumerate(rows):
+        cols = sorted(column_index[col] for col in adjacency[row])
+        indices[indptr[pos]:indptr[pos + 1]] = cols
+    return indptr, indices
+
+
+def bipartite_csr(
+    user_to_products: Dict[int, Set[int]],
+    product_to_users: Dict[int, Set[int]],
+) -> Tuple[List[int], List[int], Dict[str, np.ndarray]]:
+    """CSR arrays for both sides of ``build_bipartite_graph`` output.
+
+    Returns ``(user_ids, product_ids, arrays)`` where ``arrays`` holds
+    ``user_indptr``/``user_products`` and ``product_indptr``/``product_users``
+    in position space (ids sorted ascending).
+    """
+
+    user_ids = sorted(user_to_products)
+    product_ids = sorted(product_to_users)
+    user_index = {uid: pos for pos, uid in enumerate(user_ids)}
+    product_index = {pid: pos for pos, pid in enumerate(product_ids)}
+    user_indptr, user_products = _adjacency_csr(user_ids, user_to_products, product_index)
+    product_indptr, product_users = _adjacency_csr(product_ids, product_to_users, user_index)
+    return user_ids, product_ids, {
+        'user_indptr': user_indptr,
+        'user_products': user_products,
+        'product_indptr': product_indptr,
+        'product_users': product_users,
+    }
@@ -0,0 +1,150 @@
+"""Map-reduce build of the co-occurrence edge map.
+
+A full rebuild of ``GraphAccumulator.edge_strength`` enumerates every
+product pair of every basket, which is the dominant cost of
+``main._build_weighted_graph`` and runs on one core.  Here the baskets are
+flattened into NumPy arrays and split into contiguous user shards of
+roughly equal *pair* count:
+
+* **map** - each shard expands its baskets into ``(left, right, strength)``
+  pair arrays (baskets of equal size are expanded together with one
+  ``triu_indices`` gather) and reduces them locally;
+* **reduce** - the parent concatenates the shard outputs and merges
+  duplicate pairs with a lexsort + ``np.add.reduceat`` pass.
+
+Shards run on a spawn ``ProcessPoolExecutor`` once the build is large
+enough to amortise the worker start-up; smaller builds run the same
+kernels in-process.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+import numpy as np
+
+# Below this many pairs the pool start-up costs more than it saves
+MIN_PARALLEL_PAIRS = 200_000
+
+# (left ids, right ids, summed strength, basket counts)
+PairArrays = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def flatten_baskets(baskets: Iterable[List[Tuple[int, float]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """``(product_ids, weights, offsets)`` for baskets sorted by product id."""
+
+    pids: List[int] = []
+    weights: List[float] = []
+    offsets = [0]
+    for items in baskets:
+        for pid, weight in items:
+            pids.append(pid)
+            weights.append(weight)
+        offsets.append(len(pids))
+    return (
+        np.asarray(pids, dtype=np.int64),
+        np.asarray(weights, dtype=np.float64),
+        np.asarray(offsets, dtype=np.int64),
+    )
+
+
+def reduce_pairs(left: np.ndarray, right: np.ndarray, strength: np.ndarray, counts: np.ndarray) -> PairArrays:
+    """Merge duplicate ``(left, right)`` entries, summing strength and counts."""
+
+    if left.size == 0:
+        return left, right, strength, counts
+    order = np.lexsort((right, left))
+    left, right, strength, counts = left[order], right[order], strength[order], counts[order]
+    boundary = np.empty(left.size, dtype=bool)
+    boundary[0] = True
+    boundary[1:] = (left[1:] != left[:-1]) | (right[1:] != right[:-1])
+    starts = np.flatnonzero(boundary)
+    return left[starts], right[starts], np.add.reduceat(strength, starts), np.add.reduceat(counts, starts)
+
+
+def map_pairs(pids: np.ndarray, weights: np.ndarray, offsets: np.ndarray) -> PairArrays:
+    """Expand one shard of flattened baskets into locally reduced pair arrays."""
+
+    sizes = np.diff(offsets)
+    parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    for size in np.unique(sizes[sizes >= 2]).tolist():
+        rows = np.flatnonzero(sizes == size)
+        gather = offsets[rows][:, None] + np.arange(size)
+        basket_pids, basket_weights = pids[gather], weights[gather]
+        upper, lower = np.triu_indices(size, 1)
+        parts.append((
+            basket_pids[:, upper].ravel(),
+            basket_pids[:, lower].ravel(),
+            ((basket_weights[:, upper] + basket_weights[:, lower]) / 2.0).ravel(),
+        ))
+    if not parts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float64), empty
+    left = np.concatenate([part[0] for part in parts])
+    right = np.concatenate([part[1] for part in parts])
+    strength = np.concatenate([part[2] for part in parts])
+    return reduce_pairs(left, right, strength, np.ones(left.size, dtype=np.int64))
+
+
+def shard_bounds(offsets: np.ndarray, shards: int) -> List[Tuple[int, int]]:
+    """Split baskets into ``shards`` contiguous ranges with similar pair counts."""
+
+    sizes = np.diff(offsets)
+    pairs = np.cumsum(sizes * (sizes - 1) // 2)
+    total = int(pairs[-1]) if pairs.size else 0
+    if shards <= 1 or total == 0:
+        return [(0, int(sizes.size))]
+    cuts = np.searchsorted(pairs, np.linspace(0, total, shards + 1)[1:-1], side='right')
+    edges = [0, *sorted(set(int(cut) for cut in cuts)), int(sizes.size)]
+    return [(lo, hi) for lo, hi in zip(edges, edges[1:]) if hi > lo]
+
+
+def _shard(pids: np.ndarray, weights: np.ndarray, offsets: np.ndarray, lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    start, end = int(offsets[lo]), int(offsets[hi])
+    return pids[start:end], weights[start:end], offsets[lo:hi + 1] - start
+
+
+def build_pair_arrays(
+    baskets: Iterable[List[Tuple[int, float]]],
+    *,
+    workers: int = 1,
+    min_parallel_pairs: int = MIN_PARALLEL_PAIRS,
+) -> PairArrays:
+    """Sharded map-reduce over ``baskets`` (each a pid-sorted ``(pid, weight)`` list)."""
+
+    pids, weights, offsets = flatten_baskets(baskets)
+    sizes = np.diff(offsets)
+    total_pairs = int((sizes * (sizes - 1) // 2).sum())
+    bounds = shard_bounds(offsets, max(1, workers))
+    shards = [_shard(pids, weights, offsets, lo, hi) for lo, hi in bounds]
+
+    if workers > 1 and len(shards) > 1 and total_pairs >= min_parallel_pairs:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=context) as pool:
+            partials = list(pool.map(map_pairs, *zip(*shards)))
+    else:
+        partials = [map_pairs(*shard) for shard in shards]
+
+    if len(partials) == 1:
+        return partials[0]
+    return reduce_pairs(*(np.concatenate(column) for column in zip(*partials)))
+
+
+def to_edge_maps(arrays: PairArrays) -> Tuple[Dict[Tuple[int, int], float], Dict[Tuple[int, int], int]]:
+    """Convert reduced pair arrays to the ``edge_strength`` / ``pair_counts`` dicts."""
+
+    left, right, strength, counts = arrays
+    keys = list(zip(left.tolist(), right.tolist()))
+    return dict(zip(keys, strength.tolist())), dict(zip(keys, counts.tolist()))
+
+
+def edge_maps_from_baskets(
+    user_weights: Mapping[int, List[Tuple[int, float]]],
+    *,
+    workers: int = 1,
+    min_parallel_pairs: int = MIN_PARALLEL_PAIRS,
+) -> Tuple[Dict[Tuple[int, int], float], Dict[Tuple[int, int], int]]:
+    baskets = (user_weights[uid] for uid in sorted(user_weights))
+    return to_edge_maps(build_pair_arrays(baskets, workers=workers, min_parallel_pairs=min_parallel_pairs))
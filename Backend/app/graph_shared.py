@@ -0,0 +1,259 @@
+"""Graph snapshots shared between worker processes through shared memory.
+
+With ``uvicorn --workers N`` every worker used to hold its own copy of
+the built graph.  Here one process publishes a :class:`GraphSnapshot`'s
+arrays into ``multiprocessing.shared_memory`` segments and every worker
+attaches to the same pages read-only, so RAM per host does not grow with
+the worker count.
+
+Publication is generational.  A small fixed-size *control* segment
+(``<prefix>_ctl``) holds a JSON header naming the current generation and
+the shape/dtype/segment name of each array, guarded by a sequence
+counter (odd while a write is in progress) so readers never act on a
+half-written header.  A refresh writes the new generation's segments
+first and then swaps the header; the previous generation stays linked
+for readers still using it and is unlinked one publication later.
+
+Publishers serialise on an exclusive ``flock`` so that, when several
+workers notice a stale graph at once, only one of them rebuilds.
+Segments are detached from ``multiprocessing``'s resource tracker: they
+must outlive whichever worker happened to publish them.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .graph_snapshot import GraphSnapshot, snapshot_from_arrays
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts fall back to a process-local lock
+    fcntl = None
+
+CONTROL_SIZE = 1 << 16
+# sequence counter, header length
+_CONTROL = struct.Struct('<QQ')
+_READ_RETRIES = 100
+
+_local_lock = threading.Lock()
+
+
+def _untrack(shm: SharedMemory) -> None:
+    if sys.version_info < (3, 13):
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+def _open_segment(name: str, size: int = 0) -> SharedMemory:
+    """Create (``size > 0``) or attach a segment the resource tracker will not reap."""
+
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, create=size > 0, size=size, track=False)
+    shm = SharedMemory(name=name, create=size > 0, size=size)
+    _untrack(shm)
+    return shm
+
+
+def _unlink_segment(name: str) -> None:
+    try:
+        shm = _open_segment(name)
+    except FileNotFoundError:
+        return
+    if sys.version_info < (3, 13):
+        # unlink() unregisters, so balance it first
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.close()
+    shm.unlink()
+
+
+def _segment_name(prefix: str, generation: int, array: str) -> str:
+    return f'{prefix}_{generation}_{array}'
+
+
+def _read_control(buf: memoryview) -> Optional[Dict[str, Any]]:
+    for _ in range(_READ_RETRIES):
+        seq, length = _CONTROL.unpack_from(buf, 0)
+        if seq % 2:
+            continue
+        payload = bytes(buf[_CONTROL.size:_CONTROL.size + length])
+        if _CONTROL.unpack_from(buf, 0)[0] != seq:
+            continue
+        return json.loads(payload.decode('utf-8')) if length else None
+    raise RuntimeError('Shared graph header kept changing while being read')
+
+
+class SharedGraphReader:
+    """Attach to the current published generation, re-attaching after swaps."""
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+        self.generation: Optional[int] = None
+        self._snapshot: Optional[GraphSnapshot] = None
+        self._control: Optional[SharedMemory] = None
+        self._segments: List[SharedMemory] = []
+        self._retired: List[SharedMemory] = []
+        self._lock = threading.Lock()
+
+    def header(self) -> Optional[Dict[str, Any]]:
+        if self._control is None:
+            try:
+                self._control = _open_segment(f'{self.prefix}_ctl')
+            except FileNotFoundError:
+                return None
+        return _read_control(self._control.buf)
+
+    def current(self) -> Optional[GraphSnapshot]:
+        """The published snapshot, or ``None`` if nothing (attachable) is published."""
+
+        with self._lock:
+            header = self.header()
+            if header is None:
+                return None
+            if header['generation'] == self.generation:
+                return self._snapshot
+            segments: List[SharedMemory] = []
+            arrays: Dict[str, np.ndarray] = {}
+            try:
+                for name, spec in header['arrays'].items():
+                    shm = _open_segment(spec['segment'])
+                    segments.append(shm)
+                    view = np.ndarray(tuple(spec['shape']), dtype=np.dtype(spec['dtype']), buffer=shm.buf)
+                    view.flags.writeable = False
+                    arrays[name] = view
+            except FileNotFoundError:
+                # Superseded and unlinked between reading the header and attaching
+                arrays.clear()
+                self._retire(segments)
+                return self._snapshot
+            superseded, self._segments = self._segments, segments
+            self.generation = header['generation']
+            self._snapshot = snapshot_from_arrays(
+                arrays,
+                high_water_mark=tuple(header['high_water_mark']),
+                config=header.get('config') or {},
+                stats=header.get('stats') or {},
+                created_at=header.get('created_at') or 0.0,
+            )
+            self._retire(superseded)
+            return self._snapshot
+
+    def _retire(self, segments: List[SharedMemory]) -> None:
+        """Close superseded mappings once no request holds arrays from them."""
+
+        pending: List[SharedMemory] = []
+        for shm in self._retired + segments:
+            try:
+                shm.close()
+            except BufferError:
+                pending.append(shm)
+        self._retired = pending
+
+    def close(self) -> None:
+        with self._lock:
+            self._snapshot = None
+            self.generation = None
+            self._retire(self._segments)
+            self._segments = []
+            if self._control is not None:
+                self._control.close()
+                self._control = None
+
+
+class SharedGraphPublisher:
+    """Writes snapshots into new generations and swaps the control header."""
+
+    def __init__(self, prefix: str, lock_path: Optional[str] = None) -> None:
+        self.prefix = prefix
+        self.lock_path = lock_path or os.path.join(tempfile.gettempdir(), f'{prefix}.lock')
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Host-wide publisher lock; hold it across the staleness check, build and publish."""
+
+        if fcntl is None:
+            with _local_lock:
+                yield
+            return
+        with open(self.lock_path, 'a+') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _control(self) -> SharedMemory:
+        try:
+            return _open_segment(f'{self.prefix}_ctl', CONTROL_SIZE)
+        except FileExistsError:
+            return _open_segment(f'{self.prefix}_ctl')
+
+    def publish(self, snapshot: GraphSnapshot) -> int:
+        """Publish ``snapshot`` as the next generation; caller holds :meth:`exclusive`."""
+
+        control = self._control()
+        try:
+            previous = _read_control(control.buf)
+            generation = (previous['generation'] if previous else 0) + 1
+            layout: Dict[str, Dict[str, Any]] = {}
+            for name, source in snapshot.arrays().items():
+                segment = _segment_name(self.prefix, generation, name)
+                _unlink_segment(segment)  # leftover from a crashed publisher
+                shm = _open_segment(segment, max(source.nbytes, 1))
+                view = np.ndarray(source.shape, dtype=source.dtype, buffer=shm.buf)
+                view[:] = source
+                del view
+                shm.close()
+                layout[name] = {'segment': segment, 'shape': list(source.shape), 'dtype': source.dtype.str}
+
+            header = json.dumps({
+                'generation': generation,
+                'high_water_mark': list(snapshot.high_water_mark),
+                'config': snapshot.config,
+                'stats': snapshot.stats,
+                'created_at': snapshot.created_at,
+                'arrays': layout,
+                'previous': previous['arrays'] if previous else {},
+            }).encode('utf-8')
+            if _CONTROL.size + len(header) > CONTROL_SIZE:
+                raise ValueError('Shared graph header does not fit the control segment')
+
+            seq, _length = _CONTROL.unpack_from(control.buf, 0)
+            _CONTROL.pack_into(control.buf, 0, seq + 1, 0)
+            control.buf[_CONTROL.size:_CONTROL.size + len(header)] = header
+            _CONTROL.pack_into(control.buf, 0, seq + 2, len(header))
+        finally:
+            control.close()
+
+        # Two generations back: no reader can still be switching to it
+        if previous:
+            for spec in previous.get('previous', {}).values():
+                _unlink_segment(spec['segment'])
+        return generation
+
+    def unlink(self) -> None:
+        """Remove every published segment (tests and shutdown hooks)."""
+
+        try:
+            control = _open_segment(f'{self.prefix}_ctl')
+        except FileNotFoundError:
+            return
+        try:
+            header = _read_control(control.buf)
+        finally:
+            control.close()
+        if header:
+            for key in ('arrays', 'previous'):
+                for spec in header.get(key, {}).values():
+                    _unlink_segment(spec['segment'])
+        _unlink_segment(f'{self.prefix}_ctl')
@@ -0,0 +1,203 @@
+"""Versioned binary snapshots of the weighted product graph.
+
+Every worker used to rebuild the graph from SQLite on its own.  A
+snapshot stores the built graph once - CSR arrays (node ids, offsets,
+neighbours, edge costs) and popularity aligned with the node ids - in a
+single file that other workers map with ``numpy.memmap``.  Loading costs
+a header parse; the array pages come from the shared OS page cache, and
+:meth:`GraphSnapshot.view` serves queries straight from them.
+
+File layout::
+
+    MAGIC (8 bytes) | header length (uint64 LE) | JSON header | arrays
+
+Each array starts on a 64-byte boundary; the header lists its dtype,
+shape and offset together with the format version, the graph change
+mark the graph was built from (interaction high-water mark plus the
+latest product change, so deleting a product outdates it too) and the
+build configuration.  A snapshot whose version, change mark or
+configuration does not match is ignored and the caller rebuilds.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .graph_csr import CSRGraph, CSRProductGraph
+from .product_graph import Product, ProductGraph
+
+SNAPSHOT_MAGIC = b'GRPHSNAP'
+SNAPSHOT_VERSION = 1
+_ALIGN = 64
+_LENGTH = struct.Struct('<Q')
+_ARRAY_NAMES = ('node_ids', 'indptr', 'indices', 'weights', 'popularity')
+
+# (max interaction id, interaction count, latest product change id), as
+# ``crud.graph_change_mark``; changes on interaction and catalogue writes
+HighWaterMark = Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class GraphSnapshot:
+    csr: CSRGraph
+    popularity: np.ndarray
+    high_water_mark: HighWaterMark
+    config: Dict[str, Any] = field(default_factory=dict)
+    stats: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_graph(
+        cls,
+        graph: ProductGraph,
+        popularity: Dict[int, float],
+        high_water_mark: HighWaterMark,
+        *,
+        config: Optional[Dict[str, Any]] = None,
+        stats: Optional[Dict[str, Any]] = None,
+    ) -> 'GraphSnapshot':
+        csr = CSRGraph.from_product_graph(graph)
+        values = np.asarray([popularity.get(pid, 0.0) for pid in csr.node_ids.tolist()], dtype=np.float64)
+        return cls(
+            csr=csr,
+            popularity=values,
+            high_water_mark=tuple(int(value) for value in high_water_mark),
+            config=dict(config or {}),
+            stats=dict(stats or {}),
+        )
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'node_ids': self.csr.node_ids,
+            'indptr': self.csr.indptr,
+            'indices': self.csr.indices,
+            'weights': self.csr.weights,
+            'popularity': self.popularity,
+        }
+
+    def popularity_map(self) -> Dict[int, float]:
+        nonzero = np.flatnonzero(self.popularity)
+        return dict(zip(self.csr.node_ids[nonzero].tolist(), self.popularity[nonzero].tolist()))
+
+    def view(self, products: Iterable[Product]) -> CSRProductGraph:
+        """A read-only graph over ``products`` that reads edges from the snapshot's arrays."""
+
+        return CSRProductGraph(products, self.csr)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def write_snapshot(path: str, snapshot: GraphSnapshot) -> int:
+    """Write ``snapshot`` atomically (temp file + rename); returns the file size."""
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in snapshot.arrays().items()}
+    layout: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name in _ARRAY_NAMES:
+        array = arrays[name]
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'high_water_mark': list(snapshot.high_water_mark),
+        'config': snapshot.config,
+        'stats': snapshot.stats,
+        'created_at': snapshot.created_at,
+        'arrays': layout,
+    }).encode('utf-8')
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + _LENGTH.size + len(header))
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(SNAPSHOT_MAGIC)
+        handle.write(_LENGTH.pack(len(header)))
+        handle.write(header)
+        for name in _ARRAY_NAMES:
+            handle.seek(data_start + layout[name]['offset'])
+            handle.write(arrays[name].tobytes())
+        handle.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return data_start + offset
+
+
+def read_header(path: str) -> Optional[Tuple[Dict[str, Any], int]]:
+    """``(header, data offset)`` or ``None`` for a missing or foreign file."""
+
+    try:
+        with open(path, 'rb') as handle:
+            if handle.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return None
+            (length,) = _LENGTH.unpack(handle.read(_LENGTH.size))
+            header = json.loads(handle.read(length).decode('utf-8'))
+    except (OSError, ValueError, struct.error):
+        return None
+    return header, _aligned(len(SNAPSHOT_MAGIC) + _LENGTH.size + length)
+
+
+def read_snapshot(
+    path: str,
+    *,
+    high_water_mark: Optional[HighWaterMark] = None,
+    config: Optional[Dict[str, Any]] = None,
+) -> Optional[GraphSnapshot]:
+    """Map a snapshot read-only, or ``None`` if it is missing, outdated or incompatible."""
+
+    parsed = read_header(path)
+    if parsed is None:
+        return None
+    header, data_start = parsed
+    try:
+        if header.get('version') != SNAPSHOT_VERSION:
+            return None
+        if high_water_mark is not None and tuple(header.get('high_water_mark', ())) != tuple(high_water_mark):
+            return None
+        if config is not None and header.get('config') != config:
+            return None
+
+        arrays: Dict[str, np.ndarray] = {}
+        for name in _ARRAY_NAMES:
+            spec = header['arrays'][name]
+            shape = tuple(spec['shape'])
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=spec['dtype'])
+                continue
+            arrays[name] = np.memmap(path, dtype=spec['dtype'], mode='r', offset=data_start + spec['offset'], shape=shape)
+
+        return snapshot_from_arrays(
+            arrays,
+            high_water_mark=tuple(header['high_water_mark']),
+            config=header.get('config') or {},
+            stats=header.get('stats') or {},
+            created_at=header.get('created_at') or 0.0,
+        )
+    except (AttributeError, KeyError, TypeError, ValueError, OSError):
+        # Corrupt header or truncated file: treat it like a missing snapshot
+        return None
+
+
+def snapshot_from_arrays(arrays: Dict[str, np.ndarray], **metadata: Any) -> GraphSnapshot:
+    """Rebuild a snapshot around arrays laid out like :meth:`GraphSnapshot.arrays`."""
+
+    csr = CSRGraph(node_ids=arrays['node_ids'], indptr=arrays['indptr'], indices=arrays['indices'], weights=arrays['weights'])
+    return GraphSnapshot(csr=csr, popularity=arrays['popularity'], **metadata)
+
+
+def graph_config(settings: Any) -> Dict[str, Any]:
+    """Build settings that change the graph; snapshots built under others are ignored."""
+
+    return {
+        'half_life_seconds': settings.graph_decay_half_life_seconds,
+        'prune_below': settings.graph_decay_prune_below,
+        'pair_budget': settings.graph_user_pair_budget,
+        'max_degree': settings.graph_max_degree,
+        'min_cooccurrence': settings.graph_min_cooccurrence,
+    }
@@ -0,0 +1,218 @@
+"""Background refresh of the weighted product graph.
+
+Without a store every recommendation request rebuilds the graph, so the
+first request after a change pays the whole rebuild.  :class:`GraphStore`
+builds off the request path on a daemon thread and publishes each result
+as an immutable :class:`GraphGeneration`:
+
+* the new generation is built completely while readers keep using the
+  previous one, then swapped in with a single reference assignment
+  (double buffering), so readers never block and never observe a
+  half-built graph;
+* a refresh is due when ``interval_seconds`` have passed since the last
+  build, or when the data is dirty and has been idle (no further writes)
+  for ``idle_seconds``.
+
+Writes in this process call :meth:`GraphStore.mark_dirty`; changes made
+by other processes are picked up by polling a change mark (for the app:
+the interaction high-water mark plus the latest product change id).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# build() -> (graph, popularity, stats)
+BuildGraph = Callable[[], Tuple[Any, Dict[int, float], Dict[str, Any]]]
+# Any tuple that moves whenever the graph's inputs change
+HighWaterMark = Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class GraphGeneration:
+    generation: int
+    graph: Any
+    popularity: Dict[int, float]
+    stats: Dict[str, Any]
+    high_water_mark: HighWaterMark
+    built_at: float
+    build_seconds: float
+
+
+@dataclass
+class _DirtyState:
+    dirty_since: Optional[float] = None
+    last_write: Optional[float] = None
+    observed_mark: Optional[HighWaterMark] = None
+
+
+class GraphStore:
+    """Holds the current graph generation and refreshes it in the background."""
+
+    def __init__(
+        self,
+        build: BuildGraph,
+        high_water_mark: Callable[[], HighWaterMark],
+        *,
+        interval_seconds: float = 0.0,
+        idle_seconds: float = 0.0,
+        poll_seconds: float = 1.0,
+    ) -> None:
+        self._build = build
+        self._high_water_mark = high_water_mark
+        self.interval_seconds = interval_seconds
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self._current: Optional[GraphGeneration] = None
+        self._dirty = _DirtyState()
+        self._state_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Reader side
+    # ------------------------------------------------------------------
+    def current(self) -> Optional[GraphGeneration]:
+        """Latest complete generation (``None`` before the first build); never blocks."""
+
+        return self._current
+
+    def wait_current(self) -> GraphGeneration:
+        """Current generation; before the first one exists, wait for (or run) its build.
+
+        A request arriving while the background thread is building the
+        first generation shares that build instead of starting another.
+        """
+
+        current = self._current
+        if current is not None:
+            return current
+        with self._build_lock:
+            if self._current is not None:
+                return self._current
+            return self._refresh_locked()
+
+    # ------------------------------------------------------------------
+    # Change tracking
+    # ------------------------------------------------------------------
+    def mark_dirty(self, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._state_lock:
+            if self._dirty.dirty_since is None:
+                self._dirty.dirty_since = now
+            self._dirty.last_write = now
+
+    def _poll_changes(self, now: float) -> None:
+        """Treat a moved high-water mark (e.g. another worker's write) as a write."""
+
+        current = self._current
+        mark = self._high_water_mark()
+        with self._state_lock:
+            changed = mark != self._dirty.observed_mark
+            self._dirty.observed_mark = mark
+        if current is not None and mark != current.high_water_mark and changed:
+            self.mark_dirty(now)
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty.dirty_since is not None
+
+    def refresh_due(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        current = self._current
+        if current is None:
+            return True
+        if self.interval_seconds > 0 and now - current.built_at >= self.interval_seconds:
+            return True
+        with self._state_lock:
+            last_write = self._dirty.last_write
+        return self.idle_seconds > 0 and self.dirty and last_write is not None and now - last_write >= self.idle_seconds
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def refresh(self) -> GraphGeneration:
+        """Build a new generation and swap it in; concurrent builds run one at a time."""
+
+        with self._build_lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self) -> GraphGeneration:
+        started = time.time()
+        high_water_mark = self._high_water_mark()
+        graph, popularity, stats = self._build()
+        previous = self._current
+        generation = GraphGeneration(
+            generation=(previous.generation if previous else 0) + 1,
+            graph=graph,
+            popularity=popularity,
+            stats=stats,
+            high_water_mark=high_water_mark,
+            built_at=started,
+            build_seconds=time.time() - started,
+        )
+        self._current = generation
+        self.last_error = None
+        with self._state_lock:
+            # Writes that landed during the build keep the store dirty
+            last_write = self._dirty.last_write
+            if last_write is None or last_write < started:
+                self._dirty = _DirtyState(observed_mark=self._dirty.observed_mark)
+            else:
+                self._dirty.dirty_since = started
+        return generation
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            now = time.time()
+            try:
+                self._poll_changes(now)
+                if self.refresh_due(now):
+                    self.refresh()
+            except Exception as exc:  # keep serving the previous generation
+                self.last_error = f'{type(exc).__name__}: {exc}'
+                logger.exception('Background graph refresh failed')
+            self._stop.wait(self.poll_seconds)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='graph-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def status(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        current = self._current
+        with self._state_lock:
+            dirty_since = self._dirty.dirty_since
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'generation': current.generation if current else None,
+            'built_at': current.built_at if current else None,
+            'build_seconds': current.build_seconds if current else None,
+            'age_seconds': now - current.built_at if current else None,
+            'high_water_mark': list(current.high_water_mark) if current else None,
+            'dirty': dirty_since is not None,
+            'stale_seconds': now - dirty_since if dirty_since is not None else 0.0,
+            'interval_seconds': self.interval_seconds,
+            'idle_seconds': self.idle_seconds,
+            'last_error': self.last_error,
+        }
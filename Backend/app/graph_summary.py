@@ -0,0 +1,77 @@
+"""Per-generation rankings and totals derived from the weighted graph.
+
+The recommendation endpoint reports the catalogue size, the edge count and
+the most popular products with every response, and falls back to the
+popularity order when a search finds nothing.  Computing those on each
+request costs a full sort of the catalogue plus a pass over every
+adjacency list.  They only change when the graph does, so
+:func:`summarize` derives them once per graph and requests read the
+result in ``O(k)``.
+"""
+
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from typing import Collection, Dict, List, Optional, Tuple
+
+from .product_graph import ProductGraph
+
+LEADER_COUNT = 5
+
+
+@dataclass(frozen=True)
+class GraphSummary:
+    # Product ids by popularity desc, price desc, id asc (the fallback order)
+    popularity_order: Tuple[int, ...]
+    # Position of each product in ``popularity_order``
+    popularity_rank: Dict[int, int]
+    popularity_leaders: Tuple[Dict[str, object], ...]
+    total_products: int
+    total_edges: int
+
+    def leaders(self) -> List[Dict[str, object]]:
+        return [dict(leader) for leader in self.popularity_leaders]
+
+    def most_popular(self, limit: int, allowed: Optional[Collection[int]] = None, exclude: Optional[int] = None) -> List[int]:
+        """Up to ``limit`` ids in popularity order, restricted to ``allowed`` when given.
+
+        A filter smaller than the catalogue is ranked directly, so the cost
+        follows the number of candidates rather than every product ahead
+        of them in the global order.
+        """
+
+        if limit <= 0:
+            return []
+        if allowed is not None and len(allowed) < len(self.popularity_order):
+            rank = self.popularity_rank
+            ranked = (pid for pid in allowed if pid != exclude and pid in rank)
+            return heapq.nsmallest(limit, ranked, key=rank.__getitem__)
+        picked: List[int] = []
+        for pid in self.popularity_order:
+            if pid == exclude or (allowed is not None and pid not in allowed):
+                continue
+            picked.append(pid)
+            if len(picked) == limit:
+                break
+        return picked
+
+
+def summarize(graph: ProductGraph, popularity: Dict[int, float]) -> GraphSummary:
+    products = list(graph.products())
+    by_popularity = sorted(
+        products,
+        key=lambda prod: (-popularity.get(prod.id, 0.0), -(prod.price or 0.0), prod.id),
+    )
+    # Leaders keep the catalogue order among equal scores, as before
+    leaders = sorted(products, key=lambda prod: popularity.get(prod.id, 0.0), reverse=True)[:LEADER_COUNT]
+    return GraphSummary(
+        popularity_order=tuple(product.id for product in by_popularity),
+        popularity_rank={product.id: position for position, product in enumerate(by_popularity)},
+        popularity_leaders=tuple(
+            {'id': product.id, 'name': product.name, 'score': popularity.get(product.id, 0.0)}
+            for product in leaders
+        ),
+        total_products=len(products),
+        total_edges=sum(len(graph.neighbors(product.id)) for product in products) // 2,
+    )
@@ -1,13 +1,19 @@
 import json
+import logging
+import os
 import re
-from collections import defaultdict
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import weakref
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Collection, Dict, List, Literal, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException, Query, Depends, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from . import crud, recommender, db_init, supabase_admin, email_service
+from . import candidate_index, crud, recommender, db_init, supabase_admin, email_service, collab_executor, ppr, random_walk, graph_builder, graph_shared, graph_snapshot, graph_store, graph_summary, single_flight, response_cache
 from .auth import AdminAuthContext, UserAuthContext, require_admin, require_user, admin_error, ensure_not_self
 from .audit import emit_audit_event, emit_user_audit_event
 from .models import (
@@ -26,6 +32,8 @@ from .models import (
     CategoryOrder,
     InteractionRecord,
     GraphAnalytics,
+    GraphRefreshStatus,
+    InteractionArchiveResult,
     GraphTotals,
     ProductInteractionStat,
     SupabaseUser,
@@ -50,12 +58,15 @@ from .models import (
     ProductReservationResponse,
     UserCategorySummary,
 )
+from .graph_csr import CSRGraph
 from .product_graph import ProductGraph as WeightedProductGraph, Product as WeightedProduct
 from .settings import get_settings
 from .email_service import _deliver_email
 from fastapi import Body
 
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title='Graph-Based Recommendation API')
 
 # Added Middlware endpoints
@@ -69,6 +80,9 @@ app.add_middleware(
 
 # Ensure DB exists
 db_init.init_db()
+# product_edges keep the pair budget they were derived under; re-derive them once if it changed
+if get_settings().graph_persisted_edges and crud.product_edges_pair_budget() != max(get_settings().graph_user_pair_budget, 0):
+    crud.rebuild_product_edges(get_settings().graph_user_pair_budget)
 
 ACTION_WEIGHTS: Dict[str, float] = {
     'view': 1.0,
@@ -76,6 +90,13 @@ ACTION_WEIGHTS: Dict[str, float] = {
     'add_to_cart': 1.8,
 }
 
+RecommendationMode = Literal['shortest_path', 'ppr', 'ppr_push', 'pixie']
+PPR_METHODS: Dict[str, str] = {
+    'ppr': 'power',
+    'ppr_push': 'push',
+}
+DEFAULT_WALK_BUDGET = 20000
+
 LEGACY_ACTION_MAP = {
     'click': 'view',
     'review': 'view',
@@ -159,7 +180,237 @@ def _resolve_internal_user(user_ctx: UserAuthContext, requested_user_id: Optiona
     return crud.ensure_user_from_external(requested_user_id, fallback_name=_preferred_display_name(user_ctx))
 
 
+_windowed_graph: Optional[graph_builder.WindowedGraph] = None
+_windowed_graph_key: Optional[Tuple[Any, ...]] = None
+
+
+def _sliding_window(settings) -> graph_builder.WindowedGraph:
+    """Process-wide windowed graph, recreated if its settings or the database change."""
+
+    global _windowed_graph, _windowed_graph_key
+    key = (
+        crud.DB_PATH,
+        settings.graph_window_seconds,
+        settings.graph_decay_half_life_seconds,
+        settings.graph_user_pair_budget,
+    )
+    window = _windowed_graph
+    if window is None or _windowed_graph_key != key:
+        window = graph_builder.WindowedGraph(
+            settings.graph_window_seconds,
+            half_life_seconds=settings.graph_decay_half_life_seconds,
+            pair_budget=settings.graph_user_pair_budget,
+        )
+        _windowed_graph, _windowed_graph_key = window, key
+    return window
+
+
+_incremental_graph: Optional[graph_builder.IncrementalGraph] = None
+_incremental_graph_key: Optional[Tuple[Any, ...]] = None
+
+
+def _incremental(settings) -> graph_builder.IncrementalGraph:
+    """Process-wide incremental graph, recreated if its settings or the database change."""
+
+    global _incremental_graph, _incremental_graph_key
+    key = (crud.DB_PATH, settings.graph_decay_half_life_seconds, settings.graph_user_pair_budget)
+    incremental = _incremental_graph
+    if incremental is None or _incremental_graph_key != key:
+        incremental = graph_builder.IncrementalGraph(
+            half_life_seconds=settings.graph_decay_half_life_seconds,
+            pair_budget=settings.graph_user_pair_budget,
+        )
+        _incremental_graph, _incremental_graph_key = incremental, key
+    return incremental
+
+
+def _persisted_edges_usable(settings) -> bool:
+    """Whether product_edges match the edges a full build would compute.
+
+    They hold undecayed, unpruned full-history strengths under the pair
+    budget recorded with the table, so decay, pruning, a sliding window or
+    a different budget fall back to computing the edges.
+    """
+
+    return bool(
+        settings.graph_persisted_edges
+        and not settings.graph_decay_half_life_seconds
+        and settings.graph_decay_prune_below <= 0
+        and not settings.graph_window_seconds
+        and crud.product_edges_pair_budget() == max(settings.graph_user_pair_budget, 0)
+    )
+
+
+def _accumulate_weighted_graph(graph: WeightedProductGraph, settings) -> Tuple[Dict[int, float], Dict[str, Any]]:
+    """Add co-occurrence edges from the interaction log; returns (popularity, stats)."""
+
+    stats: Dict[str, Any] = {}
+    if settings.graph_window_seconds:
+        window = _sliding_window(settings)
+        with window.lock:
+            stats['window'] = window.sync(crud.list_interactions_since)
+            accumulator = window.accumulator
+            popularity = accumulator.decayed_popularity()
+            edge_items = dict(accumulator.edge_items())
+            pair_counts = dict(accumulator.pair_counts)
+            product_counts = dict(accumulator.product_counts)
+            stats['skipped_pairs'] = accumulator.skipped_pairs()
+    elif _persisted_edges_usable(settings):
+        # Pair enumeration already happened on insert: one scan of product_edges
+        pair_counts = {}
+        edge_items = {}
+        for left_id, right_id, strength, count in crud.iter_product_edges():
+            edge_items[(left_id, right_id)] = strength
+            pair_counts[(left_id, right_id)] = count
+        totals = crud.product_affinity_totals()
+        popularity = {pid: weight for pid, (weight, _count) in totals.items()}
+        product_counts = {pid: count for pid, (_weight, count) in totals.items()}
+        stats['skipped_pairs'] = 0
+        stats['edges_source'] = 'product_edges'
+    elif settings.graph_incremental_refresh:
+        incremental = _incremental(settings)
+        with incremental.lock:
+            stats['incremental'] = incremental.sync(
+                lambda after_id, max_id: crud.iter_interactions_since(after_id, max_id=max_id),
+                crud.list_product_changes,
+                crud.interaction_high_water_mark(),
+            )
+            accumulator = incremental.accumulator
+            stats['skipped_pairs'] = accumulator.skipped_pairs()
+            stats['pruned_entries'] = accumulator.prune(settings.graph_decay_prune_below)
+            popularity = accumulator.decayed_popularity()
+            edge_items = dict(accumulator.edge_items())
+            pair_counts = dict(accumulator.pair_counts)
+            product_counts = dict(accumulator.product_counts)
+    else:
+        if settings.graph_decay_half_life_seconds:
+            # Decay needs every event's timestamp
+            accumulator = graph_builder.GraphAccumulator.from_records(
+                crud.iter_interactions_for_graph(),
+                half_life_seconds=settings.graph_decay_half_life_seconds,
+                pair_budget=settings.graph_user_pair_budget,
+                workers=settings.graph_build_workers,
+                prune_below=settings.graph_decay_prune_below,
+            )
+        else:
+            accumulator = graph_builder.GraphAccumulator.from_affinity(
+                crud.iter_user_product_affinity(),
+                pair_budget=settings.graph_user_pair_budget,
+                workers=settings.graph_build_workers,
+                prune_below=settings.graph_decay_prune_below,
+            )
+        stats['skipped_pairs'] = accumulator.skipped_pairs()
+        # Pruned before pair enumeration, so dropped entries never cost pairs
+        stats['pruned_entries'] = accumulator.pruned_entries
+        popularity = accumulator.decayed_popularity()
+        edge_items = dict(accumulator.edge_items())
+        pair_counts = accumulator.pair_counts
+        product_counts = accumulator.product_counts
+
+    if settings.graph_max_degree > 0 or settings.graph_min_cooccurrence > 1:
+        edge_items, report = graph_builder.sparsify_edges(
+            edge_items,
+            max_degree=settings.graph_max_degree,
+            min_cooccurrence=settings.graph_min_cooccurrence,
+            pair_counts=pair_counts,
+        )
+        stats['sparsification'] = report.as_dict()
+
+    edge_count = 0
+    for (left_id, right_id), strength in edge_items.items():
+        edge_count += 1
+        if left_id == right_id:
+            continue
+        cost = max(0.05, 1.0 / strength) if strength > 0 else 1.5
+        try:
+            graph.add_edge(left_id, right_id, cost)
+        except ValueError:
+            # One of the products might have been deleted between queries
+            continue
+
+    # Deleted products keep their rows in the log; count only the catalogue
+    stats['interaction_count'] = sum(
+        count for pid, count in product_counts.items() if pid in graph
+    )
+    stats['edge_count'] = edge_count
+
+    return popularity, stats
+
+
+def _file_snapshot(
+    products: List[WeightedProduct],
+    settings,
+    change_mark: Tuple[int, ...],
+    config: Dict[str, Any],
+) -> Tuple[graph_snapshot.GraphSnapshot, str]:
+    """Current snapshot from GRAPH_SNAPSHOT_PATH, or a fresh build of ``products``."""
+
+    path = settings.graph_snapshot_path
+    if path:
+        snapshot = graph_snapshot.read_snapshot(path, high_water_mark=change_mark, config=config)
+        if snapshot is not None:
+            return snapshot, 'file'
+
+    # The dict graph only lives for the build; queries run on the snapshot's arrays
+    graph = WeightedProductGraph(products)
+    popularity, stats = _accumulate_weighted_graph(graph, settings)
+    # Tagged with the mark read before the build: rows that raced in only
+    # make the snapshot look older than it is, never newer
+    snapshot = graph_snapshot.GraphSnapshot.from_graph(graph, popularity, change_mark, config=config, stats=stats)
+    if path:
+        try:
+            graph_snapshot.write_snapshot(path, snapshot)
+        except OSError:
+            logger.exception('Failed to write graph snapshot to %s', path)
+        else:
+            # Serve the builder from the page cache too
+            snapshot = graph_snapshot.read_snapshot(path, high_water_mark=change_mark, config=config) or snapshot
+    return snapshot, 'built'
+
+
+@lru_cache(maxsize=None)
+def _shared_graph(prefix: str) -> Tuple[graph_shared.SharedGraphReader, graph_shared.SharedGraphPublisher]:
+    return graph_shared.SharedGraphReader(prefix), graph_shared.SharedGraphPublisher(prefix)
+
+
+def _current_snapshot(
+    products: List[WeightedProduct],
+    settings,
+    change_mark: Tuple[int, ...],
+    config: Dict[str, Any],
+) -> Tuple[graph_snapshot.GraphSnapshot, str]:
+    if not settings.graph_shared_memory_prefix:
+        return _file_snapshot(products, settings, change_mark, config)
+
+    reader, publisher = _shared_graph(settings.graph_shared_memory_prefix)
+
+    def published() -> Optional[graph_snapshot.GraphSnapshot]:
+        snapshot = reader.current()
+        if snapshot is not None and tuple(snapshot.high_water_mark) == change_mark and snapshot.config == config:
+            return snapshot
+        return None
+
+    snapshot = published()
+    if snapshot is not None:
+        return snapshot, 'shared_memory'
+    # Only one worker rebuilds; the others wait and then attach to its result
+    with publisher.exclusive():
+        snapshot = published()
+        if snapshot is not None:
+            return snapshot, 'shared_memory'
+        snapshot, source = _file_snapshot(products, settings, change_mark, config)
+        publisher.publish(snapshot)
+        # The publisher reads the shared segments like every other worker
+        return published() or snapshot, source
+
+
 def _build_weighted_graph() -> Tuple[WeightedProductGraph, Dict[int, float], Dict[str, Any]]:
+    settings = get_settings()
+    # Window graphs depend on the wall clock, so they are never snapshotted
+    snapshots = not settings.graph_window_seconds and bool(settings.graph_snapshot_path or settings.graph_shared_memory_prefix)
+    # Read before the catalogue: a product racing in only makes the tag look older
+    change_mark = crud.graph_change_mark() if snapshots else None
+
     products = crud.list_products()
     if not products:
         raise HTTPException(status_code=404, detail='No products available')
@@ -173,47 +424,145 @@ def _build_weighted_graph() -> Tuple[WeightedProductGraph, Dict[int, float], Dic
         )
         for row in products
     ]
-    graph = WeightedProductGraph(weighted_products)
-
-    interactions = crud.list_interactions_for_graph()
-    user_product_weights: Dict[int, Dict[int, float]] = defaultdict(dict)
-    popularity: Dict[int, float] = defaultdict(float)
-
-    for row in interactions:
-        uid = row['user_id']
-        pid = row['product_id']
-        weight = float(row.get('weight') or 1.0)
-        current = user_product_weights[uid].get(pid, 0.0)
-        if weight > current:
-            user_product_weights[uid][pid] = weight
-        popularity[pid] += weight
-
-    edge_strength: Dict[Tuple[int, int], float] = defaultdict(float)
-    for product_weights in user_product_weights.values():
-        items = sorted(product_weights.items())
-        for idx in range(len(items)):
-            left_id, left_weight = items[idx]
-            for jdx in range(idx + 1, len(items)):
-                right_id, right_weight = items[jdx]
-                contribution = (left_weight + right_weight) / 2.0
-                edge_strength[(left_id, right_id)] += contribution
-
-    for (left_id, right_id), strength in edge_strength.items():
-        if left_id == right_id:
-            continue
-        cost = max(0.05, 1.0 / strength) if strength > 0 else 1.5
-        try:
-            graph.add_edge(left_id, right_id, cost)
-        except ValueError:
-            # One of the products might have been deleted between queries
-            continue
+    if change_mark is None:
+        graph = WeightedProductGraph(weighted_products)
+        popularity, stats = _accumulate_weighted_graph(graph, settings)
+        return graph, popularity, stats
+
+    config = graph_snapshot.graph_config(settings)
+    snapshot, source = _current_snapshot(weighted_products, settings, change_mark, config)
+    # Traversals read the mapped/shared arrays; no per-worker adjacency copy
+    graph = snapshot.view(weighted_products)
+    if snapshot.csr.num_nodes == len(weighted_products) and all(snapshot.csr.has_node(p.id) for p in weighted_products):
+        # Same product set: PPR walks the snapshot's arrays as they are
+        with _derived_lock:
+            _graph_csrs[graph] = snapshot.csr
+    return graph, snapshot.popularity_map(), {**snapshot.stats, 'snapshot': source}
+
+
+_graph_memo: Optional[Tuple[Tuple[Any, ...], Tuple[WeightedProductGraph, Dict[int, float], Dict[str, Any]]]] = None
+_graph_memo_lock = threading.Lock()
+
+
+def _graph_memo_key(settings) -> Optional[Tuple[Any, ...]]:
+    """Inputs a graph depends on; ``None`` when it must be rebuilt per request (windows follow the clock)."""
+
+    if settings.graph_window_seconds:
+        return None
+    config = graph_snapshot.graph_config(settings)
+    sources = (
+        settings.graph_snapshot_path,
+        settings.graph_shared_memory_prefix,
+        settings.graph_incremental_refresh,
+        _persisted_edges_usable(settings),
+    )
+    return (crud.DB_PATH, *crud.graph_change_mark(), tuple(sorted(config.items())), sources)
 
-    stats = {
-        'interaction_count': len(interactions),
-        'edge_count': len(edge_strength),
-    }
 
-    return graph, dict(popularity), stats
+def _memoized_weighted_graph() -> Tuple[WeightedProductGraph, Dict[int, float], Dict[str, Any]]:
+    """Build (or map from a snapshot) once per process and reuse it until its inputs change.
+
+    Keeping the same graph object also keeps the per-graph candidate
+    index, summary and CSR below, so they are not rebuilt per request
+    when no background store runs.
+    """
+
+    global _graph_memo
+    key = _graph_memo_key(get_settings())
+    if key is None:
+        return _build_weighted_graph()
+    with _graph_memo_lock:
+        if _graph_memo is not None and _graph_memo[0] == key:
+            return _graph_memo[1]
+        built = _build_weighted_graph()
+        _graph_memo = (key, built)
+        return built
+
+
+def _build_summarized_graph() -> Tuple[WeightedProductGraph, Dict[int, float], Dict[str, Any]]:
+    """Background builds also derive the summary so requests never pay for it."""
+
+    graph, popularity, stats = _build_weighted_graph()
+    _graph_summary(graph, popularity)
+    return graph, popularity, stats
+
+
+_graph_store: Optional[graph_store.GraphStore] = None
+_graph_store_lock = threading.Lock()
+
+
+def _get_graph_store() -> Optional[graph_store.GraphStore]:
+    """Background-refreshed graph, started on first use when a refresh trigger is configured."""
+
+    global _graph_store
+    settings = get_settings()
+    if settings.graph_refresh_interval_seconds <= 0 and settings.graph_refresh_idle_seconds <= 0:
+        return None
+    with _graph_store_lock:
+        if _graph_store is None:
+            _graph_store = graph_store.GraphStore(
+                _build_summarized_graph,
+                crud.graph_change_mark,
+                interval_seconds=settings.graph_refresh_interval_seconds,
+                idle_seconds=settings.graph_refresh_idle_seconds,
+            )
+            _graph_store.start()
+        return _graph_store
+
+
+_response_cache: Optional[response_cache.ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def _get_response_cache() -> Optional[response_cache.ResponseCache]:
+    """Recommendation response cache, created on first use when a size is configured."""
+
+    global _response_cache
+    settings = get_settings()
+    if settings.recommendation_cache_max_bytes <= 0:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = response_cache.ResponseCache(
+                settings.recommendation_cache_max_bytes,
+                ttl_seconds=settings.recommendation_cache_ttl_seconds,
+            )
+        return _response_cache
+
+
+def _graph_version(generation: Optional[int]) -> Tuple[Any, ...]:
+    """The refreshed generation, or the live change mark when graphs are built per request."""
+
+    if generation is not None:
+        return ('generation', generation)
+    # Change marks are per database file.  Only the ids, which never go back,
+    # so versions compare in write order (archival lowers the row count)
+    max_id, _count, change_id = crud.graph_change_mark()
+    return ('changes', crud.DB_PATH, max_id, change_id)
+
+
+def _cache_response(cache: response_cache.ResponseCache, key: Tuple[Any, ...], version: Tuple[Any, ...], payload: Dict[str, Any]) -> None:
+    cache.put(key, version, payload, len(json.dumps(payload, separators=(',', ':'))))
+
+
+def _mark_graph_dirty() -> None:
+    store = _get_graph_store()
+    if store is not None:
+        store.mark_dirty()
+
+
+def _generation_graph(current: graph_store.GraphGeneration) -> Tuple[WeightedProductGraph, Dict[int, float], Dict[str, Any]]:
+    return current.graph, current.popularity, {**current.stats, 'generation': current.generation}
+
+
+def _weighted_graph() -> Tuple[WeightedProductGraph, Dict[int, float], Dict[str, Any]]:
+    """The refreshed generation when a store runs, otherwise a build on this request."""
+
+    store = _get_graph_store()
+    if store is None:
+        return _memoized_weighted_graph()
+    # Before the first generation exists, share the store's build rather than racing it
+    return _generation_graph(store.wait_current())
 
 
 def _fallback_recommendations(
@@ -221,11 +570,59 @@ def _fallback_recommendations(
     seed_product_id: int,
     popularity: Dict[int, float],
     limit: int,
+    allowed: Optional[Collection[int]] = None,
 ) -> List[Tuple[WeightedProduct, float]]:
-    candidates = [product for product in graph.products() if product.id != seed_product_id]
-    candidates.sort(key=lambda prod: (popularity.get(prod.id, 0.0), prod.price or 0.0), reverse=True)
-    sliced = candidates[:limit]
-    return [(product, popularity.get(product.id, 0.1) or 0.1) for product in sliced]
+    summary = _graph_summary(graph, popularity)
+    return [
+        (graph.product(pid), popularity.get(pid, 0.1) or 0.1)
+        for pid in summary.most_popular(limit, allowed, exclude=seed_product_id)
+    ]
+
+
+_pixie_sampler_cache: Optional[Tuple[Tuple[Any, ...], random_walk.PixieSampler]] = None
+_pixie_sampler_lock = threading.Lock()
+
+
+def _pixie_sampler(version: Tuple[Any, ...]) -> random_walk.PixieSampler:
+    """Bipartite walk index built once per graph version instead of per request."""
+
+    global _pixie_sampler_cache
+    with _pixie_sampler_lock:
+        cached = _pixie_sampler_cache
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        user_to_products, product_to_users = recommender.bipartite_from_pairs(crud.iter_interaction_pairs())
+        sampler = random_walk.PixieSampler(user_to_products, product_to_users)
+        _pixie_sampler_cache = (version, sampler)
+        return sampler
+
+
+def _pixie_recommendations(
+    graph: WeightedProductGraph,
+    seed_product_id: int,
+    limit: int,
+    walk_budget: int,
+    candidates: Optional[Collection[int]] = None,
+    generation: Optional[int] = None,
+) -> Tuple[List[Tuple[WeightedProduct, float]], Dict[str, Any]]:
+    sampler = _pixie_sampler(_graph_version(generation))
+    result = sampler.sample(
+        [seed_product_id],
+        k=limit,
+        walk_budget=walk_budget,
+        workers=get_settings().graph_walk_workers,
+        candidates=candidates,
+    )
+    total_visits = sum(count for _pid, count in result.ranked) or 1
+    scored: List[Tuple[WeightedProduct, float]] = []
+    for pid, count in result.ranked:
+        try:
+            scored.append((graph.product(pid), count / total_visits))
+        except KeyError:
+            # Interaction for a product deleted since the graph was built
+            continue
+    walk_stats = {'steps': result.steps, 'rounds': result.rounds, 'stopped_early': result.stopped_early}
+    return scored, walk_stats
 
 
 def _build_recommendation_items(
@@ -270,16 +667,7 @@ def _graph_context(
     include_paths: bool,
     shortest_paths: Dict[int, Tuple[float, List[int]]],
 ) -> Dict[str, Any]:
-    product_list = list(graph.products())
-    total_edges = sum(len(graph.neighbors(product.id)) for product in product_list) // 2
-    popularity_leaders = [
-        {
-            'id': product.id,
-            'name': product.name,
-            'score': popularity.get(product.id, 0.0),
-        }
-        for product in sorted(product_list, key=lambda prod: popularity.get(prod.id, 0.0), reverse=True)[:5]
-    ]
+    summary = _graph_summary(graph, popularity)
     try:
         seed_product = graph.product(seed_product_id)
     except KeyError:
@@ -287,12 +675,13 @@ def _graph_context(
 
     context: Dict[str, Any] = {
         'totals': {
-            'products': len(product_list),
-            'edges': total_edges,
+            'products': summary.total_products,
+            'edges': summary.total_edges,
             'interactions': stats.get('interaction_count', 0),
         },
         'generated_edges': stats.get('edge_count', 0),
-        'popularity_leaders': popularity_leaders,
+        'skipped_pairs': stats.get('skipped_pairs', 0),
+        'popularity_leaders': summary.leaders(),
         'seed_product': {
             'id': seed_product.id,
             'name': seed_product.name,
@@ -311,22 +700,86 @@ def _graph_context(
     return context
 
 
+_candidate_indexes: 'weakref.WeakKeyDictionary[WeightedProductGraph, candidate_index.CandidateIndex]' = weakref.WeakKeyDictionary()
+_graph_summaries: 'weakref.WeakKeyDictionary[WeightedProductGraph, graph_summary.GraphSummary]' = weakref.WeakKeyDictionary()
+_graph_csrs: 'weakref.WeakKeyDictionary[WeightedProductGraph, CSRGraph]' = weakref.WeakKeyDictionary()
+_derived_lock = threading.Lock()
+
+
+def _candidate_index(graph: WeightedProductGraph) -> candidate_index.CandidateIndex:
+    """Category/price index built once per graph (generation) and dropped with it."""
+
+    with _derived_lock:
+        index = _candidate_indexes.get(graph)
+        if index is None:
+            index = candidate_index.CandidateIndex(graph.products())
+            _candidate_indexes[graph] = index
+        return index
+
+
+def _graph_csr(graph: WeightedProductGraph) -> CSRGraph:
+    """CSR arrays for PPR: the snapshot's own when it matches, else built once per graph."""
+
+    with _derived_lock:
+        csr = _graph_csrs.get(graph)
+        if csr is None:
+            csr = CSRGraph.from_product_graph(graph)
+            _graph_csrs[graph] = csr
+        return csr
+
+
+def _graph_summary(graph: WeightedProductGraph, popularity: Dict[int, float]) -> graph_summary.GraphSummary:
+    """Popularity order, leaders and totals, derived once per graph (generation)."""
+
+    with _derived_lock:
+        summary = _graph_summaries.get(graph)
+        if summary is None:
+            summary = graph_summary.summarize(graph, popularity)
+            _graph_summaries[graph] = summary
+        return summary
+
+
 def _generate_recommendation_payload(
     seed_product_id: int,
     *,
     limit: int,
     include_paths: bool = False,
     include_edges: bool = False,
+    mode: RecommendationMode = 'shortest_path',
+    walk_budget: int = DEFAULT_WALK_BUDGET,
+    candidate_filter: Optional[candidate_index.CandidateFilter] = None,
+    current: Optional[graph_store.GraphGeneration] = None,
 ) -> Tuple[List[GraphRecommendationItem], Dict[str, Any]]:
+    """``current`` pins the store generation the caller keyed its cache and flight on."""
+
     product = crud.get_product(seed_product_id)
     if not product:
         _product_not_found(seed_product_id)
 
-    graph, popularity, stats = _build_weighted_graph()
-    shortest_paths = graph.dijkstra(seed_product_id)
-    scored = graph.recommend_top_k(seed_product=seed_product_id, k=limit, popularity=popularity)
+    graph, popularity, stats = _generation_graph(current) if current is not None else _weighted_graph()
+    candidate_filter = candidate_filter or candidate_index.CandidateFilter()
+    allowed = _candidate_index(graph).candidates(candidate_filter)
+    if mode == 'shortest_path':
+        scored, shortest_paths = graph.recommend_with_paths(
+            seed_product=seed_product_id, k=limit, popularity=popularity, candidates=allowed
+        )
+        if include_paths and allowed is not None:
+            # Filtered searches stop early; the debug view lists every path
+            shortest_paths = graph.dijkstra(seed_product_id)
+    else:
+        # Paths are only reported for diagnostics in the random-walk modes
+        shortest_paths = graph.dijkstra(seed_product_id) if include_paths or include_edges else {}
+        if mode == 'pixie':
+            scored, walk_stats = _pixie_recommendations(
+                graph, seed_product_id, limit, walk_budget, allowed, generation=stats.get('generation')
+            )
+            stats = {**stats, 'walks': walk_stats}
+        else:
+            scored = ppr.recommend_ppr(
+                graph, [seed_product_id], k=limit, method=PPR_METHODS[mode], csr=_graph_csr(graph), candidates=allowed
+            )
     if not scored:
-        scored = _fallback_recommendations(graph, seed_product_id, popularity, limit)
+        scored = _fallback_recommendations(graph, seed_product_id, popularity, limit, allowed)
 
     items = _build_recommendation_items(
         graph,
@@ -336,6 +789,12 @@ def _generate_recommendation_payload(
         include_edges=include_edges,
     )
     context = _graph_context(graph, stats, popularity, seed_product_id, include_paths, shortest_paths)
+    context['mode'] = mode
+    if allowed is not None:
+        context['filters'] = {**candidate_filter.as_dict(), 'candidates': len(allowed)}
+    for key in ('walks', 'sparsification', 'snapshot', 'generation', 'incremental'):
+        if key in stats:
+            context[key] = stats[key]
     return items, context
 
 
@@ -579,6 +1038,7 @@ def get_product(product_id: int):
 def create_product(p: Product, admin: AdminAuthContext = Depends(require_admin)):
     payload = p.model_dump()
     pid = crud.add_product(payload)
+    _mark_graph_dirty()
     payload['id'] = pid
     product = Product(**payload)
     emit_audit_event(
@@ -598,6 +1058,7 @@ def update_product(product_id: int, p: Product, admin: AdminAuthContext = Depend
     if not before:
         _product_not_found(product_id)
     crud.update_product(product_id, p.model_dump())
+    _mark_graph_dirty()
     updated = crud.get_product(product_id)
     product = Product(**updated)
     emit_audit_event(
@@ -618,6 +1079,7 @@ def remove_product(product_id: int, admin: AdminAuthContext = Depends(require_ad
     if not before:
         _product_not_found(product_id)
     crud.delete_product(product_id)
+    _mark_graph_dirty()
     emit_audit_event(
         admin,
         action='product.delete',
@@ -659,6 +1121,65 @@ def admin_graph_export(admin: AdminAuthContext = Depends(require_admin)):
     return GraphAnalytics(totals=totals, top_products=top_products, nodes=nodes, edges=edges)
 
 
+@app.get('/admin/graph/status', response_model=GraphRefreshStatus)
+def admin_graph_status(admin: AdminAuthContext = Depends(require_admin)):
+    store = _get_graph_store()
+    coalescing = _recommendation_flights.stats()
+    cache = _get_response_cache()
+    cache_stats = cache.stats() if cache is not None else {}
+    if store is None:
+        return GraphRefreshStatus(enabled=False, coalescing=coalescing, response_cache=cache_stats)
+    status_payload = store.status()
+    built_at = status_payload.pop('built_at')
+    if built_at is not None:
+        built_at = datetime.utcfromtimestamp(built_at).replace(microsecond=0).isoformat() + 'Z'
+    return GraphRefreshStatus(
+        enabled=True, built_at=built_at, coalescing=coalescing, response_cache=cache_stats, **status_payload
+    )
+
+
+def _raw_history_readers(settings, retention_seconds: float) -> List[str]:
+    """Graph settings that replay raw events older than the retention period."""
+
+    if settings.graph_window_seconds:
+        # The window takes precedence and only reads its own span
+        return ['GRAPH_WINDOW_DAYS'] if settings.graph_window_seconds > retention_seconds else []
+    readers = []
+    if settings.graph_decay_half_life_seconds:
+        readers.append('GRAPH_DECAY_HALF_LIFE_DAYS')
+    if settings.graph_incremental_refresh:
+        readers.append('GRAPH_INCREMENTAL_REFRESH')
+    return readers
+
+
+@app.post('/admin/interactions/archive', response_model=InteractionArchiveResult)
+def archive_interactions(
+    retention_days: Optional[float] = Query(default=None, gt=0),
+    admin: AdminAuthContext = Depends(require_admin),
+):
+    settings = get_settings()
+    days = retention_days or settings.interaction_retention_days
+    readers = _raw_history_readers(settings, days * 86400)
+    if readers:
+        # Those builds would silently forget the archived events on their next replay
+        raise HTTPException(
+            status_code=409,
+            detail=f"Archiving would drop events still replayed by {', '.join(readers)}",
+        )
+    before = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    archive_path = settings.interaction_archive_path or os.path.join(
+        os.path.dirname(os.path.abspath(crud.DB_PATH)), 'interactions_archive.db'
+    )
+    archived = crud.archive_interactions(before, archive_path)
+    emit_audit_event(
+        admin,
+        action='interaction.archive',
+        target_type='interaction',
+        metadata={'archived': archived, 'before': before, 'archive_path': archive_path},
+    )
+    return InteractionArchiveResult(archived=archived, before=before, archive_path=archive_path)
+
+
 @app.get('/admin/users', response_model=List[SupabaseUser])
 def admin_list_users(admin: AdminAuthContext = Depends(require_admin)):
     users = supabase_admin.paged_user_list(active_user_ids={admin.user_id})
@@ -900,12 +1421,21 @@ def remove_my_cart_item(item_id: int, user_ctx: UserAuthContext = Depends(requir
 # -------------------- Interactions & Recommendations -------------------- #
 
 
+# Identical concurrent queries against the same graph version share one search
+_recommendation_flights: single_flight.SingleFlight[Tuple[List[GraphRecommendationItem], Dict[str, Any]]] = single_flight.SingleFlight()
+
+
 @app.get('/graph/recommendations', response_model=GraphRecommendationResponse)
 def graph_recommendations(
     product_id: int = Query(..., description='Seed product id'),
     user_id: Optional[str] = Query(default=None, description='Optional user identifier'),
     k: int = Query(default=5, ge=1, le=25),
     debug: bool = Query(default=False, description='Include path + edge diagnostics (admin only)'),
+    mode: RecommendationMode = Query(default='shortest_path', description='Scoring engine: shortest_path, ppr (power iteration), ppr_push or pixie'),
+    walk_budget: int = Query(default=DEFAULT_WALK_BUDGET, ge=100, le=1_000_000, description='Random-walk hop budget for mode=pixie'),
+    category: Optional[str] = Query(default=None, description='Only recommend products in this category'),
+    price_min: Optional[float] = Query(default=None, ge=0, description='Lowest product price to recommend'),
+    price_max: Optional[float] = Query(default=None, ge=0, description='Highest product price to recommend'),
     user_ctx: UserAuthContext = Depends(require_user),
 ):
     if user_id and user_id != user_ctx.user_id and not user_ctx.has_role('admin'):
@@ -919,13 +1449,50 @@ def graph_recommendations(
     if debug and not user_ctx.has_role('admin'):
         admin_error(status.HTTP_403_FORBIDDEN, 'auth.forbidden', 'Debug view restricted to admins')
 
-    items, context = _generate_recommendation_payload(
-        product_id,
-        limit=k,
-        include_paths=debug,
-        include_edges=debug,
-    )
+    if price_min is not None and price_max is not None and price_min > price_max:
+        raise HTTPException(status_code=422, detail='price_min must not exceed price_max')
+
+    candidate_filter = candidate_index.CandidateFilter(category=category, price_min=price_min, price_max=price_max)
+    store = _get_graph_store()
+    # One generation for the cache key, the flight key and the computation
+    current = store.wait_current() if store is not None else None
+    query = (product_id, k, mode, debug, walk_budget, candidate_filter)
     timestamp = datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+    # Window graphs also change as events age out, which no version captures
+    cache = _get_response_cache() if not get_settings().graph_window_seconds else None
+    # Without a store the change mark stands in for the generation
+    version = _graph_version(current.generation if current is not None else None)
+    if cache is not None:
+        cached = cache.get(('graph', *query), version)
+        if cached is not None:
+            # Already validated when stored; skip the response model on hits
+            return JSONResponse({
+                'product_id': product_id,
+                'user_id': user_ctx.user_id,
+                'requested_k': k,
+                'generated_at': timestamp,
+                **cached,
+            })
+
+    def compute() -> Tuple[List[GraphRecommendationItem], Dict[str, Any]]:
+        items, context = _generate_recommendation_payload(
+            product_id,
+            limit=k,
+            include_paths=debug,
+            include_edges=debug,
+            mode=mode,
+            walk_budget=walk_budget,
+            candidate_filter=candidate_filter,
+            current=current,
+        )
+        if cache is not None:
+            _cache_response(cache, ('graph', *query), version, {
+                'recommendations': jsonable_encoder(items),
+                'context': jsonable_encoder(context),
+            })
+        return items, context
+
+    (items, context), _shared = _recommendation_flights.do((version, *query), compute)
     return GraphRecommendationResponse(
         product_id=product_id,
         user_id=user_ctx.user_id,
@@ -975,6 +1542,7 @@ def create_interaction(event: InteractionEvent, user_ctx: UserAuthContext = Depe
         rating,
         metadata_json,
     )
+    _mark_graph_dirty()
 
     emit_user_audit_event(
         user_ctx,
@@ -1007,9 +1575,26 @@ def create_interaction(event: InteractionEvent, user_ctx: UserAuthContext = Depe
 
 @app.get('/recommend/{user_id}')
 def recommend(user_id: int, k: int = 10):
-    interactions = crud.get_interactions()
-    recs = recommender.recommend_by_collab(user_id, interactions, top_k=k)
-    return {'user_id': user_id, 'recommendations': [{'product_id': r[0], 'score': r[1]} for r in recs]}
+    cache = _get_response_cache()
+    if cache is not None:
+        store = _get_graph_store()
+        current = store.current() if store is not None else None
+        version = _graph_version(current.generation if current is not None else None)
+    # Collab scores read the live tables, not the store's generation, so the
+    # key names the data they come from; a lagging refresh cannot serve older ones
+    data_version = crud.interaction_high_water_mark()
+    if cache is not None:
+        key = ('user', user_id, k, data_version)
+        cached = cache.get(key, version)
+        if cached is not None:
+            return cached
+    recs = collab_executor.get_executor().recommend_versioned(
+        [user_id], data_version, crud.list_affinity_interactions, top_k=k
+    )[user_id]
+    payload = {'user_id': user_id, 'recommendations': [{'product_id': r[0], 'score': r[1]} for r in recs]}
+    if cache is not None:
+        _cache_response(cache, key, version, payload)
+    return payload
 
 
 def _build_product_graph(product_id: int) -> ProductGraph:
@@ -1017,8 +1602,7 @@ def _build_product_graph(product_id: int) -> ProductGraph:
     if not product:
         raise HTTPException(status_code=404, detail='Product not found')
 
-    interactions = crud.get_interactions()
-    user_to_products, product_to_users = recommender.build_bipartite_graph(interactions)
+    user_to_products, product_to_users = recommender.bipartite_from_pairs(crud.iter_interaction_pairs())
     target_users = product_to_users.get(product_id, set())
 
     nodes = [
@@ -1040,16 +1624,8 @@ def _build_product_graph(product_id: int) -> ProductGraph:
             )
         )
 
-    target_set = product_to_users.get(product_id, set())
-    similarities = []
-    for other_product, users in product_to_users.items():
-        if other_product == product_id:
-            continue
-        score = recommender.jaccard_similarity(target_set, users)
-        if score > 0:
-            similarities.append((other_product, score))
-    similarities.sort(key=lambda x: x[1], reverse=True)
-    for other_id, score in similarities[:5]:
+    similarities = recommender.similar_products(product_id, product_to_users, user_to_products, top_k=5)
+    for other_id, score in similarities:
         other_prod = crud.get_product(other_id)
         if not other_prod:
             continue
@@ -1086,65 +1662,66 @@ def product_analytics(product_id: int):
     - Users who viewed the product
     - Users who purchased the product
     - Interaction counts and statistics
+
+    Views, likes, cart adds and the overall count come from the compacted
+    affinity table, so they include archived events.  Purchases are not
+    compacted and, like the recent-event lists, cover the raw log only.
     """
-    # Get all interactions for this product
-    all_interactions = crud.get_interactions()
-    product_interactions = [i for i in all_interactions if i['product_id'] == product_id]
-    
-    # Separate views and purchases
+    viewers = []
+    likers = []
+    total_views = 0
+    total_likes = 0
+    total_cart_adds = 0
+    interaction_count = 0
+    for user_id, count, view_count, like_count, add_to_cart_count in crud.iter_product_affinity(product_id):
+        interaction_count += count
+        total_views += view_count
+        total_likes += like_count
+        total_cart_adds += add_to_cart_count
+        if view_count:
+            viewers.append(user_id)
+        if like_count:
+            likers.append(user_id)
+
+    # Stream this product's raw interactions instead of loading the whole table
     views = []
     purchases = []
-    likes = []
-    cart_adds = []
-    
-    for interaction in product_interactions:
-        action = interaction.get('action', interaction.get('interaction_type', 'view'))
-        user_id = interaction.get('user_id')
-        created_at = interaction.get('created_at', interaction.get('timestamp', ''))
-        
+    for user_id, action, weight, created_at in crud.iter_product_interactions(product_id):
         user_info = {
             'user_id': user_id,
             'action': action,
             'timestamp': created_at,
-            'weight': interaction.get('weight', 1.0)
+            'weight': weight
         }
         
         if action == 'view':
             views.append(user_info)
         elif action == 'purchase':
             purchases.append(user_info)
-        elif action == 'like':
-            likes.append(user_info)
-        elif action == 'add_to_cart':
-            cart_adds.append(user_info)
     
-    # Get unique user counts
-    unique_viewers = list(set(v['user_id'] for v in views))
     unique_purchasers = list(set(p['user_id'] for p in purchases))
-    unique_likers = list(set(l['user_id'] for l in likes))
     
     return {
         'product_id': product_id,
-        'total_views': len(views),
+        'total_views': total_views,
         'total_purchases': len(purchases),
-        'total_likes': len(likes),
-        'total_cart_adds': len(cart_adds),
-        'unique_viewers': len(unique_viewers),
+        'total_likes': total_likes,
+        'total_cart_adds': total_cart_adds,
+        'unique_viewers': len(viewers),
         'unique_purchasers': len(unique_purchasers),
-        'unique_likers': len(unique_likers),
-        'viewers': unique_viewers,
+        'unique_likers': len(likers),
+        'viewers': viewers,
         'purchasers': unique_purchasers,
-        'likers': unique_likers,
+        'likers': likers,
         'recent_views': views[-10:] if len(views) > 10 else views,
         'recent_purchases': purchases[-10:] if len(purchases) > 10 else purchases,
-        'all_interactions': len(product_interactions)
+        'all_interactions': interaction_count
     }
 
 
 @app.get('/related_products/{product_id}')
 def related_products(product_id: int, depth: int = 2):
-    interactions = crud.get_interactions()
-    _, product_to_users = recommender.build_bipartite_graph(interactions)
+    _, product_to_users = recommender.bipartite_from_pairs(crud.iter_interaction_pairs())
     prod_graph = recommender.build_product_graph(product_to_users)
     if product_id not in prod_graph and product_id not in product_to_users:
         raise HTTPException(status_code=404, detail='Product not found')
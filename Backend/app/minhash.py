@@ -0,0 +1,164 @@
+"""MinHash signatures + banded LSH for approximate Jaccard similarity.
+
+Exact Jaccard over user sets gets expensive once popular products have
+huge audiences.  A :class:`MinHashIndex` keeps a fixed-size signature per
+key (a product's users or a user's products) and buckets every signature
+band-by-band, so a query only looks at keys that collide in at least one
+band and estimates Jaccard from the fraction of matching signature slots.
+
+The accuracy/latency trade-off is controlled by ``num_perm`` (signature
+length, i.e. estimate precision), ``bands`` (more bands with fewer rows
+each -> more candidates and higher recall) and the per-query
+``max_candidates`` cap, which keeps the candidates colliding in the most
+bands.
+
+The module has no package-relative imports, so the benchmark script
+(run from this directory) imports it as a top-level module.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from heapq import nsmallest
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Mersenne prime 2**31 - 1 keeps ``a * x + b`` inside int64
+_PRIME = (1 << 31) - 1
+
+
+class MinHashIndex:
+    """Incrementally updatable MinHash signature store with LSH buckets."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1) -> None:
+        if num_perm <= 0 or bands <= 0:
+            raise ValueError('num_perm and bands must be positive')
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.int64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.int64)
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._buckets: List[Dict[Hashable, Set[int]]] = [defaultdict(set) for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._signatures
+
+    # ------------------------------------------------------------------
+    # Signature maintenance
+    # ------------------------------------------------------------------
+    def _hash_members(self, members: Iterable[int]) -> np.ndarray:
+        values = np.fromiter((m % _PRIME for m in members), dtype=np.int64)
+        if values.size == 0:
+            return np.full(self.num_perm, _PRIME, dtype=np.int64)
+        hashed = (self._a[:, None] * values[None, :] + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _unbucket(self, key: int, signature: np.ndarray) -> None:
+        for band, band_key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def _store(self, key: int, signature: np.ndarray) -> None:
+        previous = self._signatures.get(key)
+        if previous is not None:
+            if np.array_equal(previous, signature):
+                return
+            self._unbucket(key, previous)
+        self._signatures[key] = signature
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self._buckets[band][band_key].add(key)
+
+    def set(self, key: int, members: Iterable[int]) -> None:
+        """(Re)compute the signature of ``key`` from its full member set."""
+
+        self._store(key, self._hash_members(members))
+
+    def add(self, key: int, members: Iterable[int]) -> None:
+        """Fold new members into an existing signature (MinHash is a running min)."""
+
+        fresh = self._hash_members(members)
+        current = self._signatures.get(key)
+        self._store(key, fresh if current is None else np.minimum(current, fresh))
+
+    def remove(self, key: int) -> None:
+        signature = self._signatures.pop(key, None)
+        if signature is not None:
+            self._unbucket(key, signature)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def estimate(self, key_a: int, key_b: int) -> float:
+        sig_a = self._signatures.get(key_a)
+        sig_b = self._signatures.get(key_b)
+        if sig_a is None or sig_b is None:
+            return 0.0
+        return float(np.count_nonzero(sig_a == sig_b)) / self.num_perm
+
+    def band_hits(self, key: int) -> Dict[int, int]:
+        """Colliding keys mapped to the number of bands they share with ``key``."""
+
+        signature = self._signatures.get(key)
+        if signature is None:
+            return {}
+        hits: Dict[int, int] = defaultdict(int)
+        for band, band_key in enumerate(self._band_keys(signature)):
+            for other in self._buckets[band].get(band_key, ()):
+                hits[other] += 1
+        hits.pop(key, None)
+        return dict(hits)
+
+    def candidates(self, key: int) -> Set[int]:
+        return set(self.band_hits(key))
+
+    def top_k(self, key: int, k: int = 5, max_candidates: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Approximate top-k most similar keys as ``(key, estimated_jaccard)``."""
+
+        signature = self._signatures.get(key)
+        if signature is None or k <= 0:
+            return []
+        hits = self.band_hits(key)
+        if max_candidates is not None and len(hits) > max_candidates:
+            # Keys sharing more bands have more matching slots, so keep those
+            pool = [other for other, _count in nsmallest(max_candidates, hits.items(), key=lambda item: (-item[1], item[0]))]
+        else:
+            pool = sorted(hits)
+        if not pool:
+            return []
+        matrix = np.stack([self._signatures[other] for other in pool])
+        estimates = np.count_nonzero(matrix == signature, axis=1) / self.num_perm
+        scored = [(other, float(est)) for other, est in zip(pool, estimates) if est > 0]
+        return nsmallest(k, scored, key=lambda item: (-item[1], item[0]))
+
+
+def build_minhash_indexes(
+    user_to_products: Dict[int, Set[int]],
+    product_to_users: Dict[int, Set[int]],
+    *,
+    num_perm: int = 64,
+    bands: int = 16,
+    seed: int = 1,
+) -> Tuple[MinHashIndex, MinHashIndex]:
+    """Build ``(product_index, user_index)`` from ``build_bipartite_graph`` output."""
+
+    product_index = MinHashIndex(num_perm=num_perm, bands=bands, seed=seed)
+    for product_id, users in product_to_users.items():
+        product_index.set(product_id, users)
+    user_index = MinHashIndex(num_perm=num_perm, bands=bands, seed=seed)
+    for user_id, products in user_to_products.items():
+        user_index.set(user_id, products)
+    return product_index, user_index
@@ -137,6 +137,29 @@ class GraphAnalytics(BaseModel):
     edges: List[GraphEdge]
 
 
+class GraphRefreshStatus(BaseModel):
+    enabled: bool
+    running: bool = False
+    generation: Optional[int] = None
+    built_at: Optional[str] = None
+    build_seconds: Optional[float] = None
+    age_seconds: Optional[float] = None
+    high_water_mark: Optional[List[int]] = None
+    dirty: bool = False
+    stale_seconds: float = 0.0
+    interval_seconds: float = 0.0
+    idle_seconds: float = 0.0
+    last_error: Optional[str] = None
+    coalescing: Dict[str, int] = Field(default_factory=dict)
+    response_cache: Dict[str, int] = Field(default_factory=dict)
+
+
+class InteractionArchiveResult(BaseModel):
+    archived: int
+    before: str
+    archive_path: str
+
+
 class GraphRecommendationPath(BaseModel):
     source: int
     target: int
@@ -11,8 +11,13 @@ from __future__ import annotations
 
 from collections import defaultdict, deque
 from dataclasses import dataclass
-from heapq import heappush, heappop
-from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from heapq import heappop, heappush, heapreplace
+from typing import Callable, Collection, Deque, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .topk import select_top_k
+except ImportError:  # executed directly as a script
+    from topk import select_top_k
 
 
 @dataclass(frozen=True)
@@ -60,6 +65,9 @@ class ProductGraph:
     def products(self) -> Iterable[Product]:
         return self._products.values()
 
+    def __contains__(self, product_id: object) -> bool:
+        return product_id in self._products
+
     # ------------------------------------------------------------------
     # Traversal algorithms
     # ------------------------------------------------------------------
@@ -99,17 +107,32 @@ class ProductGraph:
                     queue.append((nb, depth + 1))
         return order
 
-    def dijkstra(self, start_id: int) -> Dict[int, Tuple[float, List[int]]]:
-        """Shortest weighted paths from start to every reachable product."""
+    def dijkstra(
+        self,
+        start_id: int,
+        stop: Optional[Callable[[int, float], bool]] = None,
+    ) -> Dict[int, Tuple[float, List[int]]]:
+        """Shortest weighted paths from start to every reachable product.
+
+        ``stop(node, distance)`` is called as each node is settled, in
+        distance order; once it returns True the search ends and only the
+        settled nodes are reported.
+        """
 
         distances: Dict[int, float] = {start_id: 0.0}
         parents: Dict[int, Optional[int]] = {start_id: None}
         heap: List[Tuple[float, int]] = [(0.0, start_id)]
+        settled: Dict[int, float] = {}
+        stopped = False
 
         while heap:
             distance, node = heappop(heap)
-            if distance > distances.get(node, float("inf")):
+            if node in settled or distance > distances.get(node, float("inf")):
                 continue
+            settled[node] = distance
+            if stop is not None and stop(node, distance):
+                stopped = True
+                break
             for neighbor, weight in self.neighbors(node).items():
                 next_distance = distance + weight
                 if next_distance < distances.get(neighbor, float("inf")):
@@ -117,8 +140,9 @@ class ProductGraph:
                     parents[neighbor] = node
                     heappush(heap, (next_distance, neighbor))
 
+        reached = settled if stopped else distances
         paths: Dict[int, List[int]] = {}
-        for node in distances:
+        for node in reached:
             path: List[int] = []
             current: Optional[int] = node
             while current is not None:
@@ -126,7 +150,7 @@ class ProductGraph:
                 current = parents[current]
             paths[node] = list(reversed(path))
 
-        return {node: (distances[node], paths[node]) for node in distances}
+        return {node: (distances[node], paths[node]) for node in reached}
 
     # ------------------------------------------------------------------
     # Recommendation helper
@@ -136,27 +160,76 @@ class ProductGraph:
         seed_product: int,
         k: int = 5,
         popularity: Optional[Dict[int, int]] = None,
+        candidates: Optional[Collection[int]] = None,
     ) -> List[Tuple[Product, float]]:
         """Score reachable products using inverse distance + popularity."""
 
-        shortest_paths = self.dijkstra(seed_product)
+        return self.recommend_with_paths(seed_product, k, popularity, candidates)[0]
+
+    def recommend_with_paths(
+        self,
+        seed_product: int,
+        k: int = 5,
+        popularity: Optional[Dict[int, int]] = None,
+        candidates: Optional[Collection[int]] = None,
+    ) -> Tuple[List[Tuple[Product, float]], Dict[int, Tuple[float, List[int]]]]:
+        """:meth:`recommend_top_k` plus the shortest paths it computed.
+
+        With ``candidates`` only those products are scored and the search
+        stops early: a product's score is at most
+        ``max(bonus * edge_weight_sum) / (1 + distance)`` over the
+        candidates, so once that bound drops below the k-th best score no
+        product settled later can enter the top k.  Only the settled
+        paths are returned in that case.
+        """
+
         if popularity is None:
             popularity = defaultdict(int)
-
         max_pop = max(popularity.values(), default=1)
-        scores: List[Tuple[float, Product]] = []
 
-        for product_id, (distance, _path) in shortest_paths.items():
-            if product_id == seed_product:
-                continue
-            inverse_distance = 1.0 / (1.0 + distance)
+        def factors(product_id: int) -> Tuple[float, float]:
             popularity_bonus = 1.0 + (popularity.get(product_id, 0) / max_pop)
             edge_weight_sum = sum(self.neighbors(product_id).values()) or 1.0
-            score = inverse_distance * popularity_bonus * edge_weight_sum
-            scores.append((score, self.product(product_id)))
-
-        scores.sort(key=lambda item: item[0], reverse=True)
-        return [(product, score) for score, product in scores[:k]]
+            return popularity_bonus, edge_weight_sum
+
+        if candidates is None:
+            shortest_paths = self.dijkstra(seed_product)
+            scores: List[Tuple[float, Product]] = []
+            for product_id, (distance, _path) in shortest_paths.items():
+                if product_id == seed_product:
+                    continue
+                inverse_distance = 1.0 / (1.0 + distance)
+                popularity_bonus, edge_weight_sum = factors(product_id)
+                scores.append((inverse_distance * popularity_bonus * edge_weight_sum, self.product(product_id)))
+            top = select_top_k(scores, k, key=lambda item: (-item[0], item[1].id))
+            return [(product, score) for score, product in top], shortest_paths
+
+        targets = {pid: factors(pid) for pid in candidates if pid in self._products and pid != seed_product}
+        if not targets or k <= 0:
+            return [], {}
+        ceiling = max(bonus * weight_sum for bonus, weight_sum in targets.values())
+        # Min-heap of (score, -id): the root is the current k-th best
+        best: List[Tuple[float, int]] = []
+        remaining = len(targets)
+
+        def settle(node: int, distance: float) -> bool:
+            nonlocal remaining
+            if node in targets:
+                remaining -= 1
+                popularity_bonus, edge_weight_sum = targets[node]
+                entry = ((1.0 / (1.0 + distance)) * popularity_bonus * edge_weight_sum, -node)
+                if len(best) < k:
+                    heappush(best, entry)
+                elif entry > best[0]:
+                    heapreplace(best, entry)
+            if remaining == 0:
+                return True
+            # Small slack so float rounding never prunes a tie
+            return len(best) >= k and ceiling / (1.0 + distance) * (1.0 + 1e-9) < best[0][0]
+
+        shortest_paths = self.dijkstra(seed_product, stop=settle)
+        ranked = sorted(best, key=lambda entry: (-entry[0], -entry[1]))
+        return [(self.product(-neg_id), score) for score, neg_id in ranked], shortest_paths
 
 
 # ----------------------------------------------------------------------
@@ -0,0 +1,130 @@
+"""Pixie-style Monte Carlo random walks on the user-product bipartite graph.
+
+Even push-based PPR touches an unbounded number of nodes on a hub-heavy
+graph.  :class:`PixieSampler` instead spends a fixed *walk budget*: short
+walks start at the seed product(s), hop product -> random user -> random
+product, and every product landed on collects a visit.  The budget counts
+edge traversals, so each product -> user -> product step costs two hops.  The visit counts
+approximate the walk distribution, and sampling stops early once the
+top-k products have not changed for ``patience`` consecutive rounds.
+
+Walkers are simulated as NumPy arrays, one hop for the whole batch at a
+time, and a round's batch can be split across threads (each with its own
+RNG stream) because the array kernels release the GIL.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .graph_csr import bipartite_csr
+from .topk import top_k_arrays
+
+
+@dataclass(frozen=True)
+class WalkResult:
+    ranked: List[Tuple[int, int]]
+    steps: int
+    rounds: int
+    stopped_early: bool
+
+
+def _random_neighbour(indptr: np.ndarray, targets: np.ndarray, nodes: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    starts = indptr[nodes]
+    degrees = indptr[nodes + 1] - starts
+    return targets[starts + (rng.random(nodes.size) * degrees).astype(np.int64)]
+
+
+class PixieSampler:
+    """Bounded random-walk recommender over ``build_bipartite_graph`` output."""
+
+    def __init__(self, user_to_products: Dict[int, Set[int]], product_to_users: Dict[int, Set[int]]) -> None:
+        _user_ids, product_ids, arrays = bipartite_csr(user_to_products, product_to_users)
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self._positions = {pid: pos for pos, pid in enumerate(product_ids)}
+        self._arrays = arrays
+
+    def _walk_batch(self, starts: np.ndarray, walk_length: int, rng: np.random.Generator) -> np.ndarray:
+        arrays = self._arrays
+        visits = np.zeros(self.product_ids.size, dtype=np.int64)
+        current = starts
+        for _ in range(walk_length):
+            users = _random_neighbour(arrays['product_indptr'], arrays['product_users'], current, rng)
+            current = _random_neighbour(arrays['user_indptr'], arrays['user_products'], users, rng)
+            visits += np.bincount(current, minlength=visits.size)
+        return visits
+
+    def sample(
+        self,
+        seeds: Iterable[int],
+        k: int = 10,
+        *,
+        walk_budget: int = 20000,
+        walk_length: int = 4,
+        batch_size: int = 256,
+        patience: int = 3,
+        workers: int = 1,
+        seed: Optional[int] = None,
+        candidates: Optional[Collection[int]] = None,
+    ) -> WalkResult:
+        """Spend at most ``walk_budget`` hops and return ``(product_id, visits)`` pairs.
+
+        Walks cross every product, but only ``candidates`` (when given) are
+        ranked, so early stopping watches the filtered top-k.
+        """
+
+        seed_positions = np.asarray(sorted({self._positions[pid] for pid in seeds if pid in self._positions}), dtype=np.int64)
+        excluded = seed_positions
+        if candidates is not None:
+            allowed = np.isin(self.product_ids, np.fromiter(candidates, dtype=np.int64, count=len(candidates)))
+            excluded = np.union1d(seed_positions, np.flatnonzero(~allowed))
+        if seed_positions.size == 0 or k <= 0:
+            return WalkResult(ranked=[], steps=0, rounds=0, stopped_early=False)
+
+        workers = max(1, workers)
+        streams = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(workers)]
+        # Each step of a walk crosses two edges (product -> user -> product)
+        hops_per_walk = 2 * walk_length
+        batch_size = max(1, min(batch_size, walk_budget // hops_per_walk))
+        hops_per_round = batch_size * hops_per_walk
+        visits = np.zeros(self.product_ids.size, dtype=np.int64)
+        steps = rounds = stable = 0
+        previous: Optional[List[int]] = None
+        stopped_early = False
+
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            while rounds == 0 or steps + hops_per_round <= walk_budget:
+                starts = seed_positions[np.arange(batch_size) % seed_positions.size]
+                if pool is None:
+                    visits += self._walk_batch(starts, walk_length, streams[0])
+                else:
+                    chunks = np.array_split(starts, workers)
+                    for partial in pool.map(self._walk_batch, chunks, [walk_length] * workers, streams):
+                        visits += partial
+                steps += hops_per_round
+                rounds += 1
+
+                ranked = self._top(visits, excluded, k)
+                current = [pid for pid, _count in ranked]
+                stable = stable + 1 if current == previous else 0
+                previous = current
+                if stable >= patience:
+                    stopped_early = steps < walk_budget
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        return WalkResult(ranked=self._top(visits, excluded, k), steps=steps, rounds=rounds, stopped_early=stopped_early)
+
+    def _top(self, visits: np.ndarray, excluded: np.ndarray, k: int) -> List[Tuple[int, int]]:
+        counts = visits.copy()
+        counts[excluded] = 0
+        candidates = np.flatnonzero(counts)
+        ids, values = top_k_arrays(self.product_ids[candidates], counts[candidates], k)
+        return [(int(pid), int(count)) for pid, count in zip(ids, values)]
@@ -1,67 +1,242 @@
 from collections import defaultdict, deque
-from typing import Dict, Set, List, Tuple
-import heapq
+from typing import Dict, Iterable, Iterator, Set, List, Optional, Tuple
 import time
 
+try:
+    from .topk import top_k_scores
+except ImportError:  # imported as a top-level module by benchmark.py
+    from topk import top_k_scores
+
 # Algorithms used:
 # - Graph represented as adjacency lists (dict of sets)
 # - BFS traversal on product graph
 # - Hashing via dicts/sets for fast membership
-# - Priority queue (heapq) to select top-K
-# - Sorting for final ranking
+# - Bounded heap (heapq) to select top-K without sorting every candidate
 # - Collaborative filtering using Jaccard similarity
+# - Inverted index (user -> products) to score only co-occurring products
+# - Optional int bitmaps over dense user indexes for posting lists (popcount)
+
+
+class UserIndex:
+    """Assigns dense, stable bit positions to user ids."""
+
+    def __init__(self) -> None:
+        self._positions: Dict[int, int] = {}
+        self._user_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._user_ids)
+
+    def position(self, user_id: int) -> int:
+        pos = self._positions.get(user_id)
+        if pos is None:
+            pos = len(self._user_ids)
+            self._positions[user_id] = pos
+            self._user_ids.append(user_id)
+        return pos
+
+    def lookup(self, user_id: int) -> Optional[int]:
+        return self._positions.get(user_id)
+
+    def user_id(self, position: int) -> int:
+        return self._user_ids[position]
+
+
+class PostingBitmap:
+    """Set-like posting list of user ids stored as a Python int bitmap.
+
+    Cardinality is cached, intersection size is a single ``&`` plus
+    ``bit_count()`` and union size is derived from the two cardinalities,
+    so neither allocates a set.
+    """
+
+    __slots__ = ('bits', '_count', '_index')
+
+    def __init__(self, index: UserIndex, bits: int = 0) -> None:
+        self._index = index
+        self.bits = bits
+        self._count = bits.bit_count()
+
+    @classmethod
+    def from_positions(cls, index: UserIndex, positions: Iterable[int]) -> 'PostingBitmap':
+        positions = list(positions)
+        if not positions:
+            return cls(index)
+        buf = bytearray(max(positions) // 8 + 1)
+        for pos in positions:
+            buf[pos >> 3] |= 1 << (pos & 7)
+        return cls(index, int.from_bytes(buf, 'little'))
+
+    def add(self, user_id: int) -> None:
+        mask = 1 << self._index.position(user_id)
+        if not self.bits & mask:
+            self.bits |= mask
+            self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __bool__(self) -> bool:
+        return self._count > 0
+
+    def __contains__(self, user_id: int) -> bool:
+        pos = self._index.lookup(user_id)
+        return pos is not None and bool(self.bits >> pos & 1)
+
+    def __iter__(self) -> Iterator[int]:
+        # bin() walks the int once instead of shifting per set bit
+        for pos, bit in enumerate(reversed(bin(self.bits)[2:])):
+            if bit == '1':
+                yield self._index.user_id(pos)
+
+    def intersection_size(self, other: 'PostingBitmap') -> int:
+        return (self.bits & other.bits).bit_count()
+
+    def union_size(self, other: 'PostingBitmap') -> int:
+        return self._count + other._count - self.intersection_size(other)
+
+
+def build_bipartite_graph(interactions: Iterable[Dict[str, int]], backend: str = 'set'):
+    """Build user->products and product->users maps.
 
+    ``backend='bitmap'`` returns ``PostingBitmap`` posting lists (sharing one
+    ``UserIndex``) for product->users instead of Python sets.
+    """
+    return bipartite_from_pairs(((it['user_id'], it['product_id']) for it in interactions), backend=backend)
 
-def build_bipartite_graph(interactions: List[Dict[str, int]]):
+
+def bipartite_from_pairs(pairs: Iterable[Tuple[int, int]], backend: str = 'set'):
+    """``build_bipartite_graph`` over a stream of ``(user_id, product_id)`` tuples."""
+    if backend not in ('set', 'bitmap'):
+        raise ValueError(f'Unknown bipartite backend: {backend}')
     user_to_products: Dict[int, Set[int]] = defaultdict(set)
+    if backend == 'bitmap':
+        return user_to_products, _bitmap_postings(pairs, user_to_products)
     product_to_users: Dict[int, Set[int]] = defaultdict(set)
-    for it in interactions:
-        u = it['user_id']
-        p = it['product_id']
+    for u, p in pairs:
         user_to_products[u].add(p)
         product_to_users[p].add(u)
     return user_to_products, product_to_users
 
 
+def _bitmap_postings(pairs: Iterable[Tuple[int, int]], user_to_products: Dict[int, Set[int]]) -> Dict[int, PostingBitmap]:
+    """Fill ``user_to_products`` and build product bitmaps without intermediate sets."""
+
+    index = UserIndex()
+    # One growable byte buffer per product; set bits are written in place
+    buffers: Dict[int, bytearray] = {}
+    for u, p in pairs:
+        user_to_products[u].add(p)
+        pos = index.position(u)
+        buf = buffers.get(p)
+        if buf is None:
+            buf = buffers[p] = bytearray()
+        byte = pos >> 3
+        if byte >= len(buf):
+            buf.extend(bytes(byte + 1 - len(buf)))
+        buf[byte] |= 1 << (pos & 7)
+    return {p: PostingBitmap(index, int.from_bytes(buf, 'little')) for p, buf in buffers.items()}
+
+
 def jaccard_similarity(set_a: Set[int], set_b: Set[int]) -> float:
     if not set_a and not set_b:
         return 0.0
-    inter = len(set_a & set_b)
-    union = len(set_a | set_b)
+    if isinstance(set_a, PostingBitmap) and isinstance(set_b, PostingBitmap):
+        inter = set_a.intersection_size(set_b)
+        union = len(set_a) + len(set_b) - inter
+    elif isinstance(set_a, PostingBitmap) or isinstance(set_b, PostingBitmap):
+        # Mixed inputs: probe the bitmap with the plain set's members
+        bitmap, members = (set_a, set_b) if isinstance(set_a, PostingBitmap) else (set_b, set_a)
+        inter = sum(1 for user in members if user in bitmap)
+        union = len(bitmap) + len(members) - inter
+    else:
+        inter = len(set_a & set_b)
+        union = len(set_a | set_b)
     return inter / union if union else 0.0
 
 
-def recommend_by_collab(user_id: int, interactions: List[Dict[str, int]], top_k: int = 10) -> List[Tuple[int, float]]:
-    user_to_products, product_to_users = build_bipartite_graph(interactions)
+def similar_products(
+    product_id: int,
+    product_to_users: Dict[int, Set[int]],
+    user_to_products: Dict[int, Set[int]],
+    top_k: int = 5,
+    degrees: Optional[Dict[int, int]] = None,
+) -> List[Tuple[int, float]]:
+    """Top-k products by Jaccard similarity of their user sets.
+
+    Only products reachable through the target's users are scored: the
+    intersection sizes are counted in a single pass over the inverted index
+    and union sizes come from the per-product degrees
+    (|A u B| = |A| + |B| - |A n B|), so no set is materialised.
+    """
+    target_users = product_to_users.get(product_id)
+    if not target_users or top_k <= 0:
+        return []
+
+    overlap: Dict[int, int] = defaultdict(int)
+    for user in target_users:
+        for other in user_to_products.get(user, ()):
+            if other != product_id:
+                overlap[other] += 1
+
+    target_degree = len(target_users)
+    scored = []
+    for other, inter in overlap.items():
+        other_degree = degrees[other] if degrees is not None else len(product_to_users[other])
+        scored.append((other, inter / (target_degree + other_degree - inter)))
+
+    return top_k_scores(scored, top_k)
+
+
+def _collab_scores(
+    user_id: int,
+    user_to_products: Dict[int, Set[int]],
+    product_to_users: Dict[int, Set[int]],
+) -> Dict[int, float]:
     target_products = user_to_products.get(user_id, set())
 
-    scores: Dict[int, float] = defaultdict(float)
+    # Only users sharing at least one product have a non-zero Jaccard;
+    # count the overlaps through the inverted index
+    overlap: Dict[int, int] = defaultdict(int)
+    for prod in target_products:
+        for other_user in product_to_users.get(prod, ()):
+            if other_user != user_id:
+                overlap[other_user] += 1
 
-    # For each other user, compute Jaccard against target user
-    for other_user, other_products in user_to_products.items():
-        if other_user == user_id:
-            continue
-        sim = jaccard_similarity(target_products, other_products)
-        if sim <= 0:
-            continue
+    scores: Dict[int, float] = defaultdict(float)
+    target_size = len(target_products)
+    for other_user in sorted(overlap):
+        other_products = user_to_products[other_user]
+        inter = overlap[other_user]
+        sim = inter / (target_size + len(other_products) - inter)
         # For each product the other user has that target doesn't, add sim
         for prod in other_products:
             if prod not in target_products:
                 scores[prod] += sim
+    return scores
 
-    # Use heapq to get top_k
-    heap = []
-    for prod, sc in scores.items():
-        heapq.heappush(heap, (-sc, prod))
 
-    top = []
-    while heap and len(top) < top_k:
-        sc, prod = heapq.heappop(heap)
-        top.append((prod, -sc))
+def recommend_by_collab(user_id: int, interactions: List[Dict[str, int]], top_k: int = 10) -> List[Tuple[int, float]]:
+    user_to_products, product_to_users = build_bipartite_graph(interactions)
+    return top_k_scores(_collab_scores(user_id, user_to_products, product_to_users).items(), top_k)
+
 
-    # Sort final list by score desc, product id asc for tie-breaking
-    top.sort(key=lambda x: (-x[1], x[0]))
-    return top
+def recommend_many(
+    user_ids: Iterable[int],
+    interactions: Iterable[Dict[str, int]],
+    top_k: int = 10,
+) -> Dict[int, List[Tuple[int, float]]]:
+    """Collaborative recommendations for many users from one graph build.
+
+    The bipartite graph is built once and each user is scored through the
+    inverted index, so a broadcast costs one pass over the interactions
+    instead of one per recipient.
+    """
+    user_to_products, product_to_users = build_bipartite_graph(interactions)
+    return {
+        uid: top_k_scores(_collab_scores(uid, user_to_products, product_to_users).items(), top_k)
+        for uid in dict.fromkeys(user_ids)
+    }
 
 
 def build_product_graph(product_to_users:Dict[int, Set[int]]) ->Dict[int, Set[int]]:
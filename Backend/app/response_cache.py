@@ -0,0 +1,110 @@
+"""Bounded cache of finished recommendation responses.
+
+Popular seeds are asked for over and over while the graph stays the
+same, and each hit used to rerun the search and re-validate the same
+response models.  :class:`ResponseCache` keeps the encoded payloads:
+
+* entries are evicted least-recently-used once their total size passes
+  ``max_bytes`` (sizes are the caller's estimate, e.g. encoded length);
+* an optional ``ttl_seconds`` bounds how long any entry is served;
+* every lookup and store names the graph *version* it belongs to.
+  Versions only move forward (a new generation, or new writes when no
+  background store runs) and must compare in that order.  A newer
+  version drops the whole cache; a lookup or store naming an older one,
+  e.g. from a request that started before the bump, misses or is ignored
+  without touching the entries, so they always match the newest version.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# key -> (value, size, expires_at or None)
+_Entry = Tuple[Any, int, Optional[float]]
+
+
+class ResponseCache:
+    """LRU by total size with an optional TTL, scoped to one graph version."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float = 0.0) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._version: Optional[Any] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _admit(self, version: Any) -> bool:
+        """Advance to ``version`` when it is newer; ``False`` when it is older than the cache's."""
+
+        if self._version is None or self._version < version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+            return True
+        return version == self._version
+
+    def get(self, key: Hashable, version: Any, now: Optional[float] = None) -> Optional[Any]:
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key) if self._admit(version) else None
+            if entry is not None and entry[2] is not None and entry[2] <= now:
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, version: Any, value: Any, size: int, now: Optional[float] = None) -> bool:
+        """Store ``value``; ``False`` when it is too large or its version was superseded."""
+
+        now = time.time() if now is None else now
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if not self._admit(version):
+                return False
+            if key in self._entries:
+                self._discard(key)
+            expires_at = now + self.ttl_seconds if self.ttl_seconds > 0 else None
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+            return True
+
+    def _discard(self, key: Hashable) -> None:
+        _value, size, _expires_at = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
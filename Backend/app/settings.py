@@ -24,6 +24,52 @@ class Settings:
         self.admin_email_allowlist = [e.strip().lower() for e in emails.split(',') if e.strip()]
         mock_flag = _env_flag('MOCK_SUPABASE') or not bool(self.supabase_service_role_key)
         self.mock_supabase = mock_flag
+        # Collaborative filtering: 0 workers keeps scoring in-process
+        self.collab_pool_size = int(os.getenv('COLLAB_POOL_SIZE', '0'))
+        self.collab_parallel_min_interactions = int(os.getenv('COLLAB_PARALLEL_MIN_INTERACTIONS', '50000'))
+        # Product graph: exponential decay of interaction weights (0 disables)
+        half_life_days = float(os.getenv('GRAPH_DECAY_HALF_LIFE_DAYS', '0'))
+        self.graph_decay_half_life_seconds = half_life_days * 86400 if half_life_days > 0 else None
+        self.graph_decay_prune_below = float(os.getenv('GRAPH_DECAY_PRUNE_BELOW', '0'))
+        # Sliding window: only interactions from the last N days (0 keeps all history)
+        window_days = float(os.getenv('GRAPH_WINDOW_DAYS', '0'))
+        self.graph_window_seconds = window_days * 86400 if window_days > 0 else None
+        # Load edges from the product_edges table maintained on insert instead of
+        # enumerating pairs.  Inserts apply GRAPH_USER_PAIR_BUDGET (the table is
+        # re-derived at startup when it changes); decay, pruning and the sliding
+        # window are not supported and fall back to computing the edges
+        self.graph_persisted_edges = _env_flag('GRAPH_PERSISTED_EDGES')
+        # Keep the full-history graph in memory and apply only new interactions and
+        # product changes on each build instead of re-reading the whole table
+        self.graph_incremental_refresh = _env_flag('GRAPH_INCREMENTAL_REFRESH')
+        # Max product pairs one user's basket contributes (0 = unlimited)
+        self.graph_user_pair_budget = int(os.getenv('GRAPH_USER_PAIR_BUDGET', '0'))
+        # Full rebuilds: 0 = dict build, 1 = NumPy map-reduce in-process, N = N worker processes
+        self.graph_build_workers = int(os.getenv('GRAPH_BUILD_WORKERS', '0'))
+        # Threads that split each round of mode=pixie random walks (1 walks in the request thread)
+        self.graph_walk_workers = int(os.getenv('GRAPH_WALK_WORKERS', '1'))
+        # Binary graph snapshot shared by workers (unset disables); reused while the
+        # interaction high-water mark and build settings match
+        self.graph_snapshot_path = os.getenv('GRAPH_SNAPSHOT_PATH') or None
+        # Publish the built graph in shared memory under this name prefix so every
+        # uvicorn worker on the host attaches to one copy (unset disables)
+        self.graph_shared_memory_prefix = os.getenv('GRAPH_SHARED_MEMORY_PREFIX') or None
+        # Background graph refresh: rebuild every N seconds and/or once writes have
+        # been idle for N seconds (both 0 keeps building on request)
+        self.graph_refresh_interval_seconds = float(os.getenv('GRAPH_REFRESH_INTERVAL_SECONDS', '0'))
+        self.graph_refresh_idle_seconds = float(os.getenv('GRAPH_REFRESH_IDLE_SECONDS', '0'))
+        # Interaction archival: raw events older than N days move to a cold SQLite
+        # file (default: interactions_archive.db next to the main database)
+        self.interaction_retention_days = float(os.getenv('INTERACTION_RETENTION_DAYS', '365'))
+        self.interaction_archive_path = os.getenv('INTERACTION_ARCHIVE_PATH') or None
+        # Finished recommendation responses kept per graph version, evicted LRU past
+        # N MB and optionally expired after N seconds (0 MB disables the cache)
+        cache_mb = float(os.getenv('RECOMMENDATION_CACHE_MB', '0'))
+        self.recommendation_cache_max_bytes = int(cache_mb * 1024 * 1024)
+        self.recommendation_cache_ttl_seconds = float(os.getenv('RECOMMENDATION_CACHE_TTL_SECONDS', '0'))
+        # Sparsification: strongest edges kept per product / min shared baskets (0 disables)
+        self.graph_max_degree = int(os.getenv('GRAPH_MAX_DEGREE', '0'))
+        self.graph_min_cooccurrence = int(os.getenv('GRAPH_MIN_COOCCURRENCE', '0'))
 
 
 @lru_cache()
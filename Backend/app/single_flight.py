@@ -0,0 +1,77 @@
+"""Coalesce identical concurrent calls into one computation.
+
+When one product goes viral, many requests for the same recommendations
+arrive at once and each would run its own search.  :class:`SingleFlight`
+lets the first caller for a key compute the result while later callers
+with the same key wait for it and share the outcome.  An exception is
+re-raised in each waiter as its own shallow copy (chained to the
+leader's), so concurrent raises never share one traceback.  Nothing is kept once the call finishes: only requests that
+overlap in time are collapsed, so this never serves stale results.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+def _private_copy(error: BaseException) -> BaseException:
+    """Same type, args and attributes; constructors are bypassed because they vary."""
+
+    clone = type(error).__new__(type(error), *error.args)
+    clone.__dict__.update(getattr(error, '__dict__', {}))
+    return clone
+
+
+class SingleFlight(Generic[T]):
+    """Runs at most one call per key at a time; overlapping callers share it."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.collapsed = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """``(result, shared)``; ``shared`` is true when another caller computed it."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.collapsed += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise _private_copy(call.error) from call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'executed': self.executed, 'collapsed': self.collapsed, 'in_flight': len(self._calls)}
@@ -0,0 +1,50 @@
+"""Partial top-k selection shared by the recommenders.
+
+Every ranking in the backend orders by score descending and breaks ties
+by id ascending.  Selecting k winners never needs a full sort: Python
+sequences go through a bounded heap of size k (``O(n log k)``) and NumPy
+score arrays through ``argpartition`` (``O(n)``) before the k survivors
+are ordered.
+
+No package-relative imports so standalone scripts can use it directly.
+"""
+
+from __future__ import annotations
+
+from heapq import nsmallest
+from typing import Any, Callable, Hashable, Iterable, List, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar('T')
+K = TypeVar('K', bound=Hashable)
+
+
+def select_top_k(items: Iterable[T], k: int, key: Callable[[T], Any]) -> List[T]:
+    """The ``k`` items with the smallest ``key``, in key order."""
+
+    if k <= 0:
+        return []
+    return nsmallest(k, items, key=key)
+
+
+def top_k_scores(scores: Iterable[Tuple[K, float]], k: int) -> List[Tuple[K, float]]:
+    """Top-k ``(id, score)`` pairs by score desc, id asc."""
+
+    return select_top_k(scores, k, key=lambda item: (-item[1], item[0]))
+
+
+def top_k_arrays(ids: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Array version of :func:`top_k_scores` returning ``(ids, scores)``."""
+
+    n = scores.size
+    if k <= 0 or n == 0:
+        return ids[:0], scores[:0]
+    if k < n:
+        # Everything tied with the k-th largest score survives so the id
+        # tie-break is applied across the whole tie group
+        kth = scores[np.argpartition(scores, n - k)[n - k]]
+        mask = scores >= kth
+        ids, scores = ids[mask], scores[mask]
+    order = np.lexsort((ids, -scores))[:k]
+    return ids[order], scores[order]
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Importing the app migrates its database: keep the checked-in dev DB out of test runs
+os.environ.setdefault('APP_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='graph-recs-tests-'), 'app.db'))
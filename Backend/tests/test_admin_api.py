@@ -1,9 +1,15 @@
+import sqlite3
+import types
+import uuid
+
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 
-from ..app import crud, db_init, email_service
+from ..app import crud, db_init, email_service, graph_builder, graph_csr, graph_shared, graph_snapshot, main, random_walk, single_flight
 from ..app.main import app
 from ..app.auth import require_admin, require_user, AdminAuthContext, UserAuthContext
+from ..app.settings import get_settings
 
 
 @pytest.fixture()
@@ -248,3 +254,497 @@ def test_user_portal_category_and_detail_flow(client):
     assert detail['interaction_summary']['views'] >= 1
     assert any(size['size'] == 'M' for size in detail['sizes'])
     assert detail['graph']['nodes'], 'expected product graph to include at least the seed node'
+
+
+def test_graph_recommendation_modes(client):
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(4)]
+    users = [crud.add_user(f'Listener {idx}') for idx in range(3)]
+    for uid, basket in zip(users, ([0, 1], [1, 2], [2, 3])):
+        for idx in basket:
+            crud.add_interaction(uid, pids[idx], 'view', 1.0)
+
+    for mode in ('shortest_path', 'ppr', 'ppr_push', 'pixie'):
+        resp = client.get(f'/graph/recommendations?product_id={pids[0]}&k=3&mode={mode}')
+        assert resp.status_code == 200
+        payload = resp.json()
+        assert payload['context']['mode'] == mode
+        ids = [item['id'] for item in payload['recommendations']]
+        assert ids and pids[0] not in ids
+        assert ids[0] == pids[1]
+
+    walks = client.get(f'/graph/recommendations?product_id={pids[0]}&mode=pixie&walk_budget=400').json()['context']['walks']
+    assert walks['steps'] <= 400
+    # The walk index is reused until the graph inputs change
+    sampler = main._pixie_sampler_cache[1]
+    client.get(f'/graph/recommendations?product_id={pids[1]}&mode=pixie')
+    assert main._pixie_sampler_cache[1] is sampler
+    crud.add_interaction(users[0], pids[3], 'view', 1.0)
+    client.get(f'/graph/recommendations?product_id={pids[1]}&mode=pixie')
+    assert main._pixie_sampler_cache[1] is not sampler
+    assert client.get(f'/graph/recommendations?product_id={pids[0]}&mode=bogus').status_code == 422
+
+
+def test_pixie_walks_use_the_configured_workers(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'graph_walk_workers', 3)
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(3)]
+    uid = crud.add_user('Walker')
+    for pid in pids:
+        crud.add_interaction(uid, pid, 'view', 1.0)
+
+    calls = []
+    sample = random_walk.PixieSampler.sample
+
+    def recording_sample(self, seeds, k=10, **kwargs):
+        calls.append(kwargs)
+        return sample(self, seeds, k, **kwargs)
+
+    monkeypatch.setattr(random_walk.PixieSampler, 'sample', recording_sample)
+    payload = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2&mode=pixie').json()
+    assert calls[-1]['workers'] == 3
+    assert {item['id'] for item in payload['recommendations']} == {pids[1], pids[2]}
+
+
+def test_streaming_interaction_readers(client):
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(3)]
+    uid = crud.add_user('Streamer')
+    for pid, action in zip(pids, ('view', 'purchase', 'view')):
+        crud.add_interaction(uid, pid, action, 1.0)
+    crud.add_interaction(uid, pids[0], 'like', 2.0)
+
+    # Chunk sizes smaller than the table still yield every row as a tuple
+    # (one per distinct pair: repeats are compacted into user_product_affinity)
+    assert sorted(crud.iter_interaction_pairs(chunk_size=2)) == sorted((uid, pid) for pid in pids)
+    assert [row[1] for row in crud.iter_product_interactions(pids[0], chunk_size=1)] == ['view', 'like']
+
+    analytics = client.get(f'/products/{pids[0]}/analytics').json()
+    assert analytics['total_views'] == 1 and analytics['total_likes'] == 1
+    assert analytics['all_interactions'] == 2
+
+
+def test_graph_snapshot_reused_until_interactions_change(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(get_settings(), 'graph_snapshot_path', str(tmp_path / 'graph.snap'))
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(3)]
+    uid = crud.add_user('Snapshot')
+    crud.add_interaction(uid, pids[0], 'view', 1.0)
+    crud.add_interaction(uid, pids[1], 'view', 1.0)
+
+    def fetch():
+        payload = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2').json()
+        return [item['id'] for item in payload['recommendations']]
+
+    first = fetch()
+    assert (tmp_path / 'graph.snap').exists()
+    # The second build comes from the snapshot and must rank identically
+    stream = crud.iter_interactions_for_graph
+    monkeypatch.setattr(crud, 'iter_interactions_for_graph', lambda *args, **kwargs: iter(()))
+    assert fetch() == first == [pids[1]]
+
+    # A new interaction moves the high-water mark, forcing a rebuild
+    crud.add_interaction(uid, pids[2], 'purchase', 3.0)
+    monkeypatch.setattr(crud, 'iter_interactions_for_graph', stream)
+    assert set(fetch()) == {pids[1], pids[2]}
+
+    # Another worker starting up maps the file once and queries the mapped
+    # arrays directly; later requests reuse that graph until its inputs change
+    monkeypatch.setattr(main, '_graph_memo', None)
+    mapped = []
+    read_snapshot = graph_snapshot.read_snapshot
+    monkeypatch.setattr(graph_snapshot, 'read_snapshot', lambda *args, **kwargs: mapped.append(1) or read_snapshot(*args, **kwargs))
+    for _ in range(3):
+        assert set(fetch()) == {pids[1], pids[2]}
+    assert mapped == [1]
+    graph = main._graph_memo[1][0]
+    assert isinstance(graph, graph_csr.CSRProductGraph) and isinstance(graph.csr.indices, np.memmap)
+
+    # Deleting a product moves the change mark, so the snapshot is rebuilt without it
+    assert client.delete(f'/admin/products/{pids[2]}').status_code == 200
+    payload = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2').json()
+    assert payload['context']['snapshot'] == 'built'
+    assert [item['id'] for item in payload['recommendations']] == [pids[1]]
+
+
+def test_graph_shared_memory_publication(client, monkeypatch):
+    prefix = f'grapi{uuid.uuid4().hex[:8]}'
+    monkeypatch.setattr(get_settings(), 'graph_shared_memory_prefix', prefix)
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(2)]
+    uid = crud.add_user('Shared')
+    for pid in pids:
+        crud.add_interaction(uid, pid, 'view', 1.0)
+
+    def fetch_source():
+        # A fresh process memo stands in for another worker
+        monkeypatch.setattr(main, '_graph_memo', None)
+        return client.get(f'/graph/recommendations?product_id={pids[0]}&k=1').json()['context']['snapshot']
+
+    try:
+        sources = [fetch_source() for _ in range(2)]
+        assert sources == ['built', 'shared_memory']
+        # The attached worker ranks PPR straight off the read-only shared arrays
+        ppr_payload = client.get(f'/graph/recommendations?product_id={pids[0]}&k=1&mode=ppr').json()
+        assert [item['id'] for item in ppr_payload['recommendations']] == [pids[1]]
+        graph = main._graph_memo[1][0]
+        assert not main._graph_csr(graph).indices.flags.writeable
+    finally:
+        graph_shared.SharedGraphPublisher(prefix).unlink()
+
+
+def test_admin_graph_status_reports_background_generation(client, monkeypatch):
+    assert client.get('/admin/graph/status').json()['enabled'] is False
+
+    monkeypatch.setattr(get_settings(), 'graph_refresh_interval_seconds', 3600.0)
+    monkeypatch.setattr(main, '_graph_store', None)
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(2)]
+    uid = crud.add_user('Refresh')
+    crud.add_interaction(uid, pids[0], 'view', 1.0)
+    crud.add_interaction(uid, pids[1], 'view', 1.0)
+
+    store = main._get_graph_store()
+    try:
+        store.refresh()
+        payload = client.get(f'/graph/recommendations?product_id={pids[0]}&k=1').json()
+        assert payload['context']['generation'] == store.current().generation
+
+        # The payload is computed on the generation the caller keyed it on, not a newer one
+        pinned = store.current()
+        store.refresh()
+        _items, context = main._generate_recommendation_payload(pids[0], limit=1, current=pinned)
+        assert context['generation'] == pinned.generation < store.current().generation
+
+        status_payload = client.get('/admin/graph/status').json()
+        assert status_payload['enabled'] and status_payload['running']
+        assert status_payload['generation'] == store.current().generation
+        assert status_payload['high_water_mark'] == list(crud.graph_change_mark())
+        assert status_payload['dirty'] is False
+    finally:
+        store.stop(timeout=5)
+
+
+def test_incremental_refresh_reads_only_new_rows(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'graph_incremental_refresh', True)
+    monkeypatch.setattr(main, '_incremental_graph', None)
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(3)]
+    uid = crud.add_user('Delta')
+    crud.add_interaction(uid, pids[0], 'view', 1.0)
+    crud.add_interaction(uid, pids[1], 'view', 1.0)
+
+    first = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2').json()
+    assert first['context']['incremental']['added'] == 2
+
+    crud.add_interaction(uid, pids[2], 'view', 1.0)
+    second = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2').json()
+    assert second['context']['incremental'] == {'added': 1, 'dropped_products': 0, 'replayed': 0}
+
+    assert client.delete(f'/admin/products/{pids[1]}').status_code == 200
+    assert [change['change'] for change in crud.list_product_changes()][-1] == 'delete'
+    third = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2').json()
+    assert third['context']['incremental']['dropped_products'] == 1
+    assert pids[1] not in main._incremental_graph.accumulator.popularity
+    assert third['context']['totals']['interactions'] == 2
+
+    # A full rebuild reports the same totals
+    monkeypatch.setattr(get_settings(), 'graph_incremental_refresh', False)
+    full = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2').json()
+    assert full['context']['totals'] == third['context']['totals']
+
+
+def test_product_edges_maintained_on_insert(client, monkeypatch):
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(3)]
+    alice, bob = crud.add_user('Alice'), crud.add_user('Bob')
+    for uid, pid, weight in [(alice, 0, 1.0), (alice, 1, 2.0), (alice, 0, 3.0), (alice, 1, 0.5), (bob, 1, 1.0), (bob, 2, 1.5), (bob, 0, 1.0)]:
+        crud.add_interaction(uid, pids[pid], 'view', weight)
+
+    full = graph_builder.GraphAccumulator.from_records(crud.iter_interactions_for_graph())
+    persisted = {(left, right): (strength, count) for left, right, strength, count in crud.iter_product_edges()}
+    assert {key: value[0] for key, value in persisted.items()} == pytest.approx(dict(full.edge_items()))
+    assert {key: value[1] for key, value in persisted.items()} == dict(full.pair_counts)
+    assert persisted[(pids[0], pids[1])][0] == pytest.approx((3.0 + 2.0) / 2 + 1.0)
+
+    assert crud.rebuild_product_edges() == len(persisted)
+    assert {(left, right): (strength, count) for left, right, strength, count in crud.iter_product_edges()} == pytest.approx(persisted)
+
+    computed = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2').json()
+    monkeypatch.setattr(get_settings(), 'graph_persisted_edges', True)
+    loaded = client.get(f'/graph/recommendations?product_id={pids[0]}&k=2').json()
+    assert [(item['id'], item['score']) for item in loaded['recommendations']] == pytest.approx(
+        [(item['id'], item['score']) for item in computed['recommendations']]
+    )
+
+
+def test_persisted_edges_apply_pair_budget(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'graph_user_pair_budget', 3)
+    crud.rebuild_product_edges(3)
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(6)]
+    alice, bob = crud.add_user('Alice'), crud.add_user('Bob')
+    # Baskets outgrow the three-product cap: new heavy entries and raised
+    # maxes push the weakest active product (ties by id) out of the pairs
+    for uid, pid, weight in [
+        (alice, 0, 1.0), (alice, 1, 1.0), (alice, 2, 1.0), (alice, 3, 1.0),
+        (alice, 4, 2.0), (alice, 3, 1.5), (alice, 5, 0.5), (alice, 0, 3.0),
+        (bob, 5, 1.0), (bob, 4, 1.0), (bob, 3, 1.0), (bob, 2, 1.2), (bob, 2, 1.1),
+    ]:
+        crud.add_interaction(uid, pids[pid], 'view', weight)
+
+    budgeted = graph_builder.GraphAccumulator.from_records(crud.iter_interactions_for_graph(), pair_budget=3)
+    persisted = {(left, right): (strength, count) for left, right, strength, count in crud.iter_product_edges()}
+    assert {key: value[0] for key, value in persisted.items()} == pytest.approx(dict(budgeted.edge_items()))
+    assert {key: value[1] for key, value in persisted.items()} == dict(budgeted.pair_counts)
+    assert crud.rebuild_product_edges(3) == len(persisted)
+
+    def accumulate():
+        products = [main.WeightedProduct(id=pid, name=str(pid), category='Audio', price=0.0) for pid in pids]
+        graph = main.WeightedProductGraph(products)
+        popularity, stats = main._accumulate_weighted_graph(graph, get_settings())
+        edges = {(pid, other): cost for pid in pids for other, cost in graph.neighbors(pid).items()}
+        return edges, popularity, stats
+
+    computed_edges, computed_popularity, computed_stats = accumulate()
+    monkeypatch.setattr(get_settings(), 'graph_persisted_edges', True)
+    loaded_edges, loaded_popularity, loaded_stats = accumulate()
+    assert loaded_stats['edges_source'] == 'product_edges'
+    assert loaded_edges == pytest.approx(computed_edges)
+    assert loaded_popularity == pytest.approx(computed_popularity)
+    assert loaded_stats['interaction_count'] == computed_stats['interaction_count']
+
+    # A budget the table was not derived under is never served from it
+    monkeypatch.setattr(get_settings(), 'graph_user_pair_budget', 1)
+    assert 'edges_source' not in accumulate()[2]
+
+
+def test_affinity_compaction_and_archival(client, tmp_path, monkeypatch):
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(2)]
+    uid = crud.add_user('Compact')
+    for pid, action, weight, metadata in [
+        (0, 'view', 1.0, '{"src": "shared"}'),
+        (0, 'view', 1.0, None),
+        (0, 'like', 1.4, '{"src": "old"}'),
+        (1, 'add_to_cart', 1.8, '{"src": "shared"}'),
+    ]:
+        crud.add_interaction(uid, pids[pid], action, weight, metadata=metadata)
+
+    summary = crud.product_interaction_summary(pids[0])
+    assert (summary['total'], summary['views'], summary['likes'], summary['adds']) == (3, 2, 1, 0)
+    affinity = {row[:2]: row[2:] for row in crud.iter_user_product_affinity()}
+    assert affinity[(uid, pids[0])] == pytest.approx((1.4, 3.4, 3))
+
+    conn = crud.get_conn()
+    conn.execute("UPDATE interactions SET created_at = strftime('%s', '2000-01-01') WHERE product_id = ?", (pids[0],))
+    conn.commit()
+    conn.close()
+    archive_path = tmp_path / 'cold.db'
+    # A failure after the cold copy rolls back and surfaces, instead of failing the DETACH
+    conn = crud.get_conn()
+    conn.execute("CREATE TRIGGER block_archive BEFORE DELETE ON interactions BEGIN SELECT RAISE(ABORT, 'archive blocked'); END")
+    conn.commit()
+    with pytest.raises(sqlite3.IntegrityError, match='archive blocked'):
+        crud.archive_interactions('2001-01-01 00:00:00', str(archive_path))
+    conn.execute('DROP TRIGGER block_archive')
+    conn.commit()
+    conn.close()
+    assert crud.interaction_high_water_mark()[1] == 4
+    assert crud.archive_interactions('2001-01-01 00:00:00', str(archive_path)) == 3
+    assert crud.interaction_high_water_mark()[1] == 1
+
+    # Compacted readers keep the archived events' contribution
+    assert crud.product_interaction_summary(pids[0])['total'] == 3
+    assert crud.product_popularity(pids[0])['interaction_count'] == 3
+    assert [row[:2] for row in crud.iter_product_edges()] == [tuple(sorted(pids))]
+    analytics = client.get(f'/products/{pids[0]}/analytics').json()
+    assert (analytics['all_interactions'], analytics['total_views'], analytics['total_likes']) == (3, 2, 1)
+    assert analytics['viewers'] == [uid] and analytics['recent_views'] == []
+    assert crud.list_affinity_interactions() == [{'user_id': uid, 'product_id': pid} for pid in sorted(pids)]
+    # Payloads only archived rows used are gone; shared ones stay
+    conn = crud.get_conn()
+    assert [row[0] for row in conn.execute('SELECT payload FROM interaction_metadata')] == ['{"src": "shared"}']
+    conn.close()
+    cold = sqlite3.connect(archive_path)
+    assert cold.execute('SELECT COUNT(*) FROM interactions').fetchone()[0] == 3
+    assert cold.execute('SELECT COUNT(metadata) FROM interactions').fetchone()[0] == 2
+    cold.close()
+
+    resp = client.post('/admin/interactions/archive?retention_days=30')
+    assert resp.status_code == 200
+    assert resp.json()['archived'] == 0
+
+    # Builds that replay raw events refuse archival rather than forget history
+    monkeypatch.setattr(get_settings(), 'graph_incremental_refresh', True)
+    resp = client.post('/admin/interactions/archive?retention_days=30')
+    assert resp.status_code == 409
+    assert 'GRAPH_INCREMENTAL_REFRESH' in resp.json()['detail']
+    monkeypatch.setattr(get_settings(), 'graph_window_seconds', 7 * 86400)
+    assert client.post('/admin/interactions/archive?retention_days=30').status_code == 200
+
+
+def test_legacy_interactions_migrate_to_coded_layout(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    legacy = sqlite3.connect(path)
+    legacy.executescript('''
+        CREATE TABLE interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            interaction_type TEXT DEFAULT 'view',
+            weight REAL DEFAULT 1,
+            rating INTEGER DEFAULT 1,
+            metadata TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO interactions (user_id, product_id, interaction_type, weight, metadata, timestamp) VALUES
+            (1, 7, 'view', 1.0, '{"source": "api"}', '2024-01-01 10:00:00'),
+            (1, 8, 'share', 1.0, '{"source": "api"}', '2024-01-02 10:00:00');
+    ''')
+    legacy.commit()
+    legacy.close()
+
+    db_init.init_db(path)
+    db_init.init_db(path)
+
+    conn = sqlite3.connect(path)
+    rows = conn.execute('''
+        SELECT i.id, a.name, m.payload, datetime(i.created_at, 'unixepoch')
+        FROM interactions i
+        JOIN interaction_actions a ON a.code = i.action_code
+        LEFT JOIN interaction_metadata m ON m.id = i.metadata_id
+        ORDER BY i.id
+    ''').fetchall()
+    assert rows == [
+        (1, 'view', '{"source": "api"}', '2024-01-01 10:00:00'),
+        (2, 'share', '{"source": "api"}', '2024-01-02 10:00:00'),
+    ]
+    assert conn.execute('SELECT COUNT(*) FROM interaction_metadata').fetchone()[0] == 1
+    assert conn.execute('SELECT interaction_count FROM user_product_affinity WHERE product_id = 8').fetchone() == (1,)
+    conn.close()
+
+
+def test_graph_recommendations_filter_by_category_and_price(client):
+    seed_category('Audio')
+    seed_category('Video')
+    audio = [seed_product('Audio')[0] for _ in range(3)]
+    video = crud.add_product({'name': 'Screen', 'category': 'Video', 'price': 999.0, 'inventory': 1})
+    uid = crud.add_user('Filter')
+    for pid in [*audio, video]:
+        crud.add_interaction(uid, pid, 'view', 1.0)
+
+    for mode in ('shortest_path', 'ppr', 'pixie'):
+        payload = client.get(f'/graph/recommendations?product_id={audio[0]}&k=5&mode={mode}&category=video').json()
+        assert [item['id'] for item in payload['recommendations']] == [video]
+        assert payload['context']['filters']['candidates'] == 1
+
+    cheap = client.get(f'/graph/recommendations?product_id={audio[0]}&k=5&price_max=500').json()
+    assert sorted(item['id'] for item in cheap['recommendations']) == sorted(audio[1:])
+
+    # Without a background store the graph, and so its derived index, is reused until a write
+    graph = main._weighted_graph()[0]
+    index = main._candidate_index(graph)
+    client.get(f'/graph/recommendations?product_id={audio[0]}&k=5&category=video')
+    assert main._weighted_graph()[0] is graph and main._candidate_index(graph) is index
+    crud.add_interaction(uid, audio[1], 'like', 1.0)
+    assert main._weighted_graph()[0] is not graph
+    assert client.get(f'/graph/recommendations?product_id={audio[0]}&price_min=10&price_max=5').status_code == 422
+
+
+def test_user_recommendations_are_not_served_from_before_a_lagging_refresh(client, monkeypatch):
+    class LaggingStore:
+        # A store whose refresh has not caught up with the writes below
+        def current(self):
+            return types.SimpleNamespace(generation=1)
+
+    monkeypatch.setattr(get_settings(), 'recommendation_cache_max_bytes', 1 << 20)
+    monkeypatch.setattr(main, '_response_cache', None)
+    monkeypatch.setattr(main, '_get_graph_store', LaggingStore)
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(3)]
+    alice, bob, carol = crud.add_user('Alice'), crud.add_user('Bob'), crud.add_user('Carol')
+    for uid, pid in [(alice, 0), (alice, 1), (bob, 0)]:
+        crud.add_interaction(uid, pids[pid], 'view', 1.0)
+
+    first = client.get(f'/recommend/{bob}?k=3').json()
+    assert [rec['product_id'] for rec in first['recommendations']] == [pids[1]]
+    assert client.get(f'/recommend/{bob}?k=3').json() == first
+    assert main._get_response_cache().stats()['hits'] == 1
+
+    # Another user's write leaves Bob's own rows and the generation as they were
+    crud.add_interaction(carol, pids[0], 'view', 1.0)
+    crud.add_interaction(carol, pids[2], 'view', 1.0)
+    fresh = client.get(f'/recommend/{bob}?k=3').json()
+    assert {rec['product_id'] for rec in fresh['recommendations']} == {pids[1], pids[2]}
+
+
+def test_window_graph_responses_bypass_the_cache(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'recommendation_cache_max_bytes', 1 << 20)
+    monkeypatch.setattr(get_settings(), 'graph_window_seconds', 7 * 86400)
+    monkeypatch.setattr(main, '_response_cache', None)
+    monkeypatch.setattr(main, '_windowed_graph', None)
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(2)]
+    uid = crud.add_user('Window')
+    crud.add_interaction(uid, pids[0], 'view', 1.0)
+    crud.add_interaction(uid, pids[1], 'view', 1.0)
+
+    url = f'/graph/recommendations?product_id={pids[0]}&k=2'
+    assert client.get(url).json()['recommendations'] == client.get(url).json()['recommendations']
+    stats = main._get_response_cache().stats()
+    assert stats['entries'] == 0 and stats['hits'] == 0
+
+
+def test_recommendation_flights_key_on_the_change_mark_without_a_store(client, monkeypatch):
+    keys = []
+
+    class RecordingFlight(single_flight.SingleFlight):
+        def do(self, key, fn):
+            keys.append(key)
+            return super().do(key, fn)
+
+    monkeypatch.setattr(main, '_graph_store', None)
+    monkeypatch.setattr(main, '_recommendation_flights', RecordingFlight())
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(2)]
+    uid = crud.add_user('Flight')
+    crud.add_interaction(uid, pids[0], 'view', 1.0)
+    url = f'/graph/recommendations?product_id={pids[0]}&k=2'
+    client.get(url)
+    assert keys[-1][0] == main._graph_version(None)
+
+    # A query against newer data never joins a search over the older graph
+    crud.add_interaction(uid, pids[1], 'view', 1.0)
+    client.get(url)
+    assert keys[-1][0] == main._graph_version(None) != keys[0][0]
+    assert keys[-1][1:] == keys[0][1:]
+
+
+def test_recommendation_responses_are_cached_per_graph_version(client, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'recommendation_cache_max_bytes', 1 << 20)
+    monkeypatch.setattr(main, '_response_cache', None)
+    seed_category('Audio')
+    pids = [seed_product('Audio')[0] for _ in range(3)]
+    uid = crud.add_user('Cached')
+    crud.add_interaction(uid, pids[0], 'view', 1.0)
+    crud.add_interaction(uid, pids[1], 'view', 1.0)
+
+    url = f'/graph/recommendations?product_id={pids[0]}&k=2'
+    first = client.get(url).json()
+    second = client.get(url).json()
+    assert second['recommendations'] == first['recommendations']
+    assert second['context'] == first['context']
+    assert {key for key in second} == {key for key in first}
+    assert main._get_response_cache().stats()['hits'] == 1
+
+    first_user = client.get(f'/recommend/{uid}?k=3').json()
+    assert client.get(f'/recommend/{uid}?k=3').json() == first_user
+    assert main._get_response_cache().stats()['hits'] == 2
+
+    # New interactions move the graph version and drop every cached response
+    crud.add_interaction(uid, pids[2], 'view', 1.0)
+    refreshed = client.get(url).json()
+    assert pids[2] in [item['id'] for item in refreshed['recommendations']]
+    stats = client.get('/admin/graph/status').json()['response_cache']
+    assert stats['hits'] == 2 and stats['invalidations'] == 1
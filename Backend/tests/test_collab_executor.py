@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from ..app import recommender
+from ..app.collab_executor import CollabScoringExecutor, SharedBipartite, score_shard
+
+
+def _interactions(seed=3, users=40, products=25, rows=300):
+    rng = random.Random(seed)
+    return [{'user_id': rng.randint(1, users), 'product_id': rng.randint(1, products)} for _ in range(rows)]
+
+
+def _assert_same_ranking(actual, expected):
+    assert [pid for pid, _ in actual] == [pid for pid, _ in expected]
+    for (_, got), (_, want) in zip(actual, expected):
+        assert got == pytest.approx(want)
+
+
+def test_score_shard_partials_sum_to_full_scores():
+    interactions = _interactions()
+    user_to_products, product_to_users = recommender.build_bipartite_graph(interactions)
+    with SharedBipartite(user_to_products, product_to_users) as shared:
+        target = shared.user_index[7]
+        full_pos, full_scores = score_shard(shared.arrays, target, 0, shared.num_users)
+        totals = {}
+        for lo, hi in ((0, 10), (10, 25), (25, shared.num_users)):
+            for pos, score in zip(*score_shard(shared.arrays, target, lo, hi)):
+                totals[int(pos)] = totals.get(int(pos), 0.0) + score
+        assert sorted(totals) == full_pos.tolist()
+        assert [totals[int(p)] for p in full_pos] == pytest.approx(full_scores.tolist())
+
+
+def test_executor_matches_single_process_ranking():
+    interactions = _interactions()
+    executor = CollabScoringExecutor(pool_size=2, min_parallel_interactions=0)
+    try:
+        batch = executor.recommend_many([3, 7, 99], interactions, top_k=5)
+    finally:
+        executor.shutdown()
+    for uid in (3, 7):
+        _assert_same_ranking(batch[uid], recommender.recommend_by_collab(uid, interactions, top_k=5))
+    assert batch[99] == []
+
+
+def test_batch_call_submits_one_task_per_shard():
+    interactions = _interactions()
+    executor = CollabScoringExecutor(pool_size=3, min_parallel_interactions=0)
+    pool = executor._get_pool()
+    submitted = []
+
+    def submit(fn, *args):
+        submitted.append(args)
+        return pool_submit(fn, *args)
+
+    pool_submit, pool.submit = pool.submit, submit
+    try:
+        batch = executor.recommend_many([3, 7, 12, 99], interactions, top_k=5)
+    finally:
+        executor.shutdown()
+    assert len(submitted) == 3
+    assert all(len(targets) == 3 for _layout, targets, _lo, _hi in submitted)
+    for uid in (3, 7, 12):
+        _assert_same_ranking(batch[uid], recommender.recommend_by_collab(uid, interactions, top_k=5))
+    assert batch[99] == []
+
+
+def test_executor_stays_in_process_for_small_data():
+    executor = CollabScoringExecutor(pool_size=4, min_parallel_interactions=10_000)
+    interactions = _interactions(rows=50)
+    assert not executor.use_pool(len(interactions))
+    assert executor.recommend(3, interactions, top_k=5) == recommender.recommend_by_collab(3, interactions, top_k=5)
+    assert executor._pool is None
+
+
+def test_versioned_calls_reuse_the_published_csr():
+    interactions = _interactions()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return interactions
+
+    executor = CollabScoringExecutor(pool_size=2, min_parallel_interactions=0)
+    try:
+        first = executor.recommend_versioned([3], (1, 300), load, top_k=5)
+        published = executor._shared
+        again = executor.recommend_versioned([3, 7], (1, 300), load, top_k=5)
+        assert len(loads) == 1 and executor._shared is published
+        assert again[3] == first[3]
+        _assert_same_ranking(again[7], recommender.recommend_by_collab(7, interactions, top_k=5))
+
+        executor.recommend_versioned([3], (2, 301), load, top_k=5)
+        assert len(loads) == 2 and executor._shared is not published
+        # The superseded publication had no callers left, so it was unlinked
+        assert published.arrays == {}
+    finally:
+        executor.shutdown()
+    assert executor._shared is None
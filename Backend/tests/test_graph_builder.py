@@ -0,0 +1,297 @@
+import random
+
+import numpy as np
+import pytest
+
+from ..app import graph_mapreduce
+from ..app.graph_builder import GraphAccumulator, IncrementalGraph, WindowedGraph, sparsification_recall, sparsify_edges
+from ..app.product_graph import ProductGraph, build_sample_graph
+
+HOUR = 3600.0
+ROWS = [
+    {'user_id': 1, 'product_id': 10, 'weight': 1.0, 'timestamp': 0.0},
+    {'user_id': 1, 'product_id': 11, 'weight': 1.8, 'timestamp': 0.0},
+    {'user_id': 1, 'product_id': 10, 'weight': 1.4, 'timestamp': HOUR},
+    {'user_id': 2, 'product_id': 11, 'weight': 1.0, 'timestamp': HOUR},
+    {'user_id': 2, 'product_id': 12, 'weight': 1.0, 'timestamp': 2 * HOUR},
+    {'user_id': 3, 'product_id': 10, 'weight': 1.0, 'timestamp': 2 * HOUR},
+    {'user_id': 3, 'product_id': 11, 'weight': 1.0, 'timestamp': 2 * HOUR},
+    {'user_id': 3, 'product_id': 12, 'weight': 1.0, 'timestamp': 2 * HOUR},
+]
+
+
+def _edges(accumulator):
+    return dict(accumulator.edge_items())
+
+
+def test_incremental_adds_match_full_build():
+    full = GraphAccumulator.from_rows(ROWS, now=2 * HOUR)
+    incremental = GraphAccumulator(now=2 * HOUR)
+    for row in ROWS:
+        incremental.add(row)
+
+    assert _edges(incremental) == pytest.approx(_edges(full))
+    assert incremental.decayed_popularity() == pytest.approx(full.decayed_popularity())
+    assert _edges(full)[(10, 11)] == pytest.approx((1.4 + 1.8) / 2 + 1.0)
+
+
+def test_lazy_decay_halves_values_per_half_life():
+    accumulator = GraphAccumulator.from_rows(ROWS, half_life_seconds=HOUR, now=2 * HOUR)
+    popularity = accumulator.decayed_popularity()
+    # product 12: two events of weight 1.0 at t = 2h, nothing decayed yet
+    assert popularity[12] == pytest.approx(2.0)
+    # product 10: 1.0 at t=0 (quartered) + 1.4 at t=1h (halved) + 1.0 at t=2h
+    assert popularity[10] == pytest.approx(0.25 + 0.7 + 1.0)
+
+    before = _edges(accumulator)
+    accumulator.advance(3 * HOUR)
+    after = _edges(accumulator)
+    assert after == pytest.approx({key: value / 2 for key, value in before.items()})
+
+    # Far enough ahead to force a rebase; values must stay consistent
+    accumulator.advance(200 * HOUR)
+    assert accumulator.decayed_popularity()[12] == pytest.approx(2.0 * 2 ** -198)
+
+
+def test_prune_drops_decayed_entries_and_their_edges():
+    accumulator = GraphAccumulator.from_rows(ROWS, half_life_seconds=HOUR, now=2 * HOUR)
+    removed = accumulator.prune(0.5)
+    # user 1's product 10 (0.7) survives; product 11 from t=0 (1.8 / 4 = 0.45) is dropped
+    assert removed == 1
+    assert 11 not in accumulator.user_weights[1]
+    assert 10 in accumulator.user_weights[1]
+    assert _edges(accumulator)[(10, 11)] == pytest.approx(1.0)
+
+
+def test_build_time_prune_matches_pruning_afterwards():
+    after = GraphAccumulator.from_rows(ROWS, half_life_seconds=HOUR, now=2 * HOUR)
+    removed = after.prune(0.5)
+    during = GraphAccumulator.from_rows(ROWS, half_life_seconds=HOUR, now=2 * HOUR, prune_below=0.5)
+
+    assert during.pruned_entries == removed
+    assert _edges(during) == pytest.approx(_edges(after))
+    assert dict(during.pair_counts) == dict(after.pair_counts)
+    assert during.decayed_popularity() == pytest.approx(after.decayed_popularity())
+
+
+def test_decay_saturates_instead_of_overflowing():
+    # Events thousands of half-lives away from the anchor in either direction
+    accumulator = GraphAccumulator.from_rows(
+        [dict(ROWS[0], timestamp=-1e7 * HOUR), dict(ROWS[1], timestamp=1e7 * HOUR)],
+        half_life_seconds=HOUR,
+        now=0.0,
+    )
+    accumulator.now = -1e7 * HOUR  # clock behind the anchor: factor saturates too
+    assert accumulator.factor > 0
+    accumulator.now = 1e7 * HOUR  # factor underflows to 0: everything is below the cutoff
+    assert accumulator.factor == 0.0
+    assert accumulator.prune(0.5) == 1
+    assert not accumulator.user_weights
+
+
+def test_dropping_a_missing_entry_leaves_pairs_alone():
+    accumulator = GraphAccumulator.from_rows(ROWS)
+    before = dict(accumulator.pair_counts)
+    accumulator.set_user_weight(2, 10, 0.0)
+    accumulator.set_user_weight(99, 10, 0.0)
+    assert dict(accumulator.pair_counts) == before
+    assert 10 not in accumulator.user_weights[2] and 99 not in accumulator.user_weights
+
+
+def test_window_eviction_matches_rebuild_of_live_rows():
+    rows = [dict(row, id=idx) for idx, row in enumerate(ROWS, start=1)]
+    window = WindowedGraph(1.5 * HOUR, half_life_seconds=HOUR, now=2 * HOUR)
+    # The t=0 events are already outside the window and never applied
+    assert window.apply(rows[:5], now=2 * HOUR) == 3
+    assert window.apply(rows[5:], now=2 * HOUR) == 3
+    assert window.last_id == len(rows)
+
+    # Slide to t=3h: only the t=2h events (and nothing older than 1.5h) remain
+    evicted = window.advance(3 * HOUR)
+    live = [row for row in ROWS if row['timestamp'] >= 1.5 * HOUR]
+    expected = GraphAccumulator.from_rows(live, half_life_seconds=HOUR, now=3 * HOUR)
+    assert evicted == 2
+    assert _edges(window.accumulator) == pytest.approx(_edges(expected))
+    assert window.accumulator.decayed_popularity() == pytest.approx(expected.decayed_popularity())
+    assert 1 not in window.accumulator.user_weights
+
+
+def test_pair_counts_follow_incremental_updates():
+    full = GraphAccumulator.from_rows(ROWS)
+    assert dict(full.pair_counts) == {(10, 11): 2, (10, 12): 1, (11, 12): 2}
+
+    full.set_user_weight(3, 12, 0.0)
+    assert full.pair_counts[(11, 12)] == 1
+    assert (10, 12) not in full.pair_counts and (10, 12) not in full.edge_strength
+
+
+def test_sparsify_caps_degree_and_min_cooccurrence():
+    accumulator = GraphAccumulator.from_rows(ROWS)
+    edges = dict(accumulator.edge_items())
+
+    capped, report = sparsify_edges(edges, max_degree=1)
+    # (10, 11) is the strongest link of 10 and 11; 12 keeps its best link
+    # even though it pushes 11 past the cap, rather than becoming isolated
+    assert set(capped) == {(10, 11), (11, 12)}
+    assert report.beyond_max_degree == 1 and report.edges_after == 2
+    assert report.bytes_removed > 0
+
+    filtered, report = sparsify_edges(edges, min_cooccurrence=2, pair_counts=accumulator.pair_counts)
+    assert set(filtered) == {(10, 11), (11, 12)}
+    assert report.below_min_cooccurrence == 1
+
+
+def _assert_capped(edges, capped, max_degree):
+    """No product loses all its edges; only last links push a product past the cap."""
+
+    def degrees(pairs):
+        degree = {}
+        for left_id, right_id in pairs:
+            degree[left_id] = degree.get(left_id, 0) + 1
+            degree[right_id] = degree.get(right_id, 0) + 1
+        return degree
+
+    degree = degrees(capped)
+    assert set(degree) == set(degrees(edges))
+    for node, count in degree.items():
+        neighbours = [right if left == node else left for left, right in capped if node in (left, right)]
+        assert count - max_degree <= sum(1 for other in neighbours if degree[other] == 1)
+
+
+def test_sparsify_never_isolates_products_linked_only_to_hubs():
+    # Two hubs share every leaf; each leaf's links go only to the hubs
+    edges = {(hub, leaf): float(leaf + hub) for hub in (0, 1) for leaf in range(10, 30)}
+    edges[(0, 1)] = 100.0
+    for max_degree in (1, 2, 3):
+        capped, _report = sparsify_edges(edges, max_degree=max_degree)
+        _assert_capped(edges, capped, max_degree)
+    # With a cap of one, each leaf keeps exactly its strongest link (to hub 1)
+    capped, _report = sparsify_edges(edges, max_degree=1)
+    assert {pair for pair in capped if pair != (0, 1)} == {(1, leaf) for leaf in range(10, 30)}
+
+
+def test_sparsify_caps_hub_degree():
+    # Every leaf's strongest link is the hub; the hub must still stop at the cap
+    edges = {(0, leaf): 10.0 + leaf for leaf in range(1, 21)}
+    edges.update({(leaf, leaf + 1): 1.0 for leaf in range(1, 20)})
+    capped, report = sparsify_edges(edges, max_degree=3)
+
+    degree = {}
+    for left_id, right_id in capped:
+        degree[left_id] = degree.get(left_id, 0) + 1
+        degree[right_id] = degree.get(right_id, 0) + 1
+    # Every leaf still has its chain links, so the hub is trimmed to the cap
+    assert max(degree.values()) <= 3
+    _assert_capped(edges, capped, 3)
+    # The hub keeps its three strongest spokes
+    assert {key for key in capped if key[0] == 0} == {(0, 18), (0, 19), (0, 20)}
+    assert report.edges_after == len(capped) < len(edges)
+
+
+def test_sparsification_recall_against_unpruned_graph():
+    full, _popularity = build_sample_graph()
+    edges = {}
+    for product in full.products():
+        for other, cost in full.neighbors(product.id).items():
+            edges[(min(product.id, other), max(product.id, other))] = 1.0 / cost
+    seeds = [product.id for product in full.products()]
+    assert sparsification_recall(full, full, seeds, k=3) == 1.0
+
+    recalls = []
+    for max_degree in (1, 2, 3):
+        capped, _report = sparsify_edges(edges, max_degree=max_degree)
+        sparse = ProductGraph(full.products())
+        for (left_id, right_id), strength in capped.items():
+            sparse.add_edge(left_id, right_id, 1.0 / strength)
+        _assert_capped(edges, capped, max_degree)
+        recalls.append(sparsification_recall(full, sparse, seeds, k=3))
+    # Looser caps keep more of the reference top-3; degree 3 keeps most of it
+    assert recalls == sorted(recalls) and recalls[0] < recalls[-1]
+    assert recalls[-1] >= 0.8
+
+
+def test_pair_budget_caps_heavy_baskets_incrementally():
+    heavy = [{'user_id': 9, 'product_id': pid, 'weight': 1.0 + pid / 100, 'timestamp': 0.0} for pid in range(20, 30)]
+    rows = ROWS + heavy
+    # A budget of 3 pairs keeps each basket's 3 heaviest products
+    full = GraphAccumulator.from_rows(rows, pair_budget=3)
+    assert full.basket_cap == 3
+    assert full.skipped_pairs() == 45 - 3
+    assert {key for key in full.edge_strength if key[0] >= 20} == {(27, 28), (27, 29), (28, 29)}
+
+    incremental = GraphAccumulator(pair_budget=3)
+    for row in rows:
+        incremental.add(row)
+    assert _edges(incremental) == pytest.approx(_edges(full))
+    assert dict(incremental.pair_counts) == dict(full.pair_counts)
+
+    # Dropping a heavy item promotes the next heaviest into the active set
+    incremental.set_user_weight(9, 29, 0.0)
+    assert {key for key in incremental.edge_strength if key[0] >= 20} == {(26, 27), (26, 28), (27, 28)}
+
+
+def test_map_reduce_build_matches_dict_build():
+    rng = random.Random(7)
+    rows = [
+        {'user_id': rng.randrange(40), 'product_id': rng.randrange(60), 'weight': rng.choice([1.0, 1.4, 1.8])}
+        for _ in range(600)
+    ]
+    reference = GraphAccumulator.from_rows(rows, pair_budget=50)
+    assert graph_mapreduce.shard_bounds(np.array([0, 3, 6, 9, 12]), 2) == [(0, 2), (2, 4)]
+
+    local = GraphAccumulator.from_rows(rows, pair_budget=50, workers=1)
+    assert _edges(local) == pytest.approx(_edges(reference))
+    assert dict(local.pair_counts) == dict(reference.pair_counts)
+
+    active = {uid: reference._active_items(basket) for uid, basket in reference.user_weights.items()}
+    strength, counts = graph_mapreduce.edge_maps_from_baskets(active, workers=2, min_parallel_pairs=0)
+    assert strength == pytest.approx(dict(reference.edge_strength))
+    assert counts == dict(reference.pair_counts)
+
+
+def test_incremental_graph_applies_deltas_and_product_deletes():
+    rows = [{**row, 'id': idx + 1} for idx, row in enumerate(ROWS)]
+    changes = []
+    fetched = []
+
+    def fetch_rows(after_id, max_id):
+        fetched.append((after_id, max_id))
+        return [row for row in rows if after_id < row['id'] <= max_id]
+
+    def fetch_changes(after_id):
+        return [change for change in changes if change['id'] > after_id]
+
+    graph = IncrementalGraph(now=2 * HOUR)
+    assert graph.sync(fetch_rows, fetch_changes, (5, 5), now=2 * HOUR)['added'] == 5
+    assert graph.sync(fetch_rows, fetch_changes, (8, 8), now=2 * HOUR)['added'] == 3
+    assert fetched[-1] == (5, 8)
+    assert _edges(graph.accumulator) == pytest.approx(_edges(GraphAccumulator.from_rows(ROWS, now=2 * HOUR)))
+
+    changes.append({'id': 1, 'product_id': 12, 'change': 'delete'})
+    rows.append({'id': 9, 'user_id': 4, 'product_id': 12, 'weight': 1.0, 'timestamp': 2 * HOUR})
+    result = graph.sync(fetch_rows, fetch_changes, (9, 9), now=2 * HOUR)
+    assert result == {'added': 0, 'dropped_products': 1, 'replayed': 0}
+    remaining = [row for row in ROWS if row['product_id'] != 12]
+    assert _edges(graph.accumulator) == pytest.approx(_edges(GraphAccumulator.from_rows(remaining, now=2 * HOUR)))
+    assert 12 not in graph.accumulator.popularity
+    assert graph.accumulator.interaction_count == len(remaining)
+
+    # An interaction removed below the applied id forces a replay
+    del rows[0]
+    assert graph.sync(fetch_rows, fetch_changes, (9, 8), now=2 * HOUR)['replayed'] == 1
+    assert graph.accumulator.interaction_count == len([row for row in rows if row['product_id'] != 12])
+
+
+def test_affinity_build_matches_raw_rows():
+    baskets = {}
+    for row in ROWS:
+        key = (row['user_id'], row['product_id'])
+        max_weight, weight_sum, count = baskets.get(key, (0.0, 0.0, 0))
+        baskets[key] = (max(max_weight, row['weight']), weight_sum + row['weight'], count + 1)
+    compacted = [(uid, pid, *values) for (uid, pid), values in baskets.items()]
+
+    full = GraphAccumulator.from_rows(ROWS, now=2 * HOUR)
+    affinity = GraphAccumulator.from_affinity(compacted, now=2 * HOUR)
+    assert _edges(affinity) == pytest.approx(_edges(full))
+    assert affinity.decayed_popularity() == pytest.approx(full.decayed_popularity())
+    assert affinity.interaction_count == full.interaction_count == len(ROWS)
@@ -0,0 +1,73 @@
+import multiprocessing
+import uuid
+
+import numpy as np
+import pytest
+
+from ..app.graph_shared import SharedGraphPublisher, SharedGraphReader, _open_segment
+from ..app.graph_snapshot import GraphSnapshot
+from ..app.product_graph import build_sample_graph
+
+
+@pytest.fixture()
+def prefix(tmp_path):
+    name = f'grtest{uuid.uuid4().hex[:8]}'
+    publisher = SharedGraphPublisher(name, lock_path=str(tmp_path / 'publish.lock'))
+    yield name, publisher
+    publisher.unlink()
+
+
+def _snapshot(mark):
+    graph, popularity = build_sample_graph()
+    return GraphSnapshot.from_graph(graph, popularity, mark, config={'max_degree': 0})
+
+
+def _attached_edge_count(name):
+    reader = SharedGraphReader(name)
+    snapshot = reader.current()
+    result = (reader.generation, int(snapshot.csr.indices.size))
+    del snapshot
+    reader.close()
+    return result
+
+
+def test_reader_attaches_to_published_generation(prefix):
+    name, publisher = prefix
+    reader = SharedGraphReader(name)
+    assert reader.current() is None
+
+    expected = _snapshot((5, 5))
+    with publisher.exclusive():
+        assert publisher.publish(expected) == 1
+    snapshot = reader.current()
+    assert reader.generation == 1
+    assert tuple(snapshot.high_water_mark) == (5, 5)
+    assert not snapshot.csr.indices.flags.writeable
+    for key, array in expected.arrays().items():
+        np.testing.assert_array_equal(snapshot.arrays()[key], array)
+
+    # Another process sees the same generation without rebuilding
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        assert pool.apply(_attached_edge_count, (name,)) == (1, expected.csr.num_edges)
+    reader.close()
+
+
+def test_generation_swap_unlinks_superseded_segments(prefix):
+    name, publisher = prefix
+    reader = SharedGraphReader(name)
+    with publisher.exclusive():
+        publisher.publish(_snapshot((1, 1)))
+    first = reader.current()
+
+    with publisher.exclusive():
+        publisher.publish(_snapshot((2, 2)))
+        publisher.publish(_snapshot((3, 3)))
+    # The reader still holding generation 1 keeps working after the unlink
+    assert first.csr.num_edges > 0
+    assert tuple(reader.current().high_water_mark) == (3, 3)
+    assert reader.generation == 3
+    with pytest.raises(FileNotFoundError):
+        _open_segment(f'{name}_1_indices')
+    _open_segment(f'{name}_2_indices').close()
+    del first
+    reader.close()
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from ..app.graph_snapshot import GraphSnapshot, read_snapshot, write_snapshot
+from ..app.product_graph import build_sample_graph
+
+
+def _edges(graph):
+    return {
+        (product.id, other): cost
+        for product in graph.products()
+        for other, cost in graph.neighbors(product.id).items()
+    }
+
+
+def test_snapshot_round_trip_through_memmap(tmp_path):
+    graph, popularity = build_sample_graph()
+    path = str(tmp_path / 'graph.snap')
+    snapshot = GraphSnapshot.from_graph(graph, popularity, (42, 7), config={'max_degree': 0}, stats={'edge_count': 3})
+    size = write_snapshot(path, snapshot)
+    assert size == (tmp_path / 'graph.snap').stat().st_size
+
+    loaded = read_snapshot(path, high_water_mark=(42, 7), config={'max_degree': 0})
+    assert loaded is not None
+    assert isinstance(loaded.csr.indices, np.memmap)
+    assert loaded.stats == {'edge_count': 3}
+    assert loaded.popularity_map() == {pid: float(value) for pid, value in popularity.items() if value}
+
+    # Queries run on the mapped arrays without copying them into dicts
+    view = loaded.view(graph.products())
+    assert _edges(view) == _edges(graph)
+    assert view.recommend_top_k(1, k=3, popularity=popularity) == graph.recommend_top_k(1, k=3, popularity=popularity)
+    with pytest.raises(TypeError):
+        view.add_edge(1, 2, 1.0)
+
+    # Products missing from the catalogue drop out of every neighbour list
+    gone = next(iter(graph.neighbors(101)))
+    trimmed = loaded.view(product for product in graph.products() if product.id != gone)
+    assert gone not in trimmed and all(gone not in trimmed.neighbors(p.id) for p in trimmed.products())
+
+
+def test_snapshot_rejected_when_outdated_or_foreign(tmp_path):
+    graph, popularity = build_sample_graph()
+    path = str(tmp_path / 'graph.snap')
+    write_snapshot(path, GraphSnapshot.from_graph(graph, popularity, (42, 7), config={'max_degree': 0}))
+
+    assert read_snapshot(path, high_water_mark=(43, 8)) is None
+    assert read_snapshot(path, config={'max_degree': 5}) is None
+    assert read_snapshot(str(tmp_path / 'missing.snap')) is None
+    (tmp_path / 'junk.snap').write_bytes(b'not a snapshot')
+    assert read_snapshot(str(tmp_path / 'junk.snap')) is None
+
+
+def test_corrupt_or_truncated_snapshot_reads_as_missing(tmp_path):
+    graph, popularity = build_sample_graph()
+    path = tmp_path / 'graph.snap'
+    size = write_snapshot(str(path), GraphSnapshot.from_graph(graph, popularity, (42, 7)))
+
+    data = path.read_bytes()
+    path.write_bytes(data[:size - 64])
+    assert read_snapshot(str(path)) is None
+
+    header = b'{"version": 1, "high_water_mark": [42, 7]}'
+    path.write_bytes(data[:8] + len(header).to_bytes(8, 'little') + header)
+    assert read_snapshot(str(path)) is None
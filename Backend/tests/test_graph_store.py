@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from ..app.graph_store import GraphStore
+
+
+class _Source:
+    def __init__(self):
+        self.mark = (1, 1)
+        self.builds = 0
+        self.fail = False
+        self.during_build = None
+
+    def build(self):
+        self.builds += 1
+        if self.fail:
+            raise RuntimeError('boom')
+        if self.during_build:
+            self.during_build()
+        return f'graph-{self.builds}', {1: 1.0}, {'edge_count': self.builds}
+
+
+def test_refresh_swaps_complete_generations():
+    source = _Source()
+    store = GraphStore(source.build, lambda: source.mark, interval_seconds=60)
+    assert store.current() is None and store.refresh_due(0.0)
+
+    first = store.refresh()
+    assert store.current() is first and first.generation == 1 and first.graph == 'graph-1'
+    assert not store.refresh_due(first.built_at + 30)
+    assert store.refresh_due(first.built_at + 60)
+
+    source.fail = True
+    with pytest.raises(RuntimeError):
+        store.refresh()
+    # A failed build leaves the previous generation in place
+    assert store.current() is first
+
+
+def test_dirty_and_idle_trigger():
+    source = _Source()
+    store = GraphStore(source.build, lambda: source.mark, idle_seconds=5)
+    generation = store.refresh()
+    # Fake clock kept before the next real build so these writes predate it
+    now = generation.built_at - 100
+    assert not store.refresh_due(now)
+
+    # Another process wrote: the moved high-water mark dirties the store
+    source.mark = (2, 2)
+    store._poll_changes(now)
+    assert store.dirty and not store.refresh_due(now + 1)
+    store.mark_dirty(now + 3)
+    assert not store.refresh_due(now + 7)
+    assert store.refresh_due(now + 8)
+    assert store.status(now + 8)['stale_seconds'] == pytest.approx(8)
+
+    store.refresh()
+    assert not store.dirty
+
+    # Writes that land while a build is running keep the store dirty
+    source.during_build = store.mark_dirty
+    store.refresh()
+    assert store.dirty
+
+
+def test_background_thread_builds_without_blocking_readers():
+    source = _Source()
+    store = GraphStore(source.build, lambda: source.mark, interval_seconds=60, poll_seconds=0.01)
+    store.start()
+    try:
+        deadline = time.time() + 5
+        while store.current() is None and time.time() < deadline:
+            time.sleep(0.01)
+        assert store.current().generation == 1
+        assert store.status()['running']
+    finally:
+        store.stop(timeout=5)
+    assert not store.status()['running']
+
+
+def test_first_reader_waits_for_the_in_flight_build():
+    source = _Source()
+    release = threading.Event()
+    building = threading.Event()
+
+    def slow_build():
+        building.set()
+        release.wait(5)
+        return source.build()
+
+    store = GraphStore(slow_build, lambda: source.mark, interval_seconds=60)
+    background = threading.Thread(target=store.refresh)
+    background.start()
+    assert building.wait(5)
+
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(store.wait_current()))
+    reader.start()
+    release.set()
+    background.join(5)
+    reader.join(5)
+    assert source.builds == 1
+    assert seen[0] is store.current() and seen[0].generation == 1
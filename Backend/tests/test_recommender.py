@@ -1,5 +1,12 @@
+import numpy as np
 import pytest
-from ..app import recommender
+from ..app import ppr, recommender, topk
+from ..app.graph_csr import CSRGraph
+from ..app.minhash import MinHashIndex
+from ..app.candidate_index import CandidateFilter, CandidateIndex
+from ..app.graph_summary import summarize
+from ..app.product_graph import Product, ProductGraph, build_sample_graph
+from ..app.random_walk import PixieSampler
 
 
 def test_jaccard():
@@ -25,3 +32,210 @@ def test_bfs_related():
     prod_graph = recommender.build_product_graph(product_to_users)
     rel = recommender.bfs_related_products(1, prod_graph, max_depth=2)
     assert 2 in rel or 3 in rel
+
+
+def test_similar_products_matches_bruteforce():
+    interactions = [
+        {'user_id': u, 'product_id': p}
+        for u, p in [(1, 1), (1, 2), (2, 1), (2, 3), (3, 2), (3, 3), (4, 4), (5, 1), (5, 2)]
+    ]
+    user_to_products, product_to_users = recommender.build_bipartite_graph(interactions)
+    expected = sorted(
+        (
+            (other, recommender.jaccard_similarity(product_to_users[1], users))
+            for other, users in product_to_users.items()
+            if other != 1
+        ),
+        key=lambda x: (-x[1], x[0]),
+    )
+    expected = [pair for pair in expected if pair[1] > 0][:5]
+    assert recommender.similar_products(1, product_to_users, user_to_products, top_k=5) == expected
+    assert recommender.similar_products(99, product_to_users, user_to_products) == []
+
+
+def test_minhash_index_finds_identical_sets_and_updates():
+    product_to_users = {1: set(range(0, 40)), 2: set(range(0, 40)), 3: set(range(100, 140))}
+    index = MinHashIndex(num_perm=32, bands=8)
+    for pid, users in product_to_users.items():
+        index.set(pid, users)
+
+    assert index.top_k(1, k=2) == [(2, 1.0)]
+    assert 3 not in index.candidates(1)
+
+    index.add(3, range(0, 40))
+    assert 0 < index.estimate(1, 3) < 1
+    index.remove(2)
+    assert 2 not in index.candidates(1)
+
+
+def test_minhash_candidate_cap_keeps_most_colliding_keys():
+    index = MinHashIndex(num_perm=32, bands=32)
+    index.set(1, range(100))
+    index.set(50, range(100))
+    for key in range(2, 10):
+        # Half overlap with key 1: collides in some bands, but fewer than key 50
+        index.set(key, [*range(50), *range(key * 1000, key * 1000 + 50)])
+    hits = index.band_hits(1)
+    assert hits[50] == 32 and max(count for other, count in hits.items() if other != 50) < 32
+    assert index.top_k(1, k=1, max_candidates=1) == [(50, 1.0)]
+
+
+def test_bitmap_backend_matches_sets():
+    interactions = [
+        {'user_id': u, 'product_id': p}
+        for u, p in [(10, 1), (20, 1), (30, 1), (20, 2), (30, 2), (40, 2), (50, 3)]
+    ]
+    user_to_products, sets = recommender.build_bipartite_graph(interactions)
+    _, bitmaps = recommender.build_bipartite_graph(interactions, backend='bitmap')
+
+    assert set(bitmaps[1]) == sets[1]
+    assert len(bitmaps[2]) == 3 and 40 in bitmaps[2] and 10 not in bitmaps[2]
+    assert abs(recommender.jaccard_similarity(bitmaps[1], bitmaps[2]) - 0.5) < 1e-9
+    assert recommender.jaccard_similarity(bitmaps[1], bitmaps[3]) == 0.0
+    assert abs(recommender.jaccard_similarity(bitmaps[1], sets[2]) - 0.5) < 1e-9
+    assert abs(recommender.jaccard_similarity(sets[1], bitmaps[2]) - 0.5) < 1e-9
+    assert {pid: set(bitmap) for pid, bitmap in bitmaps.items()} == dict(sets)
+    assert recommender.similar_products(1, bitmaps, user_to_products) == recommender.similar_products(1, sets, user_to_products)
+
+    bitmaps[3].add(10)
+    assert 10 in bitmaps[3] and len(bitmaps[3]) == 2
+
+
+def test_recommend_many_matches_single_user_calls():
+    interactions = [
+        {'user_id': u, 'product_id': p}
+        for u, p in [(1, 1), (1, 2), (2, 2), (2, 3), (3, 1), (3, 3), (3, 4), (4, 5)]
+    ]
+    batch = recommender.recommend_many([1, 2, 3, 4, 9], interactions, top_k=3)
+    for uid in (1, 2, 3, 4, 9):
+        assert batch[uid] == recommender.recommend_by_collab(uid, interactions, top_k=3)
+    assert batch[9] == []
+
+
+def test_top_k_selection_keeps_tie_breaking():
+    scores = [(5, 0.5), (2, 0.9), (7, 0.5), (1, 0.5), (3, 0.1)]
+    expected = sorted(scores, key=lambda x: (-x[1], x[0]))[:3]
+    assert topk.top_k_scores(scores, 3) == expected == [(2, 0.9), (1, 0.5), (5, 0.5)]
+
+    ids, values = topk.top_k_arrays(np.array([s[0] for s in scores]), np.array([s[1] for s in scores]), 3)
+    assert list(zip(ids.tolist(), values.tolist())) == expected
+    assert topk.top_k_scores(scores, 0) == []
+
+
+def test_ppr_power_and_push_agree_on_sample_graph():
+    graph, _popularity = build_sample_graph()
+    csr = CSRGraph.from_product_graph(graph)
+
+    exact = ppr.personalized_pagerank(csr, [101], tol=1e-10, max_iter=500)
+    assert abs(exact.sum() - 1.0) < 1e-6
+    approx = ppr.approximate_ppr(csr, [101], epsilon=1e-7)
+    for pos, score in approx.items():
+        assert abs(score - exact[pos]) < 1e-3
+
+    power_top = [p.id for p, _ in ppr.recommend_ppr(graph, [101], k=3, csr=csr)]
+    push_top = [p.id for p, _ in ppr.recommend_ppr(graph, [101], k=3, method='push', csr=csr)]
+    assert power_top == push_top
+    assert 101 not in power_top and len(power_top) == 3
+
+
+def test_pixie_sampler_respects_budget_and_ranks_neighbours():
+    interactions = [
+        {'user_id': u, 'product_id': p}
+        for u, p in [(1, 1), (1, 2), (2, 1), (2, 2), (3, 2), (3, 3), (4, 4)]
+    ]
+    user_to_products, product_to_users = recommender.build_bipartite_graph(interactions)
+    sampler = PixieSampler(user_to_products, product_to_users)
+
+    result = sampler.sample([1], k=3, walk_budget=2000, seed=5)
+    assert result.steps <= 2000
+    # A full batch of 4-step walks is 2 * 4 edge traversals per walker
+    exact = sampler.sample([1], k=3, walk_budget=8 * 256, walk_length=4, patience=100, seed=5)
+    assert exact.rounds == 1 and exact.steps == 8 * 256
+    assert [pid for pid, _ in result.ranked][:2] == [2, 3]
+    assert all(pid not in (1, 4) for pid, _ in result.ranked)
+
+    threaded = sampler.sample([1], k=3, walk_budget=2000, workers=2, seed=5)
+    assert threaded.ranked[0][0] == 2
+    assert sampler.sample([99], k=3).ranked == []
+
+
+def test_candidate_filters_match_post_filtered_rankings():
+    graph, popularity = build_sample_graph()
+    index = CandidateIndex(graph.products())
+    seed = 101
+    category = graph.product(seed).category
+    allowed = index.candidates(CandidateFilter(category=category.upper()))
+    assert allowed == {p.id for p in graph.products() if p.category == category}
+    assert index.candidates(CandidateFilter()) is None
+
+    full = graph.recommend_top_k(seed, k=len(allowed) + 10, popularity=popularity)
+    expected = [(p.id, score) for p, score in full if p.id in allowed][:2]
+    filtered, paths = graph.recommend_with_paths(seed, k=2, popularity=popularity, candidates=allowed)
+    assert [(p.id, score) for p, score in filtered] == expected
+    assert all(pid in paths for pid, _score in expected)
+
+    prices = sorted(p.price for p in graph.products())
+    low, high = prices[1], prices[-2]
+    priced = index.candidates(CandidateFilter(price_min=low, price_max=high))
+    assert priced == {p.id for p in graph.products() if low <= p.price <= high}
+    ppr_top = ppr.recommend_ppr(graph, [seed], k=3, candidates=priced)
+    assert ppr_top and all(p.id in priced for p, _ in ppr_top)
+
+
+def test_filtered_dijkstra_stops_before_distant_products():
+    products = [Product(id=pid, name=str(pid), category='A' if pid % 2 else 'B', price=1.0) for pid in range(1, 41)]
+    graph = ProductGraph(products)
+    for pid in range(1, 40):
+        graph.add_edge(pid, pid + 1, 1.0)
+    settled = []
+    original = graph.dijkstra
+
+    def recording(start, stop=None):
+        def spy(node, distance):
+            settled.append(node)
+            return stop(node, distance)
+        return original(start, stop=spy)
+
+    graph.dijkstra = recording
+    top = graph.recommend_top_k(1, k=2, candidates={pid for pid in range(1, 41) if pid % 2})
+    assert [p.id for p, _ in top] == [3, 5]
+    assert len(settled) < 10
+
+
+def test_pixie_sampler_ranks_only_candidates():
+    interactions = [
+        {'user_id': u, 'product_id': p}
+        for u, p in [(1, 1), (1, 2), (2, 1), (2, 2), (3, 2), (3, 3)]
+    ]
+    sampler = PixieSampler(*recommender.build_bipartite_graph(interactions))
+    result = sampler.sample([1], k=3, walk_budget=2000, seed=5, candidates={3})
+    assert [pid for pid, _ in result.ranked] == [3]
+
+
+def test_graph_summary_matches_per_request_computation():
+    graph, popularity = build_sample_graph()
+    products = list(graph.products())
+    summary = summarize(graph, popularity)
+
+    assert summary.total_products == len(products)
+    assert summary.total_edges == sum(len(graph.neighbors(p.id)) for p in products) // 2
+    expected_order = sorted(products, key=lambda p: (-popularity.get(p.id, 0.0), -(p.price or 0.0), p.id))
+    assert list(summary.popularity_order) == [p.id for p in expected_order]
+    leaders = sorted(products, key=lambda p: popularity.get(p.id, 0.0), reverse=True)[:5]
+    assert [leader['id'] for leader in summary.leaders()] == [p.id for p in leaders]
+    summary.leaders()[0]['score'] = -1
+    assert summary.leaders()[0]['score'] == popularity.get(leaders[0].id, 0.0)
+
+
+def test_graph_summary_most_popular_respects_filters():
+    graph, popularity = build_sample_graph()
+    summary = summarize(graph, popularity)
+    order = list(summary.popularity_order)
+
+    assert summary.most_popular(3) == order[:3]
+    assert summary.most_popular(2, exclude=order[0]) == order[1:3]
+    # A small filter is ranked directly and keeps the global order
+    allowed = {order[-1], order[1], order[-2]}
+    assert summary.most_popular(5, allowed, exclude=order[1]) == [order[-2], order[-1]]
+    assert summary.most_popular(2, set(order)) == order[:2]
+    assert summary.most_popular(0, allowed) == []
@@ -0,0 +1,42 @@
+from ..app.response_cache import ResponseCache
+
+
+def test_lru_eviction_by_size_and_ttl():
+    cache = ResponseCache(max_bytes=100, ttl_seconds=10)
+    assert cache.put('a', 1, 'A', 40, now=0)
+    assert cache.put('b', 1, 'B', 40, now=0)
+    assert cache.get('a', 1, now=1) == 'A'  # a becomes most recent
+    assert cache.put('c', 1, 'C', 40, now=1)
+    assert cache.get('b', 1, now=2) is None
+    assert cache.get('a', 1, now=2) == 'A' and cache.get('c', 1, now=2) == 'C'
+    assert not cache.put('huge', 1, 'H', 101, now=2)
+
+    assert cache.get('a', 1, now=10) is None  # expired
+    assert cache.get('c', 1, now=10.5) == 'C'
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['entries'] == 1 and stats['bytes'] == 40
+
+
+def test_version_bump_invalidates_and_rejects_stale_stores():
+    cache = ResponseCache(max_bytes=1000)
+    cache.put('seed', ('generation', 1), 'old', 10)
+    assert cache.get('seed', ('generation', 1)) == 'old'
+
+    assert cache.get('seed', ('generation', 2)) is None
+    assert cache.stats()['invalidations'] == 1
+    # A response computed against generation 1 arrives after the bump
+    assert not cache.put('seed', ('generation', 1), 'old', 10)
+    assert cache.put('seed', ('generation', 2), 'new', 10)
+    assert cache.get('seed', ('generation', 2)) == 'new'
+
+
+def test_older_versions_never_roll_the_cache_back():
+    cache = ResponseCache(max_bytes=1000)
+    assert cache.put('a', 2, 'A', 10)
+    # A request that read version 1 before the bump misses without clearing
+    assert cache.get('a', 1) is None
+    assert not cache.put('b', 1, 'stale', 10)
+    assert cache.put('a', 2, 'A2', 10)
+    assert cache.get('a', 2) == 'A2'
+    stats = cache.stats()
+    assert stats['entries'] == 1 and stats['invalidations'] == 0
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from ..app.single_flight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, callers):
+    results = []
+    errors = []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_overlapping_calls_share_one_computation():
+    flight = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+    runs = []
+
+    def compute():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return ['item']
+
+    threads, results, _errors = _run_concurrently(flight, ('gen', 1), compute, 1)
+    assert started.wait(5)
+    more, more_results, _ = _run_concurrently(flight, ('gen', 1), compute, 4)
+    _wait_for(lambda: flight.stats()['collapsed'] == 4)
+    release.set()
+    for thread in threads + more:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert [result for result, _shared in results + more_results] == [['item']] * 5
+    assert sorted(shared for _result, shared in results + more_results) == [False] + [True] * 4
+    assert flight.stats() == {'executed': 1, 'collapsed': 4, 'in_flight': 0}
+
+    # Finished calls are forgotten: the next one computes again
+    assert flight.do(('gen', 1), lambda: ['fresh']) == (['fresh'], False)
+    assert flight.do(('gen', 2), lambda: ['other']) == (['other'], False)
+
+
+def test_waiters_receive_the_leaders_error():
+    flight = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise LookupError('missing product')
+
+    threads, _results, errors = _run_concurrently(flight, 'key', fail, 1)
+    assert started.wait(5)
+    more, _more_results, more_errors = _run_concurrently(flight, 'key', fail, 2)
+    _wait_for(lambda: flight.stats()['collapsed'] == 2)
+    release.set()
+    for thread in threads + more:
+        thread.join(5)
+
+    assert len(errors + more_errors) == 3
+    assert all(isinstance(exc, LookupError) for exc in errors + more_errors)
+    # Waiters raise their own copy, chained to the leader's error
+    leader_error = errors[0]
+    for exc in more_errors:
+        assert exc is not leader_error and exc.__cause__ is leader_error
+        assert exc.args == ('missing product',)
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: (_ for _ in ()).throw(ValueError('next call runs again')))